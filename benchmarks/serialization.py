@@ -0,0 +1,87 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+"""Micro benchmarks for the pyschema json serialization paths
+
+Run from the repository root:
+
+    python benchmarks/serialization.py [number_of_records]
+
+"""
+import datetime
+import os
+import sys
+import timeit
+
+# run against the checkout the script lives in, not an installed pyschema
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pyschema
+from pyschema.types import Text, Integer, Float, Boolean, Enum
+from pyschema.types import List, Map, SubRecord, Date, DateTime
+
+
+class BenchmarkDimension(pyschema.Record):
+    id = Integer()
+    name = Text()
+    tags = List(Text())
+
+
+class BenchmarkEvent(pyschema.Record):
+    user_id = Integer()
+    session = Text()
+    country = Enum(["SE", "US", "GB", "DE"])
+    score = Float()
+    premium = Boolean()
+    day = Date()
+    ts = DateTime()
+    counters = Map(Integer())
+    history = List(Integer())
+    dimension = SubRecord(BenchmarkDimension)
+
+
+def sample_record(i):
+    return BenchmarkEvent(
+        user_id=i,
+        session=u"session-%d" % (i,),
+        country=u"SE",
+        score=i * 0.5,
+        premium=bool(i % 2),
+        day=datetime.date(2014, 1, 1),
+        ts=datetime.datetime(2014, 1, 1, 12, 0, 0, 500),
+        counters={u"clicks": i, u"views": i * 2},
+        history=range(10),
+        dimension=BenchmarkDimension(id=i, name=u"dimension", tags=[u"a", u"b"]),
+    )
+
+
+def run(name, func, n):
+    best = min(timeit.repeat(func, number=1, repeat=3))
+    print "%-30s %8.3f s  %10.0f records/s" % (name, best, n / best)
+
+
+def main(n):
+    records = [sample_record(i) for i in xrange(n)]
+    lines = [pyschema.dumps(r) for r in records]
+
+    run("dumps", lambda: [pyschema.dumps(r) for r in records], n)
+    run("dumps_many", lambda: list(pyschema.dumps_many(records)), n)
+    run("loads", lambda: [pyschema.loads(l) for l in lines], n)
+    run("loads validate=False", lambda: [pyschema.loads(l, validate=False) for l in lines], n)
+    run("loads_many", lambda: list(pyschema.loads_many(lines)), n)
+    run("loads_many validate=False", lambda: list(pyschema.loads_many(lines, validate=False)), n)
+    run("loads_many lazy=True", lambda: list(pyschema.loads_many(lines, lazy=True)), n)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -14,8 +14,8 @@
 from __future__ import absolute_import
 
 from pyschema.core import (
-    PySchema, Record, dumps, loads, ispyschema, SchemaStore,
-    disable_auto_register, enable_auto_register, no_auto_store,
+    PySchema, Record, FrozenRecord, dumps, loads, dumps_many, loads_many, ispyschema,
+    SchemaStore, disable_auto_register, enable_auto_register, no_auto_store,
     NO_DEFAULT
 )
 from pyschema.types import *
@@ -0,0 +1,393 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Column-wise storage of many records of one schema
+
+>>> batch = RecordBatch(MyRecord)
+>>> batch.extend_json_lines(open("records.json"))
+>>> sum(batch.columns["count"].values)
+
+Values are stored per field, in a column depending on the field type:
+
+* Integer: `array.array` of a type with at least `size` bytes
+* Float: `array.array` of C doubles, whatever the `size` (C floats would
+  round values like 0.1 that the json encoding keeps exactly)
+* Boolean: a `Bitmap`
+* all other types: a list of the field values
+
+Array and Bitmap columns of nullable fields have a `mask` Bitmap that is
+False for None values. Subclasses of the field types above that override
+`dump` or `load` are stored in lists.
+
+Filling a batch from json (`extend_json`, `extend_json_lines`) and dumping it
+(`iter_json_compatible`, `dumps_many`) work on the columns directly, without
+creating a Record object per row.
+"""
+from __future__ import absolute_import
+import array
+from itertools import compress, izip
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+from pyschema import core, json_backend
+from pyschema.core import ParseError
+from pyschema.types import Integer, Float, Boolean, _uses_method
+
+_MISSING = object()
+
+
+class Bitmap(object):
+    """Sequence of booleans stored as one bit each"""
+    __slots__ = ("_bytes", "_length")
+
+    def __init__(self, values=()):
+        self._bytes = bytearray()
+        self._length = 0
+        for value in values:
+            self.append(value)
+
+    def append(self, value):
+        if not self._length & 7:
+            self._bytes.append(0)
+        if value:
+            self._bytes[self._length >> 3] |= 1 << (self._length & 7)
+        self._length += 1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Bitmap index out of range")
+        return bool(self._bytes[index >> 3] & (1 << (index & 7)))
+
+    def __iter__(self):
+        data = self._bytes
+        for index in xrange(self._length):
+            yield bool(data[index >> 3] & (1 << (index & 7)))
+
+    def take(self, indices):
+        """New Bitmap with the values at `indices`"""
+        return Bitmap(self[index] for index in indices)
+
+    def count(self):
+        """Number of True values"""
+        return sum(bin(byte).count("1") for byte in self._bytes)
+
+
+class ListColumn(object):
+    """Column storing field values in the list `values`"""
+    def __init__(self, field_type):
+        self.field_type = field_type
+        self.values = []
+
+    def check(self, value):
+        """Return `value` as it's stored in the column, or raise ValueError"""
+        return value
+
+    def append(self, value):
+        """Append a value returned by `check`"""
+        self.values.append(value)
+
+    def get(self, index):
+        return self.values[index]
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def take(self, indices):
+        """New column with the values at `indices`"""
+        column = self._empty()
+        column.values = [self.values[index] for index in indices]
+        return column
+
+    def dump(self, value):
+        """The json compatible form of a non-None value"""
+        return self.field_type.dump(value)
+
+    def _empty(self):
+        return self.__class__(self.field_type)
+
+
+class ArrayColumn(ListColumn):
+    """Column storing numbers in the `array.array` `values`
+
+    None is stored as 0, with a False bit in `mask`. `mask` is None for
+    fields that aren't nullable, which can't hold None values.
+    """
+    def __init__(self, field_type, typecode):
+        self.field_type = field_type
+        self.typecode = typecode
+        self.values = array.array(typecode)
+        self.mask = Bitmap() if field_type.nullable else None
+        if typecode in "bhil":
+            bits = 8 * self.values.itemsize - 1
+            self._range = (-(1 << bits), (1 << bits) - 1)
+        else:
+            self._range = None
+
+    def check(self, value):
+        if value is None:
+            if self.mask is None:
+                raise ValueError("None value for non-nullable field")
+            return None
+        value = self.field_type.dump(value)
+        if self._range is not None and not self._range[0] <= value <= self._range[1]:
+            raise ValueError("%r doesn't fit in a column of %r" % (value, self.typecode))
+        return value
+
+    def append(self, value):
+        if self.mask is not None:
+            self.mask.append(value is not None)
+        self.values.append(0 if value is None else value)
+
+    def get(self, index):
+        if self.mask is not None and not self.mask[index]:
+            return None
+        return self.values[index]
+
+    def __iter__(self):
+        if self.mask is None:
+            return iter(self.values)
+        return (value if present else None for value, present in izip(self.values, self.mask))
+
+    def take(self, indices):
+        indices = list(indices)
+        column = self._empty()
+        values = self.values
+        column.values = array.array(self.typecode, [values[index] for index in indices])
+        if self.mask is not None:
+            column.mask = self.mask.take(indices)
+        return column
+
+    def dump(self, value):
+        return value
+
+    def _empty(self):
+        return self.__class__(self.field_type, self.typecode)
+
+
+class BooleanColumn(ArrayColumn):
+    """Column storing booleans in the Bitmap `values`"""
+    def __init__(self, field_type):
+        self.field_type = field_type
+        self.values = Bitmap()
+        self.mask = Bitmap() if field_type.nullable else None
+
+    def check(self, value):
+        if value is None:
+            if self.mask is None:
+                raise ValueError("None value for non-nullable field")
+            return None
+        return self.field_type.dump(value)
+
+    def append(self, value):
+        if self.mask is not None:
+            self.mask.append(value is not None)
+        self.values.append(value)
+
+    def take(self, indices):
+        indices = list(indices)
+        column = self._empty()
+        column.values = self.values.take(indices)
+        if self.mask is not None:
+            column.mask = self.mask.take(indices)
+        return column
+
+    def _empty(self):
+        return self.__class__(self.field_type)
+
+
+def _integer_typecode(size):
+    for typecode in "bhil":
+        if array.array(typecode).itemsize >= size:
+            return typecode
+    return None
+
+
+def make_column(field_type):
+    """Empty column for values of `field_type`"""
+    if isinstance(field_type, Integer) and _uses_method(field_type, Integer, "dump"):
+        typecode = _integer_typecode(field_type.size)
+        if typecode is not None:
+            return ArrayColumn(field_type, typecode)
+    if isinstance(field_type, Float) and _uses_method(field_type, Float, "dump"):
+        return ArrayColumn(field_type, "d")
+    if isinstance(field_type, Boolean) and _uses_method(field_type, Boolean, "dump"):
+        return BooleanColumn(field_type)
+    return ListColumn(field_type)
+
+
+def _field_loaders(schema, validate):
+    return [
+        (field_name, field_type, core.compile_field_loader(field_type, core.JsonCompileContext(validate)))
+        for field_name, field_type in schema._fields.iteritems()
+    ]
+
+
+class RecordBatch(object):
+    """ Records of `schema` stored column by column
+
+    `columns` maps field names to columns, in `_fields` order. Indexing
+    a batch with an int creates a Record, slicing it creates a new batch.
+    """
+    def __init__(self, schema):
+        self.schema = schema
+        self.columns = OrderedDict(
+            (field_name, make_column(field_type))
+            for field_name, field_type in schema._fields.iteritems()
+        )
+        self._length = 0
+
+    @classmethod
+    def from_records(cls, schema, records):
+        batch = cls(schema)
+        batch.extend(records)
+        return batch
+
+    def __len__(self):
+        return self._length
+
+    def _append_values(self, values):
+        # check all values first, so a bad value leaves the batch unchanged
+        checked = [column.check(value) for column, value in izip(self.columns.itervalues(), values)]
+        for column, value in izip(self.columns.itervalues(), checked):
+            column.append(value)
+        self._length += 1
+
+    def append(self, record):
+        """Add the field values of `record`"""
+        self._append_values([getattr(record, field_name) for field_name in self.columns])
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def extend_json(self, dcts, validate=True):
+        """ Add rows from dicts as returned by `core.to_json_compatible`
+
+        Missing fields get their default values. See `core.from_json_compatible`
+        for `validate`.
+        """
+        loaders = core.schema_cached(
+            self.schema, ("batch_field_loaders", validate),
+            lambda schema: _field_loaders(schema, validate)
+        )
+        field_names = frozenset(self.schema._fields)
+        for dct in dcts:
+            if not field_names.issuperset(dct):
+                core._unexpected_field(self.schema, dct)
+            values = []
+            for field_name, field_type, load in loaders:
+                value = dct.get(field_name, _MISSING)
+                if value is _MISSING:
+                    value = field_type.default_value()
+                elif value is not None:
+                    value = load(value)
+                values.append(value)
+            self._append_values(values)
+
+    def extend_json_lines(self, lines, validate=True):
+        """Add rows from json strings as written by `core.dumps`"""
+        schema_name = core.get_full_name(self.schema)
+
+        def parse(lines):
+            for line in lines:
+                if not isinstance(line, unicode):
+                    line = line.decode("utf8")
+                if not line.startswith(u"{"):
+                    raise ParseError("Not a json record")
+                dct = json_backend.loads(line)
+                name = dct.pop(core.SCHEMA_FIELD_NAME, schema_name)
+                if name != schema_name:
+                    raise ParseError(
+                        "Record of schema %s in batch of %s" % (name, schema_name))
+                yield dct
+        self.extend_json(parse(lines), validate)
+
+    def iter_json_compatible(self):
+        """Yield a dict like `core.to_json_compatible` would return for each row"""
+        columns = [
+            (field_name, iter(column), column.dump)
+            for field_name, column in self.columns.iteritems()
+        ]
+        for _ in xrange(self._length):
+            dct = {}
+            for field_name, values, dump in columns:
+                value = next(values)
+                if value is not None:
+                    dct[field_name] = dump(value)
+            yield dct
+
+    def dumps_many(self, attach_schema_name=True):
+        """Yield a json string like `core.dumps` would return for each row"""
+        schema_name = core.get_full_name(self.schema)
+        encode = json_backend.dumps
+        for dct in self.iter_json_compatible():
+            if attach_schema_name:
+                dct[core.SCHEMA_FIELD_NAME] = schema_name
+            yield encode(dct)
+
+    def column(self, field_name):
+        """List of the values of a field, with None for missing values"""
+        return list(self.columns[field_name])
+
+    def take(self, indices):
+        """New batch with the rows at `indices`"""
+        indices = list(indices)
+        batch = self.__class__(self.schema)
+        batch.columns = OrderedDict(
+            (field_name, column.take(indices))
+            for field_name, column in self.columns.iteritems()
+        )
+        batch._length = len(indices)
+        return batch
+
+    def filter(self, selectors):
+        """ New batch with the rows for which `selectors` is true
+
+        `selectors` is either a function called with each row's Record,
+        or a sequence of booleans (e.g. a Bitmap) with one item per row.
+        """
+        if callable(selectors):
+            selectors = [selectors(record) for record in self]
+        return self.take(compress(xrange(self._length), selectors))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(xrange(*index.indices(self._length)))
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("RecordBatch index out of range")
+        return self.schema(**dict(
+            (field_name, column.get(index))
+            for field_name, column in self.columns.iteritems()
+        ))
+
+    def __iter__(self):
+        columns = [iter(column) for column in self.columns.itervalues()]
+        names = list(self.columns)
+        for _ in xrange(self._length):
+            yield self.schema(**dict(izip(names, [next(values) for values in columns])))
+
+    def to_records(self):
+        return list(self)
@@ -0,0 +1,434 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Compact binary encoding of records
+
+>>> data = dumps(record)
+>>> loads(data, MyRecord)
+
+The encoding has no schema information, so the data can only be read with
+the same schema definition it was written with. A record is encoded as:
+
+* a bitmap with one bit per nullable field, set if the field isn't None
+* the values of all non-None fields, in `_fields` order
+
+Values are encoded depending on their field type:
+
+* Integer: zig-zag varint, checked against the range of `size` bytes
+* Float: little endian IEEE 754, 4 or 8 bytes depending on `size`
+* Boolean: one byte
+* Text: varint length followed by the utf-8 encoded text
+* Bytes: varint length followed by the raw bytes
+* Enum: varint ordinal of the value in `Enum.symbols`
+* Date: varint of the proleptic Gregorian ordinal
+* DateTime: varint of microseconds since the epoch. Aware datetimes are
+  converted to UTC and loaded back as naive UTC datetimes (the json encoding
+  instead writes their offset, which `DateTime.load` can't parse)
+* List: varint item count followed by the items
+* Map: varint item count followed by (Text key, value) pairs
+* SubRecord: the record encoding of the sub record
+
+List items and Map values of nullable types are prefixed with a byte that is
+0 for None. Other field types, and subclasses that override `dump` or `load`,
+are encoded as length-prefixed `json_backend.dumps(field.dump(value))`.
+"""
+from __future__ import absolute_import
+import datetime
+import struct
+
+from pyschema import compiler, core, json_backend
+from pyschema.core import ParseError
+from pyschema.types import (
+    Text, Bytes, List, Enum, Integer, Boolean, Float, Date, DateTime, SubRecord, Map,
+    _uses_method
+)
+
+_DOUBLE = struct.Struct("<d")
+_FLOAT = struct.Struct("<f")
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def encode_long(n):
+    """Zig-zag varint encoding of an int or long"""
+    if n >= 0:
+        n <<= 1
+    else:
+        n = (~n << 1) | 1
+    if n < 0x80:
+        return chr(n)
+    chars = []
+    while n >= 0x80:
+        chars.append(chr((n & 0x7f) | 0x80))
+        n >>= 7
+    chars.append(chr(n))
+    return "".join(chars)
+
+
+def decode_long(buf, pos):
+    """Decode a zig-zag varint at `pos` of `buf`, returning (value, new_pos)"""
+    b = ord(buf[pos])
+    pos += 1
+    n = b & 0x7f
+    shift = 7
+    while b & 0x80:
+        b = ord(buf[pos])
+        pos += 1
+        n |= (b & 0x7f) << shift
+        shift += 7
+    return (n >> 1) ^ -(n & 1), pos
+
+
+def encode_bytes(s):
+    return encode_long(len(s)) + s
+
+
+def decode_bytes(buf, pos):
+    n, pos = decode_long(buf, pos)
+    end = pos + n
+    if n < 0 or end > len(buf):
+        raise ParseError("Truncated binary data")
+    return buf[pos:end], end
+
+
+def _text_codec(field_type):
+    dump = field_type.dump
+
+    def encode(obj):
+        if obj.__class__ is not unicode:
+            obj = dump(obj)
+        return encode_bytes(obj.encode("utf8"))
+
+    def decode(buf, pos):
+        s, pos = decode_bytes(buf, pos)
+        return s.decode("utf8"), pos
+    return encode, decode
+
+
+def _bytes_codec(field_type):
+    def encode(obj):
+        if not isinstance(obj, str):
+            raise ValueError("%r is not a byte string" % (obj,))
+        return encode_bytes(obj)
+    return encode, decode_bytes
+
+
+def _integer_codec(field_type):
+    bits = 8 * field_type.size - 1
+    low, high = -(1 << bits), (1 << bits) - 1
+    dump = field_type.dump
+
+    def encode(obj):
+        if obj.__class__ is not int:
+            dump(obj)
+        if not low <= obj <= high:
+            raise ValueError("%r doesn't fit in a %d byte Integer" % (obj, field_type.size))
+        return encode_long(obj)
+    return encode, decode_long
+
+
+def _float_codec(field_type):
+    packer = _FLOAT if field_type.size <= 4 else _DOUBLE
+    size = packer.size
+    dump = field_type.dump
+
+    def encode(obj):
+        return packer.pack(dump(obj))
+
+    def decode(buf, pos):
+        return packer.unpack_from(buf, pos)[0], pos + size
+    return encode, decode
+
+
+def _boolean_codec(field_type):
+    dump = field_type.dump
+
+    def encode(obj):
+        return "\x01" if dump(obj) else "\x00"
+
+    def decode(buf, pos):
+        c = buf[pos]
+        if c == "\x01":
+            return True, pos + 1
+        if c == "\x00":
+            return False, pos + 1
+        raise ParseError("Invalid Boolean value %r" % (c,))
+    return encode, decode
+
+
+def _enum_codec(field_type):
+    symbols = field_type.symbols
+    ordinals = dict((symbol, encode_long(i)) for i, symbol in enumerate(symbols))
+
+    def encode(obj):
+        try:
+            return ordinals[obj]
+        except (KeyError, TypeError):
+            # raises ValueError unless `obj` is a utf-8 encoded symbol
+            return encode_long(field_type.dump_ordinal(obj))
+
+    def decode(buf, pos):
+        index, pos = decode_long(buf, pos)
+        if not 0 <= index < len(symbols):
+            raise ParseError("Invalid Enum ordinal %d" % (index,))
+        return symbols[index], pos
+    return encode, decode
+
+
+def _date_codec(field_type):
+    def encode(obj):
+        if not isinstance(obj, datetime.date):
+            raise ValueError("Invalid value for Date field: %r" % (obj,))
+        return encode_long(obj.toordinal())
+
+    def decode(buf, pos):
+        ordinal, pos = decode_long(buf, pos)
+        return datetime.date.fromordinal(ordinal), pos
+    return encode, decode
+
+
+def _datetime_codec(field_type):
+    def encode(obj):
+        if not isinstance(obj, datetime.datetime):
+            raise ValueError("Invalid value for DateTime field: %r" % (obj,))
+        offset = obj.utcoffset()
+        if offset is not None:
+            obj = obj.replace(tzinfo=None) - offset
+        delta = obj - _EPOCH
+        return encode_long((delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+    def decode(buf, pos):
+        micros, pos = decode_long(buf, pos)
+        return _EPOCH + datetime.timedelta(microseconds=micros), pos
+    return encode, decode
+
+
+def _nullable_item_codec(field_type):
+    """Codec for items that are prefixed with a presence byte if their type is nullable"""
+    encode, decode = field_codec(field_type)
+    if not field_type.nullable:
+        return encode, decode
+
+    def encode_item(obj):
+        if obj is None:
+            return "\x00"
+        return "\x01" + encode(obj)
+
+    def decode_item(buf, pos):
+        if buf[pos] == "\x00":
+            return None, pos + 1
+        return decode(buf, pos + 1)
+    return encode_item, decode_item
+
+
+def _list_codec(field_type):
+    encode_item, decode_item = _nullable_item_codec(field_type.field_type)
+
+    def encode(obj):
+        if not isinstance(obj, (tuple, list)):
+            raise ValueError("%r is not a list object" % (obj,))
+        return encode_long(len(obj)) + "".join([encode_item(o) for o in obj])
+
+    def decode(buf, pos):
+        count, pos = decode_long(buf, pos)
+        items = []
+        for _ in xrange(count):
+            item, pos = decode_item(buf, pos)
+            items.append(item)
+        return items, pos
+    return encode, decode
+
+
+def _map_codec(field_type):
+    encode_key, decode_key = _text_codec(field_type.key_type)
+    encode_value, decode_value = _nullable_item_codec(field_type.value_type)
+
+    def encode(obj):
+        if not isinstance(obj, dict):
+            raise ValueError("%r is not a dict" % (obj,))
+        return encode_long(len(obj)) + "".join([
+            encode_key(k) + encode_value(v)
+            for k, v in obj.iteritems()
+        ])
+
+    def decode(buf, pos):
+        count, pos = decode_long(buf, pos)
+        dct = {}
+        for _ in xrange(count):
+            key, pos = decode_key(buf, pos)
+            dct[key], pos = decode_value(buf, pos)
+        return dct, pos
+    return encode, decode
+
+
+def _subrecord_codec(field_type):
+    # the record codecs are looked up on use, since schemas can be recursive
+    schema = field_type._schema
+
+    def encode(obj):
+        if not isinstance(obj, schema):
+            raise ValueError("%r is not a %r" % (obj, schema))
+        return record_encoder(schema)(obj)
+
+    def decode(buf, pos):
+        return record_decoder(schema)(buf, pos)
+    return encode, decode
+
+
+def _json_codec(field_type):
+    dump = field_type.dump
+    load = field_type.load
+
+    def encode(obj):
+        return encode_bytes(json_backend.dumps(dump(obj)).encode("utf8"))
+
+    def decode(buf, pos):
+        s, pos = decode_bytes(buf, pos)
+        return load(json_backend.loads(s.decode("utf8"))), pos
+    return encode, decode
+
+
+# field type => function returning (encode, decode) for a field of that type
+_CODECS = {
+    Text: _text_codec,
+    Bytes: _bytes_codec,
+    Integer: _integer_codec,
+    Float: _float_codec,
+    Boolean: _boolean_codec,
+    Enum: _enum_codec,
+    Date: _date_codec,
+    DateTime: _datetime_codec,
+    List: _list_codec,
+    Map: _map_codec,
+    SubRecord: _subrecord_codec,
+}
+
+
+def field_codec(field_type):
+    """ Return (encode, decode) functions for the non-None values of a field
+
+    encode(value) returns a byte string, decode(buf, pos) returns the
+    decoded value and the position after it.
+    """
+    for cls in type(field_type).__mro__:
+        if cls in _CODECS:
+            if _uses_method(field_type, cls, "dump") and _uses_method(field_type, cls, "load"):
+                return _CODECS[cls](field_type)
+            break
+    return _json_codec(field_type)
+
+
+def _encode_bitmap(bits, size):
+    return "".join([chr((bits >> (8 * i)) & 0xff) for i in xrange(size)])
+
+
+def _decode_bitmap(buf, pos, size):
+    if pos + size > len(buf):
+        raise ParseError("Truncated binary data")
+    bits = 0
+    for i in xrange(size):
+        bits |= ord(buf[pos + i]) << (8 * i)
+    return bits
+
+
+def _not_nullable(schema, field_name):
+    raise ValueError("Field %s of %s is not nullable" % (field_name, schema._schema_name))
+
+
+def _bitmap_size(schema):
+    nullable = sum(1 for field_type in schema._fields.itervalues() if field_type.nullable)
+    return (nullable + 7) // 8
+
+
+def _build_encoder(schema):
+    ctx = compiler.CompileContext()
+    record, out, bits, value = ctx.var("record"), ctx.var("out"), ctx.var("bits"), ctx.var("value")
+    lines = [
+        "def encode(%s):" % (record,),
+        "    %s = []" % (out,),
+        "    %s = 0" % (bits,),
+    ]
+    bit = 1
+    for field_name, field_type in schema._fields.iteritems():
+        encode, _ = field_codec(field_type)
+        lines.append("    %s = %s" % (value, ctx.attribute(record, field_name)))
+        if field_type.nullable:
+            lines.extend([
+                "    if %s is not None:" % (value,),
+                "        %s |= %d" % (bits, bit),
+                "        %s.append(%s)" % (out, ctx.call(encode, value)),
+            ])
+            bit <<= 1
+        else:
+            lines.extend([
+                "    if %s is None:" % (value,),
+                "        %s(%s, %r)" % (ctx.ref(_not_nullable), ctx.ref(schema, "schema"), field_name),
+                "    %s.append(%s)" % (out, ctx.call(encode, value)),
+            ])
+    lines.append("    return %s + \"\".join(%s)" % (
+        ctx.call(_encode_bitmap, bits, str(_bitmap_size(schema))), out))
+    return ctx.compile("encode", lines)
+
+
+def _build_decoder(schema):
+    ctx = compiler.CompileContext()
+    buf, pos, bits, kwargs = ctx.var("buf"), ctx.var("pos"), ctx.var("bits"), ctx.var("kwargs")
+    size = _bitmap_size(schema)
+    lines = [
+        "def decode(%s, %s):" % (buf, pos),
+        "    %s = %s" % (bits, ctx.call(_decode_bitmap, buf, pos, str(size))),
+        "    %s += %d" % (pos, size),
+        "    %s = {}" % (kwargs,),
+    ]
+    bit = 1
+    for field_name, field_type in schema._fields.iteritems():
+        _, decode = field_codec(field_type)
+        read = "%s[%r], %s = %s" % (kwargs, field_name, pos, ctx.call(decode, buf, pos))
+        if field_type.nullable:
+            lines.extend([
+                "    if %s & %d:" % (bits, bit),
+                "        %s" % (read,),
+                "    else:",
+                "        %s[%r] = None" % (kwargs, field_name),
+            ])
+            bit <<= 1
+        else:
+            lines.append("    %s" % (read,))
+    lines.append("    return %s(**%s), %s" % (ctx.ref(schema, "schema"), kwargs, pos))
+    return ctx.compile("decode", lines)
+
+
+def record_encoder(schema):
+    """Function returning the binary encoding of a `schema` record"""
+    return core.schema_cached(schema, "binary_encoder", _build_encoder)
+
+
+def record_decoder(schema):
+    """Function (buf, pos) -> (record, new_pos) decoding a `schema` record at `pos` of `buf`"""
+    return core.schema_cached(schema, "binary_decoder", _build_decoder)
+
+
+def dumps(record):
+    """Binary encoding of a record"""
+    return record_encoder(record.__class__)(record)
+
+
+def loads(s, schema):
+    """Create a `schema` record from its binary encoding"""
+    try:
+        record, pos = record_decoder(schema)(s, 0)
+    except (IndexError, struct.error, UnicodeDecodeError, ValueError, OverflowError), e:
+        # ValueError and OverflowError come from out of range dates and datetimes
+        raise ParseError("Invalid binary data: %s" % (e,))
+    if pos != len(s):
+        raise ParseError("Unexpected data after end of record")
+    return record
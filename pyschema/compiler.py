@@ -0,0 +1,109 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Helpers for generating specialised per-schema functions
+
+Serializers built with this module are plain Python source where the loop
+over `_fields` has been unrolled, so there is no per-record dict iteration,
+`getattr` or method dispatch for fields that have an inlined fast path.
+
+Field types take part in the generation through their `compile_dump` and
+`compile_load` methods, which return a Python *expression* for dumping or
+loading a value. The expression is given the name of a local variable holding
+the value, and may refer to any object made available through `ctx.ref`.
+The context passed to those methods is a `FieldCompileContext`.
+"""
+from __future__ import absolute_import
+from abc import ABCMeta, abstractmethod
+import keyword
+import re
+
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def is_identifier(name):
+    """True if `name` can be used as a plain Python name in generated source"""
+    return (
+        isinstance(name, basestring) and
+        _IDENTIFIER.match(name) is not None and
+        not keyword.iskeyword(name)
+    )
+
+
+class CompileContext(object):
+    """Bookkeeping for the source of one generated function"""
+
+    # if True, Enum values are dumped and loaded as their
+    # ordinals instead of as their symbols
+    enum_ordinals = False
+
+    def __init__(self, validate=True):
+        # if False, loaders may trust that values have the right types
+        # and only do the conversions that are necessary
+        self.validate = validate
+        self.namespace = {}
+        self._refs = {}
+        self._counter = 0
+
+    def ref(self, obj, hint="ref"):
+        """Make `obj` available to the generated code and return its name"""
+        # the namespace keeps a reference to obj, so its id can't be reused
+        key = id(obj)
+        if key not in self._refs:
+            name = self._name(hint)
+            self.namespace[name] = obj
+            self._refs[key] = name
+        return self._refs[key]
+
+    def var(self, hint="v"):
+        """Return a fresh local variable name"""
+        return self._name(hint)
+
+    def attribute(self, obj_expr, name):
+        """Expression for reading attribute `name` of `obj_expr`"""
+        if is_identifier(name):
+            return "%s.%s" % (obj_expr, name)
+        return "%s(%s, %r)" % (self.ref(getattr, "getattr"), obj_expr, name)
+
+    def call(self, func, *arg_exprs):
+        """Expression calling `func` with the given argument expressions"""
+        return "%s(%s)" % (self.ref(func), ", ".join(arg_exprs))
+
+    def compile(self, name, lines):
+        """Compile function `name` from the list of source `lines`"""
+        source = "\n".join(lines) + "\n"
+        code = compile(source, "<pyschema generated %s>" % (name,), "exec")
+        exec code in self.namespace
+        return self.namespace[name]
+
+    def _name(self, hint):
+        self._counter += 1
+        return "_%s%d" % (hint, self._counter)
+
+
+class FieldCompileContext(CompileContext):
+    """Context for the `compile_dump` and `compile_load` methods of field types
+
+    Subclasses decide how nested records are serialized by implementing
+    `dump_record` and `load_record`, which lets field types like SubRecord
+    generate code that is independent of the target format.
+    """
+    __metaclass__ = ABCMeta
+
+    @abstractmethod
+    def dump_record(self, schema, value):
+        """Expression dumping the non-None `schema` record in local `value`"""
+
+    @abstractmethod
+    def load_record(self, schema, value):
+        """Expression loading a `schema` record from the local `value`"""
@@ -58,10 +58,7 @@ except ImportError:
 
 import warnings
 import types   # absolute import, this is the python standard library types
-try:
-    import simplejson as json
-except ImportError:
-    import json
+from pyschema import compiler, json_backend
 
 
 SCHEMA_FIELD_NAME = "$schema"
@@ -90,6 +87,16 @@ class SchemaStore(object):
     def __init__(self):
         self._schema_map = {}
         self._enum_map = {}
+        # record name => schema for every name that has been resolved by
+        # `get`, including names only found through the namespace fallback
+        self._resolved = {}
+        # record names by integer id, see `schema_id`
+        self._ids = []
+        self._id_map = {}
+        # schema for each id, None until looked up by `get_by_id`
+        self._id_schemas = []
+        # values computed by `cached`, dropped whenever a record is added
+        self._derived = {}
 
     def __str__(self):
         return str(self._schema_map.keys())
@@ -148,6 +155,9 @@ class SchemaStore(object):
                     schema = existing
 
         self._schema_map[used_name] = schema
+        self._resolved.clear()
+        self._id_schemas = [None] * len(self._ids)
+        self._derived.clear()
 
     def get(self, record_name):
         """
@@ -157,28 +167,130 @@ class SchemaStore(object):
         If no such record is found any record matching the last part of the full name (without the namespace) will
         be returned.
         """
+        try:
+            return self._resolved[record_name]
+        except KeyError:
+            pass
         if record_name in self._schema_map:
-            return self._schema_map[record_name]
+            schema = self._schema_map[record_name]
         else:
             last_name = record_name.split('.')[-1]
-            return self._schema_map[last_name]
+            schema = self._schema_map[last_name]
+        self._resolved[record_name] = schema
+        return schema
+
+    def lookup_many(self, record_names):
+        """
+        Return a list with the matching record for each name in the sequence `record_names`
+
+        Raises KeyError if any of the names has no matching record, see `get`.
+        """
+        try:
+            return map(self._resolved.__getitem__, record_names)
+        except KeyError:
+            return [self.get(name) for name in record_names]
+
+    def schema_id(self, schema):
+        """
+        Return the small integer id of a record class, assigning the next free id if it has none.
+
+        Ids are assigned to full record names in the order they are first requested, so to read
+        data written with ids in another process, the ids have to be persisted alongside the
+        data (see `export_ids`) and loaded with `import_ids` before reading.
+        """
+        full_name = get_full_name(schema)
+        try:
+            return self._id_map[full_name]
+        except KeyError:
+            return self._add_id(full_name)
+
+    def _add_id(self, full_name):
+        schema_id = self._id_map[full_name] = len(self._ids)
+        self._ids.append(full_name)
+        self._id_schemas.append(None)
+        return schema_id
+
+    def get_by_id(self, schema_id):
+        """
+        Return the record with integer id `schema_id` or raise KeyError if there is none.
+        """
+        if schema_id >= 0:
+            try:
+                schema = self._id_schemas[schema_id]
+            except IndexError:
+                pass
+            else:
+                if schema is None:
+                    schema = self._id_schemas[schema_id] = self.get(self._ids[schema_id])
+                return schema
+        raise KeyError(schema_id)
+
+    def export_ids(self):
+        """Return the list of record names, indexed by id"""
+        return list(self._ids)
+
+    def import_ids(self, names):
+        """
+        Assign ids to record names from a list exported by `export_ids`.
+
+        Raises ValueError if any name or id already has a different assignment.
+        """
+        for schema_id, full_name in enumerate(names):
+            if schema_id < len(self._ids):
+                if self._ids[schema_id] != full_name:
+                    raise ValueError(
+                        "Id %d is already assigned to %s, not %s"
+                        % (schema_id, self._ids[schema_id], full_name))
+            elif full_name in self._id_map:
+                raise ValueError("%s already has id %d" % (full_name, self._id_map[full_name]))
+            else:
+                self._add_id(full_name)
 
     def get_enum(self, name):
         return self._enum_map[name]
 
+    def records(self):
+        """Return a list of the distinct record classes in the store"""
+        records = []
+        seen = set()
+        for schema in self._schema_map.itervalues():
+            if isinstance(schema, InvalidSchemaSpecification) or id(schema) in seen:
+                continue
+            seen.add(id(schema))
+            records.append(schema)
+        return records
+
+    def cached(self, key, factory):
+        """
+        Return `factory(store)`, computed once and reused until a record is added to the store.
+
+        For indices over the records of a store, see `schema_cached` for per-record values.
+        """
+        try:
+            return self._derived[key]
+        except KeyError:
+            value = self._derived[key] = factory(self)
+            return value
+
     def clear(self):
         self._schema_map.clear()
         self._enum_map.clear()
+        self._resolved.clear()
+        del self._ids[:]
+        self._id_map.clear()
+        del self._id_schemas[:]
+        self._derived.clear()
 
     def clone(self):
         r = SchemaStore()
         r._schema_map = self._schema_map.copy()
         r._enum_map = self._enum_map.copy()
+        r.import_ids(self._ids)
 
         return r
 
     def has_schema(self, name):
-        if name in self._schema_map:
+        if name in self._resolved or name in self._schema_map:
             return True
         if "." in name:
             basename = name.split(".")[-1]
@@ -224,6 +336,12 @@ _UNTOUCHED = object()
 class Field(object):
     __metaclass__ = ABCMeta
     _next_index = 0
+    # bumped by `mixin` to invalidate anything that was
+    # generated from the previous field type definitions
+    _mixin_generation = 0
+    # True if loaded values can't be modified in place, so their serialized
+    # form stays valid as long as the field isn't assigned (see `TrackedRecord`)
+    _immutable_values = False
 
     def __init__(self, description=None, nullable=True, default=_UNTOUCHED):
         self.description = description
@@ -268,6 +386,24 @@ class Field(object):
     def load(self, obj):
         pass
 
+    def compile_dump(self, ctx, value):
+        """Return a python expression dumping the non-None local `value`
+
+        Used for generating per-schema serializers (see `pyschema.compiler`).
+        Field types can override this to inline their checks, but the
+        result must always be the same as calling `dump`.
+        """
+        return ctx.call(self.dump, value)
+
+    def compile_load(self, ctx, value):
+        """Return a python expression loading the local `value`
+
+        Counterpart to `compile_dump`, must give the same result as `load`.
+        If `ctx.validate` is False the expression may skip any checks that
+        don't affect the result for valid input.
+        """
+        return ctx.call(self.load, value)
+
     @classmethod
     def mixin(cls, mixin_cls):
         """Decorator for mixing in additional functionality into field type
@@ -303,11 +439,23 @@ class Field(object):
                 item = item.im_func
 
             setattr(cls, item_name, item)
+        Field._mixin_generation += 1
         return mixin_cls
 
     def default_value(self):
         return self.default
 
+    def compile_default(self, ctx):
+        """Return a python expression creating the default value of a record
+
+        Used by the generated `Record.__init__`. Returns None if all records
+        can share `self.default`, which is the case unless `default_value`
+        has been overridden.
+        """
+        if type(self).default_value.im_func is Field.default_value.im_func:
+            return None
+        return ctx.call(self.default_value)
+
     def is_similar_to(self, other):
         return(
             type(self) == type(other) and
@@ -319,6 +467,25 @@ class Field(object):
 auto_store = SchemaStore()
 
 
+def _get_slot_state(record):
+    """Pickle state of a slotted record: a dict of all assigned slots"""
+    state = dict(getattr(record, "__dict__", ()))
+    for klass in type(record).__mro__:
+        for name in klass.__dict__.get("__slots__", ()):
+            if name in ("__dict__", "__weakref__"):
+                continue
+            try:
+                state[name] = getattr(record, name)
+            except AttributeError:
+                pass
+    return state
+
+
+def _set_slot_state(record, state):
+    for name, value in state.iteritems():
+        object.__setattr__(record, name, value)
+
+
 class PySchema(ABCMeta):
     """Metaclass for Records
 
@@ -334,16 +501,61 @@ class PySchema(ABCMeta):
             dct=dct
         )
         dct.update(schema_attrs)
+        use_slots = dct.get(
+            "_use_slots",
+            any(getattr(b, "_use_slots", False) for b in bases)
+        )
+        if use_slots:
+            metacls._add_slots(bases, dct)
         cls = ABCMeta.__new__(metacls, name, bases, dct)
 
+        if use_slots and cls.__dictoffset__ == 0:
+            # instances can't get any attributes except the slots, which
+            # makes the field name check in Record.__setattr__ redundant
+            setattr_owner = next(k for k in cls.__mro__ if "__setattr__" in k.__dict__)
+            if setattr_owner is Record:
+                cls.__setattr__ = object.__setattr__
+        elif cls.__dictoffset__ != 0:
+            # a non-slotted subclass (`_use_slots = False`) of a slotted schema
+            # needs the field name check back for its instance __dict__
+            setattr_owner = next(k for k in cls.__mro__ if "__setattr__" in k.__dict__)
+            if setattr_owner is not object and setattr_owner.__dict__["__setattr__"] is object.__setattr__:
+                cls.__setattr__ = Record.__dict__["__setattr__"]
+
         # allow self-references etc.
         for field_name, field in cls._fields.iteritems():
             field.set_parent(cls)
 
+        for method_name, method in _build_methods(cls).iteritems():
+            setattr(cls, method_name, method)
+
         if metacls.auto_register:
             auto_store.add_record(cls, _bump_stack_level=True)
         return cls
 
+    @classmethod
+    def _add_slots(metacls, bases, dct):
+        """Declare `__slots__` for all fields that no base class has a slot for
+
+        The Field definitions are removed from the class attributes, since
+        they would conflict with the slot descriptors. Use `_fields` instead.
+        """
+        inherited_slots = set()
+        for b in bases:
+            for klass in b.__mro__:
+                inherited_slots.update(klass.__dict__.get("__slots__", ()))
+        slots = list(dct.get("__slots__", ()))
+        for field_name in dct["_fields"]:
+            if field_name not in inherited_slots and field_name not in slots:
+                slots.append(field_name)
+            if isinstance(dct.get(field_name), Field):
+                del dct[field_name]
+        dct["__slots__"] = tuple(slots)
+        if "__getstate__" not in dct and not any(hasattr(b, "__getstate__") for b in bases):
+            # pickle protocols 0 and 1 can't handle slots by themselves
+            dct["__getstate__"] = _get_slot_state
+            dct["__setstate__"] = _set_slot_state
+
     @classmethod
     def _field_dupe_warning(metacls, name, fields):
         warnings.warn(
@@ -397,11 +609,15 @@ class PySchema(ABCMeta):
         else:
             wrap = no_auto_store()
 
+        dct = dict(cls.__dict__)
+        # these descriptors only work for instances of cls itself
+        dct.pop("__dict__", None)
+        dct.pop("__weakref__", None)
         return wrap(metacls.__new__(
             metacls,
             cls.__name__,
             (Record,),
-            dict(cls.__dict__)
+            dct
         ))
 
 
@@ -435,10 +651,154 @@ def no_auto_store():
     return decorator
 
 
+_MISSING = object()
+_NO_ARGS = object()
+
+
+def _positional_args():
+    raise TypeError('Non-keyword arguments not allowed'
+                    ' when initializing Records')
+
+
+def _build_init(schema):
+    """ Generate an `__init__` with one keyword argument per field of `schema`
+
+    Same behaviour as `Record.__init__`: shareable defaults are bound as
+    argument defaults, other defaults are only created for missing arguments,
+    and unknown keyword arguments are ignored. Returns None if some field name
+    can't be used as an argument name.
+    """
+    ctx = compiler.CompileContext()
+    record = ctx.var("self")
+    positional = ctx.var("positional")
+    extra = ctx.var("extra")
+    missing = ctx.ref(_MISSING, "MISSING")
+    args = [record, "%s=%s" % (positional, ctx.ref(_NO_ARGS, "NO_ARGS"))]
+    body = [
+        "    if %s is not %s:" % (positional, ctx.ref(_NO_ARGS, "NO_ARGS")),
+        "        %s()" % (ctx.ref(_positional_args),),
+    ]
+    local_names = set([record, positional, extra])
+    assignments = []
+    if schema.__dictoffset__ != 0:
+        fields_dict = ctx.var("dict")
+        local_names.add(fields_dict)
+        assignments.append("    %s = %s.__dict__" % (fields_dict, record))
+    for field_name, field_type in schema._fields.iteritems():
+        if not compiler.is_identifier(field_name):
+            return None
+        default = field_type.compile_default(ctx)
+        if default is None:
+            args.append("%s=%s" % (field_name, ctx.ref(field_type.default, "default")))
+        else:
+            args.append("%s=%s" % (field_name, missing))
+            body.extend([
+                "    if %s is %s:" % (field_name, missing),
+                "        %s = %s" % (field_name, default),
+            ])
+        descriptor = getattr(schema, field_name, None)
+        if schema.__dictoffset__ != 0 and not hasattr(type(descriptor), "__set__"):
+            assignments.append("    %s[%r] = %s" % (fields_dict, field_name, field_name))
+        else:
+            # slots and other data descriptors
+            assignments.append("    %s(%s, %r, %s)" % (
+                ctx.ref(object.__setattr__, "setattr"), record, field_name, field_name))
+    args.append("**%s" % (extra,))
+    if local_names.intersection(schema._fields) or set(ctx.namespace).intersection(schema._fields):
+        # a field name would hide one of the generated names
+        return None
+    lines = ["def __init__(%s):" % (", ".join(args),)] + body + assignments
+    if len(lines) == 1:
+        lines.append("    pass")
+    return ctx.compile("__init__", lines)
+
+
+def _build_comparisons(schema):
+    """ Generate `sort_key`, `__cmp__`, `__eq__`, `__ne__` and `__hash__` for `schema`
+
+    Records that aren't exact instances of `schema` are compared by the
+    `Record` implementations.
+    """
+    ctx = compiler.CompileContext()
+    record = ctx.var("self")
+    other = ctx.var("other")
+
+    def key(obj):
+        return "(%s)" % ("".join("%s, " % (ctx.attribute(obj, name),) for name in schema._fields),)
+
+    same_schema = "%s.__class__ is %s and %s.__class__ is %s" % (
+        record, ctx.ref(schema, "schema"), other, ctx.ref(schema, "schema"))
+    lines = [
+        "def sort_key(%s):" % (record,),
+        "    return %s" % (key(record),),
+        "def __hash__(%s):" % (record,),
+        "    return hash(%s)" % (key(record),),
+    ]
+    for name, result in [
+            ("__cmp__", "cmp(%s, %s)" % (key(record), key(other))),
+            ("__eq__", "%s == %s" % (key(record), key(other))),
+            ("__ne__", "%s != %s" % (key(record), key(other)))]:
+        lines.extend([
+            "def %s(%s, %s):" % (name, record, other),
+            "    if %s:" % (same_schema,),
+            "        return %s" % (result,),
+            "    return %s(%s, %s)" % (ctx.ref(getattr(Record, name).im_func, "generic"), record, other),
+        ])
+    ctx.compile("sort_key", lines)
+    return dict(
+        (name, ctx.namespace[name])
+        for name in ("sort_key", "__hash__", "__cmp__", "__eq__", "__ne__")
+    )
+
+
+def _build_methods(schema):
+    """The generated methods to install on `schema`, for all methods the user didn't define"""
+    def generated(name):
+        return getattr(getattr(schema, name, None), "_schema_generated", False)
+
+    methods = {}
+    if generated("__init__"):
+        init = _build_init(schema)
+        if init is not None:
+            methods["__init__"] = init
+    if generated("sort_key") or generated("__cmp__") or schema._hashable:
+        comparisons = _build_comparisons(schema)
+    if generated("sort_key"):
+        methods["sort_key"] = comparisons["sort_key"]
+    if generated("__cmp__"):
+        methods["__cmp__"] = comparisons["__cmp__"]
+        # Record.__eq__ and __ne__ are based on __cmp__, so they
+        # have to be kept if the user defined __cmp__
+        if generated("__eq__"):
+            methods["__eq__"] = comparisons["__eq__"]
+        if generated("__ne__"):
+            methods["__ne__"] = comparisons["__ne__"]
+    if schema._hashable and (schema.__hash__ is object.__hash__ or generated("__hash__")):
+        methods["__hash__"] = comparisons["__hash__"]
+    for method in methods.itervalues():
+        method._schema_generated = True
+    return methods
+
+
 @no_auto_store()
 class Record(object):
-    """Abstract base class for structured logging records"""
+    """Abstract base class for structured logging records
+
+    Set `_use_slots = True` in a schema to store field values in
+    `__slots__` instead of a per-instance `__dict__`. This saves a lot of
+    memory for small records, but removes the Field definitions from the
+    class attributes (they are still available in `_fields`).
+    Subclasses of a slotted schema are slotted too, unless they set
+    `_use_slots = False`.
+
+    Set `_hashable = True` to hash records by their field values (see
+    `sort_key`) instead of by identity. All field values need to be
+    hashable then, and records must not be modified while they are used
+    as dict keys or set members.
+    """
     __metaclass__ = PySchema
+    __slots__ = ()
+    _hashable = False
 
     def __init__(self, *args, **kwargs):
         if args:
@@ -498,28 +858,488 @@ class Record(object):
     def __ne__(self, other):
         return self.__cmp__(other) != 0
 
+    def sort_key(self):
+        """Tuple of the field values, in `_fields` order
 
-def to_json_compatible(record):
-    "Dump record in json-encodable object format"
-    d = {}
-    for fname, f in record._fields.iteritems():
-        val = getattr(record, fname)
-        if val is not None:
-            d[fname] = f.dump(val)
-    return d
+        Records of the same schema compare like their sort keys.
+        """
+        return tuple(getattr(self, key) for key in self._fields)
+
+# replaced by generated versions in schemas that don't override them, see `_build_methods`
+for _method in (Record.__init__, Record.__cmp__, Record.__eq__, Record.__ne__, Record.sort_key):
+    _method.im_func._schema_generated = True
+del _method
 
 
-def from_json_compatible(schema, dct):
-    "Load from json-encodable"
-    kwargs = {}
+def _hashable_value(value):
+    """`value` with nested lists and dicts replaced by tuples and frozensets"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable_value(v) for v in value)
+    if isinstance(value, dict):
+        return frozenset((k, _hashable_value(v)) for k, v in value.iteritems())
+    return value
 
+
+@no_auto_store()
+class FrozenRecord(Record):
+    """Base class for immutable records
+
+    Fields can't be assigned after a record has been created, which lets
+    its `to_json_compatible` dict, `dumps` string and hash be computed
+    once and reused. Field values that are mutable themselves, like lists,
+    must not be modified in place either. Unlike other `_hashable` records,
+    frozen records can be hashed with List and Map values.
+    """
+    __slots__ = ("_json_cache", "_dumps_cache", "_hash_cache")
+    _hashable = True
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Can't assign field %r of immutable %s" % (name, self._schema_name))
+
+    def __delattr__(self, name):
+        raise AttributeError("Can't delete field %r of immutable %s" % (name, self._schema_name))
+
+    def __hash__(self):
+        try:
+            return self._hash_cache
+        except AttributeError:
+            value = hash(_hashable_value(self.sort_key()))
+            object.__setattr__(self, "_hash_cache", value)
+            return value
+
+    def __getstate__(self):
+        # only the field values, the caches are rebuilt when needed
+        return dict((name, getattr(self, name)) for name in self._fields)
+
+    def __setstate__(self, state):
+        for name, value in state.iteritems():
+            object.__setattr__(self, name, value)
+
+
+class _SchemaCache(dict):
+    def __init__(self, generation):
+        super(_SchemaCache, self).__init__()
+        self.generation = generation
+
+
+def schema_cached(schema, key, factory):
+    """ Return `factory(schema)`, computed once per schema class and `key`
+
+    The cache is stored on the class itself (never inherited by subclasses)
+    and is dropped whenever field types are changed through `Field.mixin`.
+    """
+    cache = schema.__dict__.get("_schema_cache")
+    if cache is None or cache.generation != Field._mixin_generation:
+        cache = _SchemaCache(Field._mixin_generation)
+        setattr(schema, "_schema_cache", cache)
+    try:
+        return cache[key]
+    except KeyError:
+        value = cache[key] = factory(schema)
+        return value
+
+
+def copy_json_compatible(obj):
+    """Copy of a nested structure of dicts and lists, the other values are shared"""
+    if isinstance(obj, dict):
+        return obj.__class__((k, copy_json_compatible(v)) for k, v in obj.iteritems())
+    if isinstance(obj, list):
+        return [copy_json_compatible(v) for v in obj]
+    return obj
+
+
+def compile_record_dumper(schema, ctx, dump_field, skip_none=True, raw_backed=False):
+    """ Generate a function dumping records of `schema` to a dict
+
+    :param dump_field:
+        Function (field, value_name) -> python expression for the dumped value
+
+    :param skip_none:
+        Leave out keys for None values instead of passing them to `dump_field`
+
+    :param raw_backed:
+        Records have a `_raw` dict of already serialized values (see `RawBackedRecord`)
+        that should be copied verbatim instead of dumping the corresponding fields
+    """
+    record = ctx.var("record")
+    dct = ctx.var("dct")
+    value = ctx.var("value")
+    lines = ["def dump(%s):" % (record,)]
+    if raw_backed:
+        raw = ctx.var("raw")
+        lines.extend([
+            "    %s = %s._raw" % (raw, record),
+            "    %s = %s.copy()" % (dct, raw),
+        ])
+    else:
+        lines.append("    %s = {}" % (dct,))
+    for field_name, field_type in schema._fields.iteritems():
+        indent = "    "
+        if raw_backed:
+            lines.append("    if %r not in %s:" % (field_name, raw))
+            indent += "    "
+        lines.append("%s%s = %s" % (indent, value, ctx.attribute(record, field_name)))
+        if skip_none:
+            lines.append("%sif %s is not None:" % (indent, value))
+            indent += "    "
+        lines.append("%s%s[%r] = %s" % (indent, dct, field_name, dump_field(field_type, value)))
+    lines.append("    return %s" % (dct,))
+    return ctx.compile("dump", lines)
+
+
+def _projected_fields(schema, fields):
+    """The (name, field) pairs of `schema` that are listed in `fields`, in schema order"""
+    if fields is None:
+        return schema._fields.items()
+    unknown = set(fields) - set(schema._fields)
+    if unknown:
+        raise ValueError(
+            "Projected fields not in schema %s: %s"
+            % (schema._schema_name, ", ".join(sorted(unknown))))
+    return [(name, field_type) for name, field_type in schema._fields.iteritems() if name in fields]
+
+
+def compile_record_loader(schema, ctx, load_field, on_unexpected, fields=None):
+    """ Generate a function creating a `schema` record from a dict
+
+    :param load_field:
+        Function (field, value_name) -> python expression for the loaded value
+
+    :param on_unexpected:
+        Called as on_unexpected(schema, dct) if `dct` has keys that aren't fields
+        of the schema. If it returns, the unknown keys are ignored.
+
+    :param fields:
+        Only load the fields with these names, all other keys of the dict
+        are ignored without being checked, and the fields get their defaults
+    """
+    dct = ctx.var("dct")
+    kwargs = ctx.var("kwargs")
+    value = ctx.var("value")
+    missing = ctx.ref(_MISSING, "MISSING")
+    lines = [
+        "def load(%s):" % (dct,),
+        "    %s = {}" % (kwargs,),
+    ]
+    for field_name, field_type in _projected_fields(schema, fields):
+        lines.extend([
+            "    %s = %s.get(%r, %s)" % (value, dct, field_name, missing),
+            "    if %s is not %s:" % (value, missing),
+            "        %s[%r] = %s" % (kwargs, field_name, load_field(field_type, value)),
+        ])
+    if fields is None:
+        lines.extend([
+            "    if len(%s) != len(%s):" % (kwargs, dct),
+            "        %s(%s, %s)" % (ctx.ref(on_unexpected, "unexpected"), ctx.ref(schema, "schema"), dct),
+        ])
+    lines.append("    return %s(**%s)" % (ctx.ref(schema, "schema"), kwargs))
+    return ctx.compile("load", lines)
+
+
+class JsonCompileContext(compiler.FieldCompileContext):
+    def dump_record(self, schema, value):
+        return self.call(to_json_compatible, value)
+
+    def load_record(self, schema, value):
+        if self.validate:
+            return self.call(from_json_compatible, self.ref(schema, "schema"), value)
+        return self.call(from_json_compatible, self.ref(schema, "schema"), value, "validate=False")
+
+
+def _unexpected_field(schema, dct):
     for key in dct:
-        field_type = schema._fields.get(key)
-        if field_type is None:
+        if key not in schema._fields:
             raise ParseError("Unexpected field encountered in line for record %s: %s" % (schema.__name__, key))
-        kwargs[key] = field_type.load(dct[key])
 
-    return schema(**kwargs)
+
+def _build_json_dumper(schema):
+    ctx = JsonCompileContext()
+    dumper = compile_record_dumper(
+        schema, ctx,
+        lambda field_type, value: field_type.compile_dump(ctx, value),
+        raw_backed=issubclass(schema, RawBackedRecord)
+    )
+    if issubclass(schema, FrozenRecord):
+        return _cached_dumper(dumper)
+    return dumper
+
+
+def _cached_dumper(dumper):
+    """Dump a FrozenRecord once, and return copies of the result from then on"""
+    set_cache = object.__setattr__
+
+    def dump(record):
+        try:
+            dct = record._json_cache
+        except AttributeError:
+            dct = dumper(record)
+            set_cache(record, "_json_cache", dct)
+        return copy_json_compatible(dct)
+    return dump
+
+
+def _frozen_dumps(record):
+    """`dumps` for a FrozenRecord with the default arguments, cached per json backend"""
+    backend = json_backend.get_backend()
+    cached = getattr(record, "_dumps_cache", None)
+    if cached is not None and cached[0] is backend:
+        return cached[1]
+    json_dct = to_json_compatible(record)
+    json_dct[SCHEMA_FIELD_NAME] = get_full_name(record.__class__)
+    json_string = json_backend.dumps(json_dct)
+    object.__setattr__(record, "_dumps_cache", (backend, json_string))
+    return json_string
+
+
+def compile_field_loader(field_type, ctx):
+    """Generate a function loading a single value of `field_type`"""
+    value = ctx.var("value")
+    return ctx.compile("load", [
+        "def load(%s):" % (value,),
+        "    return %s" % (field_type.compile_load(ctx, value),),
+    ])
+
+
+def _build_json_loader(schema, validate=True, fields=None):
+    ctx = JsonCompileContext(validate)
+    return compile_record_loader(
+        schema, ctx,
+        lambda field_type, value: field_type.compile_load(ctx, value),
+        _unexpected_field,
+        fields
+    )
+
+
+class RawBackedRecord(object):
+    """ Mixin for records keeping the serialized form of their fields
+
+    `_raw` is a dict of json-compatible values for fields that haven't been
+    assigned since the record was loaded. When dumped, those values are
+    copied as they are instead of being serialized again.
+    """
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        super(RawBackedRecord, self).__setattr__(name, value)
+        self._raw.pop(name, None)
+
+
+class _LazyField(object):
+    """ Class attribute decoding a field from `_raw` on first access
+
+    This is a non-data descriptor, so once the decoded value has been
+    stored on the instance, the descriptor isn't involved anymore.
+    """
+    def __init__(self, name, field_type, load):
+        self.name = name
+        self.field_type = field_type
+        self.load = load
+
+    def __get__(self, record, cls):
+        if record is None:
+            return self.field_type
+        raw = record._raw
+        if self.name in raw:
+            value = self.load(raw[self.name])
+            # the value may be mutated in place from now on, so it has to be dumped again
+            del raw[self.name]
+        else:
+            value = self.field_type.default_value()
+        object.__setattr__(record, self.name, value)
+        return value
+
+
+class LazyRecord(RawBackedRecord):
+    """ Mixin for records decoding their fields on first attribute access
+
+    Instances are created by `from_json_compatible(schema, dct, lazy=True)`
+    and belong to a subclass of `schema`. Fields that are never accessed are
+    never validated, and are serialized exactly as they were loaded.
+
+    Pickling or copying a lazy record decodes all of its fields, and
+    the result is a plain `schema` record.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        schema = self._source_schema
+        values = dict((field_name, getattr(self, field_name)) for field_name in schema._fields)
+        return (_rebuild_record, (schema, values))
+
+
+def _rebuild_record(schema, values):
+    """Create a `schema` record with the given field values, without calling __init__"""
+    record = schema.__new__(schema)
+    for field_name, value in values.iteritems():
+        object.__setattr__(record, field_name, value)
+    return record
+
+
+class _LazySlotField(_LazyField):
+    """ Lazy field for slotted schemas
+
+    The value is stored in the slot of the original schema, so this has to
+    be a data descriptor that is consulted on every access.
+    """
+    def __init__(self, name, field_type, load, slot):
+        super(_LazySlotField, self).__init__(name, field_type, load)
+        self.slot = slot
+
+    def __get__(self, record, cls):
+        if record is None:
+            return self.field_type
+        try:
+            return self.slot.__get__(record, cls)
+        except AttributeError:
+            return super(_LazySlotField, self).__get__(record, cls)
+
+    def __set__(self, record, value):
+        self.slot.__set__(record, value)
+
+
+def _make_lazy_class(schema, validate=True):
+    dct = {
+        "__slots__": ("_raw",),
+        "__module__": schema.__module__,
+        "__doc__": schema.__doc__,
+        "_source_schema": schema,
+    }
+    for field_name, field_type in schema._fields.iteritems():
+        load = compile_field_loader(field_type, JsonCompileContext(validate))
+        if schema.__dictoffset__ == 0:
+            dct[field_name] = _LazySlotField(field_name, field_type, load, getattr(schema, field_name))
+        else:
+            dct[field_name] = _LazyField(field_name, field_type, load)
+    return no_auto_store()(
+        PySchema(schema.__name__, (LazyRecord, schema), dct)
+    )
+
+
+def _build_lazy_loader(schema, validate=True):
+    lazy_class = _make_lazy_class(schema, validate)
+    new = object.__new__
+    set_raw = object.__setattr__
+    field_names = frozenset(schema._fields)
+
+    def load(dct):
+        if not field_names.issuperset(dct):
+            _unexpected_field(schema, dct)
+        record = new(lazy_class)
+        set_raw(record, "_raw", dct)
+        return record
+    return load
+
+
+class TrackedRecord(RawBackedRecord):
+    """ Mixin for records remembering the dict they were loaded from
+
+    Instances are created by `from_json_compatible(schema, dct, keep_raw=True)`
+    and belong to a subclass of `schema`. All fields are decoded right away,
+    but fields with immutable values (like Text, Integer or DateTime) are
+    copied from the source dict when dumped, unless they have been assigned
+    since. Fields whose values can be modified in place (List, Map, SubRecord
+    and other field types) are always dumped again.
+
+    Copies and pickles of a tracked record are tracked records too.
+    """
+    __slots__ = ()
+
+    def __reduce__(self):
+        schema = self._source_schema
+        values = dict((field_name, getattr(self, field_name)) for field_name in schema._fields)
+        return (_rebuild_tracked_record, (schema, values, dict(self._raw)))
+
+
+def _rebuild_tracked_record(schema, values, raw):
+    """Create a `TrackedRecord` of `schema` with the given field values and `_raw` dict"""
+    record = _rebuild_record(schema_cached(schema, "tracked_class", _make_tracked_class), values)
+    object.__setattr__(record, "_raw", raw)
+    return record
+
+
+def _make_tracked_class(schema):
+    dct = {
+        "__slots__": ("_raw",),
+        "__module__": schema.__module__,
+        "__doc__": schema.__doc__,
+        "_source_schema": schema,
+    }
+    return no_auto_store()(
+        PySchema(schema.__name__, (TrackedRecord, schema), dct)
+    )
+
+
+def _build_tracked_loader(schema, validate=True):
+    tracked_class = schema_cached(schema, "tracked_class", _make_tracked_class)
+    load = _build_json_loader(tracked_class, validate)
+    set_raw = object.__setattr__
+    kept = frozenset(
+        field_name for field_name, field_type in schema._fields.iteritems()
+        if field_type._immutable_values
+    )
+
+    def load_tracked(dct):
+        record = load(dct)
+        set_raw(record, "_raw", dict((key, dct[key]) for key in kept.intersection(dct)))
+        return record
+    return load_tracked
+
+
+def _json_loader(schema, lazy=False, validate=True, fields=None, keep_raw=False):
+    if keep_raw:
+        if lazy or fields is not None:
+            raise ValueError("keep_raw can't be combined with lazy loading or field projection")
+        return schema_cached(
+            schema, ("tracked_loader", validate),
+            lambda schema: _build_tracked_loader(schema, validate)
+        )
+    if lazy:
+        if fields is not None:
+            raise ValueError("Lazy loading can't be combined with field projection")
+        return schema_cached(
+            schema, ("lazy_loader", validate),
+            lambda schema: _build_lazy_loader(schema, validate)
+        )
+    if fields is not None:
+        fields = frozenset(fields)
+    return schema_cached(
+        schema, ("json_loader", validate, fields),
+        lambda schema: _build_json_loader(schema, validate, fields)
+    )
+
+
+def to_json_compatible(record):
+    "Dump record in json-encodable object format"
+    dumper = schema_cached(record.__class__, "json_dumper", _build_json_dumper)
+    return dumper(record)
+
+
+def from_json_compatible(schema, dct, lazy=False, validate=True, fields=None, keep_raw=False):
+    """ Load from json-encodable
+
+    :param lazy:
+        Return a `LazyRecord` that only loads fields when they are accessed.
+        Validation errors for a field are raised on first access. The record
+        keeps a shallow copy of `dct`, which must not be modified in place.
+
+    :param validate:
+        If False, values are trusted to have the right json types (e.g. data
+        that was written by `dumps`) and only necessary conversions are done,
+        like parsing dates or decoding bytes. Sub records are loaded the same way.
+
+    :param fields:
+        Names of the fields to load. Other keys in `dct` are skipped entirely
+        and the remaining fields of the record keep their default values.
+
+    :param keep_raw:
+        Return a `TrackedRecord` that keeps the values of immutable fields
+        from `dct` and only dumps those fields again if they are assigned
+        after loading.
+    """
+    if lazy:
+        # the lazy record deletes keys from its raw dict as fields are decoded
+        dct = dict(dct)
+    return _json_loader(schema, lazy, validate, fields, keep_raw)(dct)
 
 
 def ispyschema(schema):
@@ -538,11 +1358,37 @@ def ispyschema(schema):
     return isinstance(schema, PySchema)
 
 
+def _pop_schema_name(dct):
+    try:
+        return dct.pop(SCHEMA_FIELD_NAME)
+    except KeyError:
+        raise ParseError((
+            "Serialized record missing '{0}' "
+            "record identifier and no schema supplied")
+            .format(SCHEMA_FIELD_NAME)
+        )
+
+
+def _lookup_schema(record_store, schema_name):
+    try:
+        if isinstance(schema_name, basestring):
+            return record_store.get(schema_name)
+        # bool is a subclass of int, but never a schema id
+        if isinstance(schema_name, (int, long)) and not isinstance(schema_name, bool):
+            return record_store.get_by_id(schema_name)
+        raise KeyError(schema_name)
+    except KeyError:
+        raise ParseError(
+            "Can't recognize record type %r"
+            % (schema_name,), schema_name)
+
+
 def load_json_dct(
         dct,
         record_store=None,
         schema=None,
-        loader=from_json_compatible
+        loader=from_json_compatible,
+        **loader_options
 ):
     """ Create a Record instance from a json-compatible dictionary
 
@@ -553,36 +1399,27 @@ def load_json_dct(
         Python dictionary with key/value pairs for the record
 
     :param record_store:
-        Record store to use for schema lookups (when $schema field is present)
+        Record store to use for schema lookups (when $schema field is present).
+        Integer $schema values are looked up as ids (see `SchemaStore.schema_id`)
 
     :param schema:
         PySchema Record class for the record to load.
         This will override any $schema fields specified in `dct`
 
+    :param loader_options:
+        Extra keyword arguments for `loader`, e.g. `lazy` for `from_json_compatible`
+
     """
     if schema is None:
         if record_store is None:
             record_store = auto_store
-        try:
-            schema_name = dct.pop(SCHEMA_FIELD_NAME)
-        except KeyError:
-            raise ParseError((
-                "Serialized record missing '{0}' "
-                "record identifier and no schema supplied")
-                .format(SCHEMA_FIELD_NAME)
-            )
-        try:
-            schema = record_store.get(schema_name)
-        except KeyError:
-            raise ParseError(
-                "Can't recognize record type %r"
-                % (schema_name,), schema_name)
+        schema = _lookup_schema(record_store, _pop_schema_name(dct))
 
     # if schema is explicit, use that instead of SCHEMA_FIELD_NAME
     elif SCHEMA_FIELD_NAME in dct:
         dct.pop(SCHEMA_FIELD_NAME)
 
-    record = loader(schema, dct)
+    record = loader(schema, dct, **loader_options)
     return record
 
 
@@ -591,7 +1428,8 @@ def loads(
         record_store=None,
         schema=None,
         loader=from_json_compatible,
-        record_class=None  # deprecated in favor of schema
+        record_class=None,  # deprecated in favor of schema
+        **loader_options
 ):
     """ Create a Record instance from a json serialized dictionary
 
@@ -611,6 +1449,13 @@ def loads(
     :param record_class:
         DEPRECATED option, old name for the `schema` parameter
 
+    :param loader_options:
+        Extra keyword arguments for `loader`. `from_json_compatible` accepts:
+        lazy - if True, fields are decoded on first access (see `LazyRecord`)
+        validate - if False, skip type checks for trusted data
+        fields - names of the only fields to load, others get default values
+        keep_raw - if True, unchanged immutable fields are dumped from `s` (see `TrackedRecord`)
+
     """
     if record_class is not None:
         warnings.warn(
@@ -622,16 +1467,127 @@ def loads(
     if not isinstance(s, unicode):
         s = s.decode('utf8')
     if s.startswith(u"{"):
-        json_dct = json.loads(s)
-        return load_json_dct(json_dct, record_store, schema, loader)
+        json_dct = json_backend.loads(s)
+        return load_json_dct(json_dct, record_store, schema, loader, **loader_options)
     else:
         raise ParseError("Not a json record")
 
 
-def dumps(obj, attach_schema_name=True):
+def dumps(obj, attach_schema_name=True, id_store=None):
+    """ Serialize a record to a json string
+
+    :param attach_schema_name:
+        Add a $schema field identifying the record class
+
+    :param id_store:
+        If given, the $schema field is the record class' integer id in this SchemaStore
+        instead of its name. The ids need to be available when loading the records,
+        see `SchemaStore.schema_id`
+
+    The result for a `FrozenRecord` with the default arguments is
+    computed once and cached on the record.
+    """
+    if attach_schema_name and id_store is None and isinstance(obj, FrozenRecord):
+        return _frozen_dumps(obj)
     json_dct = to_json_compatible(obj)
     if attach_schema_name:
-        json_dct[SCHEMA_FIELD_NAME] = get_full_name(obj.__class__)
+        if id_store is None:
+            json_dct[SCHEMA_FIELD_NAME] = get_full_name(obj.__class__)
+        else:
+            json_dct[SCHEMA_FIELD_NAME] = id_store.schema_id(obj.__class__)
 
-    json_string = json.dumps(json_dct)
+    json_string = json_backend.dumps(json_dct)
     return json_string
+
+
+def _bound_loader(schema, loader, loader_options):
+    if loader is from_json_compatible:
+        return _json_loader(schema, **loader_options)
+    return lambda dct: loader(schema, dct, **loader_options)
+
+
+def loads_many(
+        lines,
+        schema=None,
+        record_store=None,
+        loader=from_json_compatible,
+        **loader_options
+):
+    """ Lazily create Record instances from an iterable of json strings
+
+    Equivalent to calling `loads` on every line, but schema lookups and
+    loader setup are done once per distinct `$schema` value instead of
+    once per line.
+
+    :param lines:
+        Iterable of json-serialized records, e.g. an open file
+
+    :param schema:
+        PySchema Record class for all records.
+        This will override any $schema fields in the lines
+
+    :param record_store:
+        Record store to use for schema lookups (when $schema field is present)
+
+    :param loader_options:
+        Extra keyword arguments for `loader`, as for `loads`
+
+    """
+    if record_store is None:
+        record_store = auto_store
+    decode = json_backend.loads
+    if schema is not None:
+        bound = _bound_loader(schema, loader, loader_options)
+    else:
+        loaders = {}
+
+    for s in lines:
+        if not isinstance(s, unicode):
+            s = s.decode('utf8')
+        if not s.startswith(u"{"):
+            raise ParseError("Not a json record")
+        dct = decode(s)
+        if schema is not None:
+            dct.pop(SCHEMA_FIELD_NAME, None)
+        else:
+            schema_name = _pop_schema_name(dct)
+            # only names and ids are cached, other values (like false, which
+            # would equal id 0) are rejected by _lookup_schema every time
+            cacheable = isinstance(schema_name, basestring) or (
+                isinstance(schema_name, (int, long)) and not isinstance(schema_name, bool))
+            bound = loaders.get(schema_name) if cacheable else None
+            if bound is None:
+                bound = _bound_loader(
+                    _lookup_schema(record_store, schema_name),
+                    loader,
+                    loader_options
+                )
+                if cacheable:
+                    loaders[schema_name] = bound
+        yield bound(dct)
+
+
+def dumps_many(records, attach_schema_name=True, id_store=None):
+    """ Lazily serialize an iterable of records to json strings
+
+    Equivalent to calling `dumps` on every record, but dumpers and schema
+    names are only looked up once per record class.
+    """
+    encode = json_backend.dumps
+    dumpers = {}
+    for record in records:
+        if attach_schema_name and id_store is None and isinstance(record, FrozenRecord):
+            yield _frozen_dumps(record)
+            continue
+        cls = record.__class__
+        try:
+            dumper, schema_name = dumpers[cls]
+        except KeyError:
+            dumper, schema_name = dumpers[cls] = (
+                schema_cached(cls, "json_dumper", _build_json_dumper),
+                get_full_name(cls) if id_store is None else id_store.schema_id(cls)
+            )
+        json_dct = dumper(record)
+        if attach_schema_name:
+            json_dct[SCHEMA_FIELD_NAME] = schema_name
+        yield encode(json_dct)
@@ -0,0 +1,308 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Buffered reading and writing of newline delimited json records
+
+Usage:
+
+>>> with open("records.json.gz", "wb") as f:
+...     with RecordWriter(f, compression="gzip") as writer:
+...         writer.write_many(records)
+...
+>>> with open("records.json.gz", "rb") as f:
+...     for record in RecordReader(f, compression="gzip"):
+...         print record
+
+"""
+from __future__ import absolute_import
+import bz2
+import gzip
+
+from pyschema import core, json_backend
+
+DEFAULT_BUFFER_SIZE = 1024 * 1024
+# key of the lines RecordWriter writes the schema id table to, see `id_store`
+IDS_FIELD_NAME = "$ids"
+_IDS_PREFIX = '{"%s"' % (IDS_FIELD_NAME,)
+
+
+class _Bz2Reader(object):
+    """Minimal read-only file object decompressing a bz2 stream
+
+    The standard library BZ2File can only open files by name.
+    Supports concatenated streams, as produced by parallel compressors.
+    """
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._decompressor = bz2.BZ2Decompressor()
+
+    def read(self, size):
+        while True:
+            data = self._fileobj.read(size)
+            if not data:
+                return ""
+            output = self._decompress(data)
+            if output:
+                return output
+
+    def _decompress(self, data):
+        output = []
+        while data:
+            try:
+                output.append(self._decompressor.decompress(data))
+            except EOFError:
+                # the previous stream ended exactly at the end of a block
+                self._decompressor = bz2.BZ2Decompressor()
+                continue
+            # anything after the end of a stream belongs to the next one
+            data = self._decompressor.unused_data
+            if data:
+                self._decompressor = bz2.BZ2Decompressor()
+        return "".join(output)
+
+    def close(self):
+        pass
+
+
+class _Bz2Writer(object):
+    """Minimal write-only file object compressing to a bz2 stream"""
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._compressor = bz2.BZ2Compressor()
+
+    def write(self, data):
+        compressed = self._compressor.compress(data)
+        if compressed:
+            self._fileobj.write(compressed)
+
+    def flush(self):
+        self._fileobj.flush()
+
+    def close(self):
+        self._fileobj.write(self._compressor.flush())
+        self._fileobj.flush()
+
+
+def _wrap(fileobj, compression, mode):
+    if compression is None:
+        return fileobj
+    elif compression == "gzip":
+        return gzip.GzipFile(fileobj=fileobj, mode=mode)
+    elif compression == "bz2":
+        if mode == "rb":
+            return _Bz2Reader(fileobj)
+        return _Bz2Writer(fileobj)
+    raise ValueError("Unsupported compression: %r" % (compression,))
+
+
+class _FileSchemaIds(object):
+    """ Schema lookups for one file, resolving ids through the file's id tables
+
+    Names are looked up in `record_store`, whose own ids are ignored.
+    """
+    def __init__(self, record_store):
+        self.record_store = record_store
+        # record names by id, from the last id table read
+        self.names = []
+
+    def get(self, record_name):
+        return self.record_store.get(record_name)
+
+    def get_by_id(self, schema_id):
+        if not 0 <= schema_id < len(self.names):
+            raise KeyError(schema_id)
+        return self.record_store.get(self.names[schema_id])
+
+
+class RecordReader(object):
+    """ Iterate over the records in a file of `core.dumps` lines
+
+    The file is read in large blocks instead of line by line.
+
+    :param fileobj:
+        File object to read from, opened in binary mode
+
+    :param schema:
+        PySchema Record class for all records, overriding any $schema fields
+
+    :param record_store:
+        Record store to use for schema lookups (when $schema field is present)
+
+    :param compression:
+        None, "gzip" or "bz2"
+
+    :param loads:
+        Function used to load each line. Defaults to the batched equivalent of `core.loads`
+
+    Integer schema ids written by a RecordWriter with an `id_store` are
+    resolved through the id tables in the file itself, and the names they
+    map to are looked up in `record_store`. Ids of other stores, including
+    `record_store`, aren't used. A custom `loads` function only gets the
+    record lines, without the id tables.
+    """
+    def __init__(self, fileobj, schema=None, record_store=None,
+                 compression=None, buffer_size=DEFAULT_BUFFER_SIZE, loads=None):
+        self._raw_fileobj = fileobj
+        self.fileobj = _wrap(fileobj, compression, "rb")
+        self.schema = schema
+        self.record_store = record_store
+        self.buffer_size = buffer_size
+        self.loads = loads
+        self._schema_ids = _FileSchemaIds(core.auto_store if record_store is None else record_store)
+
+    def lines(self):
+        """Iterate over the raw lines of the file, without line endings"""
+        read = self.fileobj.read
+        size = self.buffer_size
+        # pieces of a line that hasn't ended yet, joined once it does
+        pending = []
+        while True:
+            block = read(size)
+            if not block:
+                break
+            if "\n" not in block:
+                pending.append(block)
+                continue
+            lines = block.split("\n")
+            if pending:
+                pending.append(lines[0])
+                lines[0] = "".join(pending)
+            pending = [lines.pop()]
+            for line in lines:
+                yield line
+        tail = "".join(pending)
+        if tail:
+            yield tail
+
+    def record_lines(self):
+        """Iterate over the lines of the file that hold records, reading any schema id tables"""
+        schema_ids = self._schema_ids
+        for line in self.lines():
+            if line.startswith(_IDS_PREFIX):
+                # every table extends the previous one
+                schema_ids.names = json_backend.loads(line)[IDS_FIELD_NAME]
+            else:
+                yield line
+
+    def __iter__(self):
+        if self.loads is None:
+            return core.loads_many(
+                self.record_lines(),
+                schema=self.schema,
+                record_store=self._schema_ids
+            )
+        return (self.loads(line) for line in self.record_lines())
+
+    def close(self):
+        """Close the decompression stream, if any. The underlying file is left open"""
+        if self.fileobj is not self._raw_fileobj:
+            self.fileobj.close()
+
+
+class RecordWriter(object):
+    """ Write records to a file as newline delimited `core.dumps` output
+
+    Serialized records are collected in memory and written in batches of
+    roughly `buffer_size` bytes. Call `close` (or use the writer as a context
+    manager) to flush the last batch and finish any compressed stream. The
+    underlying file object is not closed.
+
+    :param fileobj:
+        File object to write to, opened in binary mode
+
+    :param compression:
+        None, "gzip" or "bz2"
+
+    :param dumps:
+        Function used to serialize each record. Defaults to `core.dumps`
+
+    :param id_store:
+        Write integer schema ids from this SchemaStore instead of
+        schema names, see `core.dumps`. Ignored if `dumps` is given.
+        Whenever records get ids that haven't been written yet, a line with
+        the id table (`{"$ids": [record names by id]}`) is written before
+        them, which RecordReader imports when reading the file
+    """
+    def __init__(self, fileobj, compression=None,
+                 buffer_size=DEFAULT_BUFFER_SIZE, dumps=None, id_store=None):
+        self._raw_fileobj = fileobj
+        self.fileobj = _wrap(fileobj, compression, "wb")
+        self.buffer_size = buffer_size
+        self.dumps = dumps
+        self.id_store = id_store
+        # number of ids in the last id table written
+        self._written_ids = 0
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    def write(self, record):
+        if self.dumps is None:
+            if self.id_store is not None:
+                self._write_ids(record)
+            line = core.dumps(record, id_store=self.id_store)
+        else:
+            line = self.dumps(record)
+        self._append(line)
+
+    def write_many(self, records):
+        if self.dumps is None:
+            if self.id_store is not None:
+                records = self._with_ids(records)
+            lines = core.dumps_many(records, id_store=self.id_store)
+        else:
+            lines = (self.dumps(record) for record in records)
+        for line in lines:
+            self._append(line)
+
+    def _with_ids(self, records):
+        for record in records:
+            self._write_ids(record)
+            yield record
+
+    def _write_ids(self, record):
+        """Write the id table if `record` has an id that isn't in the last one written"""
+        if self.id_store.schema_id(record.__class__) >= self._written_ids:
+            ids = self.id_store.export_ids()
+            self._append(json_backend.dumps({IDS_FIELD_NAME: ids}))
+            self._written_ids = len(ids)
+
+    def _append(self, line):
+        if isinstance(line, unicode):
+            line = line.encode("utf8")
+        self._buffer.append(line)
+        self._buffered_bytes += len(line) + 1
+        if self._buffered_bytes >= self.buffer_size:
+            self._write_buffer()
+
+    def _write_buffer(self):
+        if self._buffer:
+            self._buffer.append("")  # gives the last line its newline
+            self.fileobj.write("\n".join(self._buffer))
+            self._buffer = []
+            self._buffered_bytes = 0
+
+    def flush(self):
+        self._write_buffer()
+        self.fileobj.flush()
+
+    def close(self):
+        self._write_buffer()
+        if self.fileobj is not self._raw_fileobj:
+            self.fileobj.close()
+        self._raw_fileobj.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,142 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Pluggable json codec used by all pyschema serialization
+
+By default the fastest installed codec is used, in order of preference:
+simplejson (only with its C speedups), ujson and the standard library json.
+A specific codec can be picked by name:
+
+>>> pyschema.json_backend.set_backend("ujson")
+
+Use the module level `dumps` and `loads` functions (always looked up through
+the module) to encode and decode with the current backend.
+
+Any registered codec needs to decode json strings to `unicode` objects and
+encode floats and non-ascii text without loss.
+"""
+from __future__ import absolute_import
+from functools import partial
+
+try:
+    from collections import OrderedDict
+except ImportError:
+    from ordereddict import OrderedDict
+
+
+class JsonBackend(object):
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+    def __repr__(self):
+        return "JsonBackend(%r)" % (self.name,)
+
+
+def _simplejson():
+    import simplejson
+    import simplejson.encoder
+    if getattr(simplejson.encoder, "c_make_encoder", None) is None:
+        # the pure python version is slower than the standard library
+        raise ImportError("simplejson C speedups not available")
+    return JsonBackend("simplejson", simplejson.dumps, simplejson.loads)
+
+
+def _ujson():
+    import ujson
+    return JsonBackend(
+        "ujson",
+        partial(ujson.dumps, escape_forward_slashes=False),
+        ujson.loads
+    )
+
+
+def _stdlib_json():
+    import json
+    return JsonBackend("json", json.dumps, json.loads)
+
+
+# name => function returning a JsonBackend or raising ImportError,
+# in order of preference for automatic selection
+_factories = OrderedDict([
+    ("simplejson", _simplejson),
+    ("ujson", _ujson),
+    ("json", _stdlib_json),
+])
+
+_current = None
+
+
+def register_backend(name, factory, preferred=False):
+    """ Make a json codec available by name
+
+    :param factory:
+        Function returning a JsonBackend, or raising ImportError
+        if the codec isn't installed
+
+    :param preferred:
+        Try this codec before the built-in ones when auto-selecting
+    """
+    _factories[name] = factory
+    if preferred:
+        for other in list(_factories):
+            if other != name:
+                _factories[other] = _factories.pop(other)
+
+
+def available_backends():
+    """Names of all registered codecs that are installed"""
+    names = []
+    for name, factory in _factories.iteritems():
+        try:
+            factory()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+
+def _auto_select():
+    for factory in _factories.itervalues():
+        try:
+            return factory()
+        except ImportError:
+            continue
+    raise ImportError("No json codec available")
+
+
+def set_backend(name=None):
+    """ Use the codec registered as `name`, or the fastest available one if None
+
+    Raises KeyError for unknown names and ImportError if the codec
+    isn't installed. Returns the selected JsonBackend.
+    """
+    global _current, dumps, loads
+    if name is None:
+        backend = _auto_select()
+    else:
+        backend = _factories[name]()
+    _current = backend
+    dumps = backend.dumps
+    loads = backend.loads
+    return backend
+
+
+def get_backend():
+    return _current
+
+
+dumps = None
+loads = None
+set_backend()
@@ -0,0 +1,179 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Decoding of large record files using a pool of worker processes
+
+The file is split into byte ranges that end on line boundaries, and each
+range is read and decoded by a separate worker:
+
+>>> for record in load_file("records.json", schema=MyRecord, workers=32):
+...     print record
+
+Records are pickled to send them back to the parent process, which can cost
+as much as decoding them in the first place. When only an aggregate is
+needed, pass a `map_chunk` function that reduces the records of one chunk
+inside the worker:
+
+>>> def count(records):
+...     return sum(1 for r in records)
+...
+>>> total = sum(load_file("records.json", map_chunk=count))
+
+Schemas (and `map_chunk`) are sent to the workers by reference, so they have
+to be importable module level objects.
+"""
+from __future__ import absolute_import
+import multiprocessing
+import os
+
+from pyschema import core, io
+from pyschema.core import ParseError
+
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+
+
+def chunk_ranges(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """ Split the file at `path` into (start, end) byte ranges of whole lines
+
+    Every range is at least `chunk_size` bytes long, except for the last one.
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            end = start + chunk_size
+            if end < size:
+                # extend the range to include the rest of the line
+                # containing its last byte
+                f.seek(end - 1)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+def read_range(path, start, end):
+    """Read the lines in byte range [start, end) of the file, without line endings"""
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).split("\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def _without_id_tables(lines):
+    for line in lines:
+        if line.startswith(io._IDS_PREFIX):
+            raise ParseError(
+                "Files written with schema ids can't be split into chunks, "
+                "read them with io.RecordReader instead")
+        yield line
+
+
+def _load_range(task):
+    path, start, end, schema, record_store, map_chunk, loader_options = task
+    records = core.loads_many(
+        _without_id_tables(read_range(path, start, end)),
+        schema=schema,
+        record_store=record_store,
+        **loader_options
+    )
+    if map_chunk is None:
+        return list(records)
+    return map_chunk(records)
+
+
+def map_ranges(func, tasks, workers=None, ordered=True):
+    """ Lazily yield `func(task)` for every task, computed in a process pool
+
+    With `workers=1` everything runs in the calling process.
+    """
+    if workers == 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    pool = multiprocessing.Pool(workers)
+    try:
+        if ordered:
+            results = pool.imap(func, tasks)
+        else:
+            results = pool.imap_unordered(func, tasks)
+        for result in results:
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def load_file(
+        path,
+        schema=None,
+        record_store=None,
+        workers=None,
+        ordered=True,
+        map_chunk=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        **loader_options
+):
+    """ Decode a file of newline delimited `core.dumps` output in parallel
+
+    :param path:
+        Name of an uncompressed local file. Files written by an
+        `io.RecordWriter` with an `id_store` aren't supported, since the id
+        tables in the file only apply to the lines after them
+
+    :param schema:
+        PySchema Record class for all records.
+        This will override any $schema fields in the lines
+
+    :param record_store:
+        Record store to use for schema lookups (when $schema field is present)
+
+    :param workers:
+        Number of worker processes, defaults to the number of cpus
+
+    :param ordered:
+        If False, chunks are produced in the order they finish
+        instead of the order they appear in the file
+
+    :param map_chunk:
+        Function run in the workers on an iterator over the records of each
+        chunk. If given, its return values are yielded instead of the records
+
+    :param loader_options:
+        Extra keyword arguments for `core.from_json_compatible`, e.g. `validate`.
+        Lazy records would be fully decoded when they are pickled to send them
+        from the workers, so `lazy` is only allowed together with `map_chunk`
+
+    """
+    if map_chunk is None and loader_options.get("lazy"):
+        raise ValueError(
+            "lazy records can't be returned from worker processes "
+            "without decoding them, use lazy with map_chunk instead")
+    tasks = [
+        (path, start, end, schema, record_store, map_chunk, loader_options)
+        for start, end in chunk_ranges(path, chunk_size)
+    ]
+    results = map_ranges(_load_range, tasks, workers=workers, ordered=ordered)
+    if map_chunk is not None:
+        return results
+    return (record for chunk in results for record in chunk)
@@ -0,0 +1,163 @@
+# Copyright (c) 2013 Spotify AB
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may not
+# use this file except in compliance with the License. You may obtain a copy of
+# the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations under
+# the License.
+""" Positional json encoding of records, without field names
+
+A record is encoded as a json array with the schema name (or integer id, see
+`SchemaStore.schema_id`) followed by the values of all fields in `_fields`
+order. Sub records are nested arrays of their field values:
+
+>>> class MyRecord(pyschema.Record):
+...     foo = Text()
+...     bar = Integer()
+...
+>>> dumps(MyRecord(foo=u"x"))
+'["MyRecord", "x", null]'
+
+Enum values are written as their ordinals (positions in `Enum.symbols`), all
+other field values use the same json representation as `core.dumps`. Since the
+encoding relies on field order, data can only be read with the exact same
+schema definitions it was written with.
+"""
+from __future__ import absolute_import
+
+from pyschema import compiler, core, json_backend
+from pyschema.core import ParseError
+
+
+class PositionalCompileContext(compiler.FieldCompileContext):
+    enum_ordinals = True
+
+    def dump_record(self, schema, value):
+        return self.call(to_json_compatible, value)
+
+    def load_record(self, schema, value):
+        return self.call(from_json_compatible, self.ref(schema, "schema"), value)
+
+
+def _build_dumper(schema):
+    ctx = PositionalCompileContext()
+    record = ctx.var("record")
+    lines = ["def dump(%s):" % (record,)]
+    items = []
+    for field_name, field_type in schema._fields.iteritems():
+        value = ctx.var("value")
+        lines.append("    %s = %s" % (value, ctx.attribute(record, field_name)))
+        items.append("None if %s is None else %s" % (value, field_type.compile_dump(ctx, value)))
+    lines.append("    return [%s]" % ("".join("(%s), " % (item,) for item in items),))
+    return ctx.compile("dump", lines)
+
+
+def _wrong_length(schema, values):
+    raise ParseError(
+        "Expected %d values for record %s, got %d"
+        % (len(schema._fields), schema._schema_name, len(values)))
+
+
+def _build_loader(schema):
+    ctx = PositionalCompileContext()
+    values = ctx.var("values")
+    lines = [
+        "def load(%s):" % (values,),
+        "    if len(%s) != %d:" % (values, len(schema._fields)),
+        "        %s(%s, %s)" % (ctx.ref(_wrong_length), ctx.ref(schema, "schema"), values),
+    ]
+    names = []
+    items = []
+    for field_name, field_type in schema._fields.iteritems():
+        value = ctx.var("value")
+        names.append(value)
+        items.append("%r: None if %s is None else %s" % (
+            field_name, value, field_type.compile_load(ctx, value)))
+    if names:
+        lines.append("    %s = %s" % ("".join(name + ", " for name in names), values))
+    lines.append("    return %s(**{%s})" % (
+        ctx.ref(schema, "schema"),
+        "".join("%s, " % (item,) for item in items)
+    ))
+    return ctx.compile("load", lines)
+
+
+def to_json_compatible(record):
+    """The list of json compatible field values of a record"""
+    dumper = core.schema_cached(record.__class__, "positional_dumper", _build_dumper)
+    return dumper(record)
+
+
+def from_json_compatible(schema, values):
+    """Create a `schema` record from a list of json compatible field values"""
+    if values.__class__ is not list:
+        raise ParseError("%r is not a list of record values" % (values,))
+    loader = core.schema_cached(schema, "positional_loader", _build_loader)
+    return loader(values)
+
+
+def dumps(record, id_store=None):
+    """ Serialize a record to a positional json string
+
+    :param id_store:
+        If given, the record class' integer id in this SchemaStore
+        is written instead of its name
+    """
+    if id_store is None:
+        schema_name = core.get_full_name(record.__class__)
+    else:
+        schema_name = id_store.schema_id(record.__class__)
+    values = to_json_compatible(record)
+    values.insert(0, schema_name)
+    return json_backend.dumps(values)
+
+
+def _split(s):
+    if not isinstance(s, unicode):
+        s = s.decode("utf8")
+    if not s.startswith(u"["):
+        raise ParseError("Not a positional json record")
+    values = json_backend.loads(s)
+    if not values:
+        raise ParseError("Positional json record without schema name")
+    return values[0], values[1:]
+
+
+def loads(s, record_store=None, schema=None):
+    """ Create a Record instance from a positional json string
+
+    :param record_store:
+        Record store to use for schema lookups, defaults to the auto store
+
+    :param schema:
+        PySchema Record class for the record to load,
+        overriding the schema name or id in `s`
+    """
+    schema_name, values = _split(s)
+    if schema is None:
+        if record_store is None:
+            record_store = core.auto_store
+        schema = core._lookup_schema(record_store, schema_name)
+    return from_json_compatible(schema, values)
+
+
+def loads_many(lines, record_store=None, schema=None):
+    """Lazily create Record instances from an iterable of positional json strings"""
+    if record_store is None:
+        record_store = core.auto_store
+    schemas = {}
+    for s in lines:
+        schema_name, values = _split(s)
+        if schema is not None:
+            line_schema = schema
+        else:
+            line_schema = schemas.get(schema_name)
+            if line_schema is None:
+                line_schema = schemas[schema_name] = core._lookup_schema(record_store, schema_name)
+        yield from_json_compatible(line_schema, values)
@@ -34,7 +34,25 @@ def ordereddict_push_front(dct, key, value):
     return d
 
 
+def _uses_method(field, cls, method_name):
+    """True if `field` uses the implementation of `method_name` from `cls`
+
+    Inlined fast paths are only valid for the exact implementation they
+    replicate, so subclasses overriding the method fall back to calling it.
+    """
+    return getattr(type(field), method_name).im_func is getattr(cls, method_name).im_func
+
+
+def _fast_path(ctx, fallback, value, condition, result=None):
+    """Expression evaluating to `result` if `condition` holds, else `fallback(value)`"""
+    if result is None:
+        result = value
+    return "(%s if %s else %s)" % (result, condition, ctx.call(fallback, value))
+
+
 class Text(Field):
+    _immutable_values = True
+
     def load(self, obj):
         if not isinstance(obj, (unicode, type(None))):
             raise ParseError("%r not a unicode object" % obj)
@@ -51,9 +69,22 @@ class Text(Field):
                     "%r is not a valid UTF-8 string" % obj
                 )
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, Text, "load"):
+            return super(Text, self).compile_load(ctx, value)
+        if not ctx.validate:
+            return value
+        return _fast_path(ctx, self.load, value, "%s.__class__ is unicode" % (value,))
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, Text, "dump"):
+            return super(Text, self).compile_dump(ctx, value)
+        return _fast_path(ctx, self.dump, value, "%s.__class__ is unicode" % (value,))
+
 
 class Bytes(Field):
     """Binary data"""
+    _immutable_values = True
 
     def __init__(self, custom_encoding=False, **kwargs):
         super(Bytes, self).__init__(**kwargs)
@@ -110,6 +141,33 @@ class List(Field):
             raise ValueError("%r is not a list object" % obj)
         return [self.field_type.dump(o) for o in obj]
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, List, "load"):
+            return super(List, self).compile_load(ctx, value)
+        item = ctx.var("item")
+        item_load = self.field_type.compile_load(ctx, item)
+        if not ctx.validate:
+            if item_load == item:
+                # the freshly decoded list can be used as it is
+                return value
+            return "[%s for %s in %s]" % (item_load, item, value)
+        return _fast_path(
+            ctx, self.load, value, "%s.__class__ is list" % (value,),
+            "[%s for %s in %s]" % (item_load, item, value)
+        )
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, List, "dump"):
+            return super(List, self).compile_dump(ctx, value)
+        item = ctx.var("item")
+        # tuples and list subclasses go through the same comprehension,
+        # `dump` would encode their items as json whatever the context
+        return _fast_path(
+            ctx, self.dump, value,
+            "(%s.__class__ is list or isinstance(%s, (list, tuple)))" % (value, value),
+            "[%s for %s in %s]" % (self.field_type.compile_dump(ctx, item), item, value)
+        )
+
     def set_parent(self, schema):
         self.field_type.set_parent(schema)
 
@@ -117,6 +175,14 @@ class List(Field):
         #  avoid default-sharing between records
         return copy.deepcopy(self.default)
 
+    def compile_default(self, ctx):
+        if _uses_method(self, List, "default_value"):
+            if self.default is None or self.default is core.NO_DEFAULT:
+                return None
+            if self.default.__class__ is list and not self.default:
+                return "[]"
+        return super(List, self).compile_default(ctx)
+
     def is_similar_to(self, other):
         return super(List, self).is_similar_to(other) and self.field_type.is_similar_to(other.field_type)
 
@@ -129,43 +195,126 @@ class List(Field):
 
 
 class Enum(Field):
+    """Field holding one of a fixed list of text symbols
+
+    `symbols` is a tuple of the unicode symbols in declaration order, and
+    `symbol_index` maps each symbol to its position in it (its ordinal).
+    Loaded values are always the objects from `symbols`, so records don't
+    hold copies of the same strings. `values` is the set of the
+    symbols as they were passed to the constructor.
+    """
+    _immutable_values = True
     _field_type = Text()  # don't change
 
     def __init__(self, values, name=None, **kwargs):
         super(Enum, self).__init__(**kwargs)
         self.values = set(values)
         self.name = name
+        symbols = []
+        for value in values:
+            if isinstance(value, str):
+                value = value.decode("utf8")
+            if value not in symbols:
+                symbols.append(value)
+        self.symbols = tuple(symbols)
+        self.symbol_index = dict((symbol, i) for i, symbol in enumerate(self.symbols))
+        # symbol => the canonical symbol object
+        self._canonical = dict((symbol, symbol) for symbol in self.symbols)
 
         if name is not None and PySchema.auto_register:
             auto_store.add_enum(self)
 
-    def dump(self, obj):
-        if obj not in self.values:
+    def _lookup(self, table, obj):
+        """`table[obj]` for a symbol `obj`, which may also be a utf-8 encoded str"""
+        try:
+            return table[obj]
+        except (KeyError, TypeError):
+            if isinstance(obj, str):
+                try:
+                    return table[obj.decode("utf8")]
+                except (KeyError, UnicodeDecodeError):
+                    pass
             raise ValueError(
                 "%r is not an allowed value of Enum%r"
-                % (obj, tuple(self.values)))
-        return self._field_type.dump(obj)
+                % (obj, self.symbols))
+
+    def dump(self, obj):
+        return self._lookup(self._canonical, obj)
 
     def load(self, obj):
+        if obj is None:
+            return None
         parsed = self._field_type.load(obj)
-        if parsed not in self.values and parsed is not None:
+        try:
+            return self._canonical[parsed]
+        except KeyError:
             raise ParseError(
                 "Parsed value %r not in allowed value of Enum(%r)"
-                % (parsed, tuple(self.values)))
-        return parsed
+                % (parsed, self.symbols))
+
+    def dump_ordinal(self, obj):
+        """The position of value `obj` in `symbols`"""
+        return self._lookup(self.symbol_index, obj)
+
+    def load_ordinal(self, obj):
+        """The symbol at position `obj` of `symbols`"""
+        if obj.__class__ not in (int, long) or not 0 <= obj < len(self.symbols):
+            raise ParseError("%r is not an ordinal of Enum(%r)" % (obj, self.symbols))
+        return self.symbols[obj]
+
+    def compile_load(self, ctx, value):
+        if ctx.enum_ordinals:
+            symbol = _fast_path(
+                ctx, self.load_ordinal, value,
+                "%s.__class__ is int and 0 <= %s < %d" % (value, value, len(self.symbols)),
+                "%s[%s]" % (ctx.ref(self.symbols, "symbols"), value)
+            )
+            if not _uses_method(self, Enum, "load"):
+                return ctx.call(self.load, symbol)
+            return symbol
+        if not _uses_method(self, Enum, "load"):
+            return super(Enum, self).compile_load(ctx, value)
+        canonical = ctx.ref(self._canonical, "symbols")
+        if not ctx.validate:
+            return "%s.get(%s, %s)" % (canonical, value, value)
+        return _fast_path(
+            ctx, self.load, value,
+            "%s.__class__ is unicode and %s in %s" % (value, value, canonical),
+            "%s[%s]" % (canonical, value)
+        )
+
+    def compile_dump(self, ctx, value):
+        if ctx.enum_ordinals:
+            if not _uses_method(self, Enum, "dump"):
+                # the ordinal of the symbol the overridden method returns
+                return ctx.call(self.dump_ordinal, ctx.call(self.dump, value))
+            index = ctx.ref(self.symbol_index, "symbol_index")
+            return _fast_path(
+                ctx, self.dump_ordinal, value,
+                "%s.__class__ is unicode and %s in %s" % (value, value, index),
+                "%s[%s]" % (index, value)
+            )
+        if not _uses_method(self, Enum, "dump"):
+            return super(Enum, self).compile_dump(ctx, value)
+        return _fast_path(
+            ctx, self.dump, value,
+            "%s.__class__ is unicode and %s in %s" % (value, value, ctx.ref(self._canonical, "symbols"))
+        )
 
     def is_similar_to(self, other):
         return super(Enum, self).is_similar_to(other) and self.values == other.values
 
     def repr_vars(self):
         return OrderedDict([
-            ("values", self.values),
+            ("values", list(self.symbols)),
             ("name", repr(self.name))
         ] + super(Enum, self).repr_vars().items()
         )
 
 
 class Integer(Field):
+    _immutable_values = True
+
     def __init__(self, size=8, **kwargs):
         super(Integer, self).__init__(**kwargs)
         self.size = size
@@ -180,6 +329,18 @@ class Integer(Field):
             raise ParseError("%r is not a valid Integer" % (obj,))
         return obj
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, Integer, "load"):
+            return super(Integer, self).compile_load(ctx, value)
+        if not ctx.validate:
+            return value
+        return _fast_path(ctx, self.load, value, "%s.__class__ is int" % (value,))
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, Integer, "dump"):
+            return super(Integer, self).compile_dump(ctx, value)
+        return _fast_path(ctx, self.dump, value, "%s.__class__ is int" % (value,))
+
     def is_similar_to(self, other):
         return super(Integer, self).is_similar_to(other) and self.size == other.size
 
@@ -192,6 +353,7 @@ class Integer(Field):
 
 
 class Boolean(Field):
+    _immutable_values = True
     VALUE_MAP = {True: '1', 1: '1',
                  False: '0', 0: '0'}
 
@@ -207,8 +369,22 @@ class Boolean(Field):
                 "Invalid value for Boolean field: %r" % obj)
         return bool(obj)
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, Boolean, "load"):
+            return super(Boolean, self).compile_load(ctx, value)
+        if not ctx.validate:
+            return value
+        return _fast_path(ctx, self.load, value, "(%s is True or %s is False)" % (value, value))
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, Boolean, "dump"):
+            return super(Boolean, self).compile_dump(ctx, value)
+        return _fast_path(ctx, self.dump, value, "(%s is True or %s is False)" % (value, value))
+
 
 class Float(Field):
+    _immutable_values = True
+
     def __init__(self, size=8, **kwargs):
         super(Float, self).__init__(**kwargs)
         self.size = size
@@ -223,6 +399,16 @@ class Float(Field):
             raise ParseError("Invalid value for Float field: %r" % obj)
         return float(obj)
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, Float, "load"):
+            return super(Float, self).compile_load(ctx, value)
+        return _fast_path(ctx, self.load, value, "%s.__class__ is float" % (value,))
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, Float, "dump"):
+            return super(Float, self).compile_dump(ctx, value)
+        return _fast_path(ctx, self.dump, value, "%s.__class__ is float" % (value,))
+
     def is_similar_to(self, other):
         return super(Float, self).is_similar_to(other) and self.size == other.size
 
@@ -279,6 +465,20 @@ class SubRecord(Field):
     def load(self, obj):
         return core.from_json_compatible(self._schema, obj)
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, SubRecord, "load"):
+            return super(SubRecord, self).compile_load(ctx, value)
+        return ctx.load_record(self._schema, value)
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, SubRecord, "dump"):
+            return super(SubRecord, self).compile_dump(ctx, value)
+        return _fast_path(
+            ctx, self.dump, value,
+            "isinstance(%s, %s)" % (value, ctx.ref(self._schema, "schema")),
+            ctx.dump_record(self._schema, value)
+        )
+
     def set_parent(self, schema):
         """This method gets called by the metaclass
         once the container class has been created
@@ -293,6 +493,12 @@ class SubRecord(Field):
         #  avoid default-sharing between records
         return copy.deepcopy(self.default)
 
+    def compile_default(self, ctx):
+        if _uses_method(self, SubRecord, "default_value"):
+            if self.default is None or self.default is core.NO_DEFAULT:
+                return None
+        return super(SubRecord, self).compile_default(ctx)
+
     def is_similar_to(self, other):
         return super(SubRecord, self).is_similar_to(other) and self._schema == other._schema
 
@@ -332,6 +538,36 @@ class Map(Field):
             for k, v in obj.iteritems()
         ])
 
+    def compile_load(self, ctx, value):
+        if not _uses_method(self, Map, "load"):
+            return super(Map, self).compile_load(ctx, value)
+        key, item = ctx.var("key"), ctx.var("item")
+        key_load = self.key_type.compile_load(ctx, key)
+        item_load = self.value_type.compile_load(ctx, item)
+        comprehension = "{%s: %s for %s, %s in %s.iteritems()}" % (key_load, item_load, key, item, value)
+        if not ctx.validate:
+            if key_load == key and item_load == item:
+                return value
+            return comprehension
+        return _fast_path(
+            ctx, self.load, value, "%s.__class__ is dict" % (value,),
+            comprehension
+        )
+
+    def compile_dump(self, ctx, value):
+        if not _uses_method(self, Map, "dump"):
+            return super(Map, self).compile_dump(ctx, value)
+        key, item = ctx.var("key"), ctx.var("item")
+        return _fast_path(
+            ctx, self.dump, value,
+            "(%s.__class__ is dict or isinstance(%s, dict))" % (value, value),
+            "{%s: %s for %s, %s in %s.iteritems()}" % (
+                self.key_type.compile_dump(ctx, key),
+                self.value_type.compile_dump(ctx, item),
+                key, item, value
+            )
+        )
+
     def set_parent(self, schema):
         self.value_type.set_parent(schema)
 
@@ -339,6 +575,14 @@ class Map(Field):
         #  avoid default-sharing between records
         return copy.deepcopy(self.default)
 
+    def compile_default(self, ctx):
+        if _uses_method(self, Map, "default_value"):
+            if self.default is None or self.default is core.NO_DEFAULT:
+                return None
+            if self.default.__class__ is dict and not self.default:
+                return "{}"
+        return super(Map, self).compile_default(ctx)
+
     def is_similar_to(self, other):
         return super(Map, self).is_similar_to(other) and self.value_type.is_similar_to(other.value_type)
 
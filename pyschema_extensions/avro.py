@@ -26,15 +26,22 @@ Usage:
 {"type": "long", "name": "bar"}],
 "type": "record", "name": "MyRecord"}'
 
+Records can be serialized in both the avro json encoding (`dumps`/`loads`)
+and the binary encoding (`binary_dumps`/`binary_loads`) of that schema, and
+written to and read from avro files with `ContainerWriter`/`ContainerReader`.
+
 """
+import json as stdlib_json
+import os
+import struct
 import warnings
-from pyschema import core
+import zlib
+from pyschema import core, compiler, json_backend, parallel
+from pyschema.binary import encode_long as _encode_long, decode_long as _decode_long
+from pyschema.binary import encode_bytes as _encode_bytes, decode_bytes as _decode_bytes
+from pyschema.core import ParseError
 from pyschema.types import Field, Boolean, Integer, Float
-from pyschema.types import Bytes, Text, Enum, List, Map, SubRecord
-try:
-    import simplejson as json
-except ImportError:
-    import json
+from pyschema.types import Bytes, Text, Enum, List, Map, SubRecord, _uses_method
 
 
 Boolean.avro_type_name = "boolean"
@@ -158,7 +165,7 @@ class EnumMixin:
         return {
             "type": "enum",
             "name": self.avro_type_name,
-            "symbols": list(self.values)
+            "symbols": list(self.symbols)
         }
 
 
@@ -253,8 +260,27 @@ class SchemaGeneratorState(object):
 
 
 def get_schema_dict(record, state=None):
-    state = state or SchemaGeneratorState()
+    """Return a python dict representing the avro schema of a record
+
+    Top level schemas are only generated once per class, and a copy
+    of the cached dict is returned.
+    """
+    if state is None:
+        return core.copy_json_compatible(_cached_schema_dict(record))
+    return _build_schema_dict(record, state)
+
+
+def _cached_schema_dict(record):
+    """The shared schema dict of a record class, must not be modified"""
+    if not isinstance(record, core.PySchema):
+        record = record.__class__
+    return core.schema_cached(
+        record, "avro_schema_dict",
+        lambda record: _build_schema_dict(record, SchemaGeneratorState())
+    )
 
+
+def _build_schema_dict(record, state):
     full_name = core.get_full_name(record)
     if full_name in state.declared_records:
         return full_name
@@ -292,40 +318,71 @@ def get_schema_dict(record, state=None):
 
 
 def get_schema_string(record):
-    return json.dumps(get_schema_dict(record))
+    if not isinstance(record, core.PySchema):
+        record = record.__class__
+    return core.schema_cached(
+        record, "avro_schema_string",
+        lambda record: json_backend.dumps(_cached_schema_dict(record))
+    )
 
 
 def dumps(record):
-    return json.dumps(to_json_compatible(record))
+    return json_backend.dumps(to_json_compatible(record))
 
 
-def to_json_compatible(record):
-    dct = {}
-    for name, fieldtype in record._fields.iteritems():
-        value = getattr(record, name)
-        dct[name] = fieldtype.avro_dump(value)
-    return dct
+def _unexpected_field(schema, dct):
+    # always warned from this line, so the default warning filter reports
+    # each schema and field once while "always" still shows every record
+    for key in dct:
+        if key not in schema._fields:
+            warnings.warn("Unexpected field encountered in line for record %s: %r" % (schema.__name__, key))
 
 
-def from_json_compatible(schema, dct):
-    "Load from json-encodable"
-    kwargs = {}
+def _build_avro_dumper(schema):
+    ctx = compiler.CompileContext()
+    return core.compile_record_dumper(
+        schema, ctx,
+        lambda field_type, value: ctx.call(field_type.avro_dump, value),
+        skip_none=False
+    )
 
-    for key in dct:
-        field_type = schema._fields.get(key)
-        if field_type is None:
-            warnings.warn("Unexpected field encountered in line for record %s: %r" % (schema.__name__, key))
-            continue
-        kwargs[key] = field_type.avro_load(dct[key])
 
-    return schema(**kwargs)
+def _build_avro_loader(schema, fields=None):
+    ctx = compiler.CompileContext()
+    return core.compile_record_loader(
+        schema, ctx,
+        lambda field_type, value: ctx.call(field_type.avro_load, value),
+        _unexpected_field,
+        fields
+    )
+
+
+def to_json_compatible(record):
+    dumper = core.schema_cached(record.__class__, "avro_dumper", _build_avro_dumper)
+    return dumper(record)
+
+
+def from_json_compatible(schema, dct, fields=None):
+    """Load from json-encodable
+
+    :param fields:
+        Names of the only fields to load, see `core.from_json_compatible`
+    """
+    if fields is not None:
+        fields = frozenset(fields)
+    loader = core.schema_cached(
+        schema, ("avro_loader", fields),
+        lambda schema: _build_avro_loader(schema, fields)
+    )
+    return loader(dct)
 
 
 def loads(
     s,
     record_store=None,
     schema=None,
-    record_class=None  # deprecated - replaced by `schema`
+    record_class=None,  # deprecated - replaced by `schema`
+    fields=None
 ):
     if record_class is not None:
         warnings.warn(
@@ -335,4 +392,997 @@ def loads(
         )
         schema = record_class
 
-    return core.loads(s, record_store, schema, from_json_compatible)
+    return core.loads(s, record_store, schema, from_json_compatible, fields=fields)
+
+
+# Binary encoding
+#
+# Every field type provides an encoder function, taking a value and returning
+# its avro binary encoding as a string, and a decoder function, taking a
+# buffer and a position and returning the decoded value and the position
+# after it. Per-schema record encoders and decoders are generated from these.
+
+_DOUBLE = struct.Struct("<d")
+_FLOAT = struct.Struct("<f")
+
+
+def _encode_string(u):
+    return _encode_bytes(u.encode("utf8"))
+
+
+def _decode_string(buf, pos):
+    s, pos = _decode_bytes(buf, pos)
+    return s.decode("utf8"), pos
+
+
+def _encode_boolean(b):
+    return "\x01" if b else "\x00"
+
+
+def _decode_boolean(buf, pos):
+    return buf[pos] == "\x01", pos + 1
+
+
+def _encode_double(f):
+    return _DOUBLE.pack(f)
+
+
+def _decode_double(buf, pos):
+    return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+
+
+def _encode_float(f):
+    return _FLOAT.pack(f)
+
+
+def _decode_float(buf, pos):
+    return _FLOAT.unpack_from(buf, pos)[0], pos + 4
+
+
+# avro type name => (encoder, decoder) for primitive types
+_PRIMITIVES = {
+    "boolean": (_encode_boolean, _decode_boolean),
+    "int": (_encode_long, _decode_long),
+    "long": (_encode_long, _decode_long),
+    "float": (_encode_float, _decode_float),
+    "double": (_encode_double, _decode_double),
+    "bytes": (_encode_bytes, _decode_bytes),
+    "string": (_encode_string, _decode_string),
+}
+
+
+def _primitive_codec(field_type):
+    """(encode, decode) of the avro primitive type named by the field's `avro_type_name`"""
+    codec = _PRIMITIVES.get(getattr(field_type, "avro_type_name", None))
+    if codec is None:
+        raise TypeError("No avro binary encoding for %s" % (field_type.__class__.__name__,))
+    return codec
+
+
+def _union_tags(field_type):
+    """Encoded union branch indices (null, value) of a nullable field"""
+    # has to match the branch order in `avro_type_schema`
+    if field_type.default in (None, core.NO_DEFAULT):
+        return _encode_long(0), _encode_long(1)
+    return _encode_long(1), _encode_long(0)
+
+
+@Field.mixin
+class FieldBinaryMixin:
+    def avro_binary_encoder(self):
+        """Function returning the avro binary encoding of a value of this field
+
+        Handles None values of nullable fields.
+        """
+        encode = self.avro_binary_value_encoder()
+        if not self.nullable:
+            return encode
+        null_tag, value_tag = _union_tags(self)
+
+        def encode_nullable(obj):
+            if obj is None:
+                return null_tag
+            return value_tag + encode(obj)
+        return encode_nullable
+
+    def avro_binary_decoder(self):
+        """Function (buf, pos) -> (value, new_pos) for values of this field"""
+        decode = self.avro_binary_value_decoder()
+        if not self.nullable:
+            return decode
+        null_tag, value_tag = _union_tags(self)
+
+        def decode_nullable(buf, pos):
+            tag = buf[pos]
+            if tag == null_tag:
+                return None, pos + 1
+            if tag != value_tag:
+                raise ParseError("Invalid union branch %r" % (tag,))
+            return decode(buf, pos + 1)
+        return decode_nullable
+
+    def avro_binary_value_encoder(self):
+        """Encoder for the non-None values of the field
+
+        By default the json compatible value from `dump` is encoded
+        as the avro primitive type named by `avro_type_name`.
+        """
+        encode, _ = _primitive_codec(self)
+        dump = self.dump
+        return lambda obj: encode(dump(obj))
+
+    def avro_binary_value_decoder(self):
+        _, decode = _primitive_codec(self)
+        load = self.load
+
+        def decode_value(buf, pos):
+            value, pos = decode(buf, pos)
+            return load(value), pos
+        return decode_value
+
+
+@Bytes.mixin
+class BytesBinaryMixin:
+    # binary avro stores the bytes as they are, unlike the json encoding
+    def avro_binary_value_encoder(self):
+        def encode(obj):
+            if not isinstance(obj, str):
+                raise ValueError("%r is not a byte string" % (obj,))
+            return _encode_bytes(obj)
+        return encode
+
+    def avro_binary_value_decoder(self):
+        return _decode_bytes
+
+
+@Enum.mixin
+class EnumBinaryMixin:
+    def avro_binary_value_encoder(self):
+        if not _uses_method(self, Enum, "dump"):
+            # the index of the symbol the overridden method returns
+            dump, dump_ordinal = self.dump, self.dump_ordinal
+            return lambda obj: _encode_long(dump_ordinal(dump(obj)))
+        indices = dict((symbol, _encode_long(i)) for i, symbol in enumerate(self.symbols))
+        dump_ordinal = self.dump_ordinal
+
+        def encode(obj):
+            try:
+                return indices[obj]
+            except (KeyError, TypeError):
+                # raises ValueError unless `obj` is a utf-8 encoded symbol
+                return _encode_long(dump_ordinal(obj))
+        return encode
+
+    def avro_binary_value_decoder(self):
+        symbols = self.symbols
+        load = None if _uses_method(self, Enum, "load") else self.load
+
+        def decode(buf, pos):
+            index, pos = _decode_long(buf, pos)
+            if not 0 <= index < len(symbols):
+                raise ParseError("Invalid enum index %d" % (index,))
+            if load is not None:
+                return load(symbols[index]), pos
+            return symbols[index], pos
+        return decode
+
+
+def _encode_blocks(count, encoded_items):
+    # everything is written as a single block
+    if not count:
+        return "\x00"
+    return _encode_long(count) + "".join(encoded_items) + "\x00"
+
+
+def _decode_blocks(buf, pos, decode_item):
+    """Decode the items of an array or map, returning (items, new_pos)"""
+    items = []
+    count, pos = _decode_long(buf, pos)
+    while count:
+        if count < 0:
+            # negative counts are followed by the size of the block in bytes
+            count = -count
+            _, pos = _decode_long(buf, pos)
+        for _ in xrange(count):
+            item, pos = decode_item(buf, pos)
+            items.append(item)
+        count, pos = _decode_long(buf, pos)
+    return items, pos
+
+
+@List.mixin
+class ListBinaryMixin:
+    def avro_binary_value_encoder(self):
+        encode_item = self.field_type.avro_binary_encoder()
+
+        def encode(obj):
+            if not isinstance(obj, (tuple, list)):
+                raise ValueError("%r is not a list object" % (obj,))
+            return _encode_blocks(len(obj), [encode_item(o) for o in obj])
+        return encode
+
+    def avro_binary_value_decoder(self):
+        decode_item = self.field_type.avro_binary_decoder()
+
+        return lambda buf, pos: _decode_blocks(buf, pos, decode_item)
+
+
+@Map.mixin
+class MapBinaryMixin:
+    def avro_binary_value_encoder(self):
+        dump_key = self.key_type.dump
+        encode_value = self.value_type.avro_binary_encoder()
+
+        def encode(obj):
+            if not isinstance(obj, dict):
+                raise ValueError("%r is not a dict" % (obj,))
+            return _encode_blocks(len(obj), [
+                _encode_string(dump_key(k)) + encode_value(v)
+                for k, v in obj.iteritems()
+            ])
+        return encode
+
+    def avro_binary_value_decoder(self):
+        load_key = self.key_type.load
+        decode_value = self.value_type.avro_binary_decoder()
+
+        def decode_item(buf, pos):
+            key, pos = _decode_string(buf, pos)
+            value, pos = decode_value(buf, pos)
+            return (load_key(key), value), pos
+
+        def decode(buf, pos):
+            items, pos = _decode_blocks(buf, pos, decode_item)
+            return dict(items), pos
+        return decode
+
+
+@SubRecord.mixin
+class SubRecordBinaryMixin:
+    # the record codecs are looked up on use, since schemas can be recursive
+    def avro_binary_value_encoder(self):
+        schema = self._schema
+
+        def encode(obj):
+            if not isinstance(obj, schema):
+                raise ValueError("%r is not a %r" % (obj, schema))
+            return binary_encoder(schema)(obj)
+        return encode
+
+    def avro_binary_value_decoder(self):
+        schema = self._schema
+        return lambda buf, pos: binary_decoder(schema)(buf, pos)
+
+
+def _not_nullable(schema, field_name):
+    raise ValueError("Field %s of %s is not nullable" % (field_name, schema._schema_name))
+
+
+def _build_binary_encoder(schema):
+    ctx = compiler.CompileContext()
+    record = ctx.var("record")
+    value = ctx.var("value")
+    parts = []
+    lines = ["def encode(%s):" % (record,)]
+    for field_name, field_type in schema._fields.iteritems():
+        lines.append("    %s = %s" % (value, ctx.attribute(record, field_name)))
+        if not field_type.nullable:
+            lines.extend([
+                "    if %s is None:" % (value,),
+                "        %s(%s, %r)" % (ctx.ref(_not_nullable), ctx.ref(schema, "schema"), field_name),
+            ])
+        part = ctx.var("part")
+        lines.append("    %s = %s" % (part, ctx.call(field_type.avro_binary_encoder(), value)))
+        parts.append(part)
+    lines.append("    return \"\".join((%s))" % ("".join(p + ", " for p in parts),))
+    return ctx.compile("encode", lines)
+
+
+def _build_binary_decoder(schema):
+    ctx = compiler.CompileContext()
+    buf, pos, kwargs = ctx.var("buf"), ctx.var("pos"), ctx.var("kwargs")
+    lines = [
+        "def decode(%s, %s):" % (buf, pos),
+        "    %s = {}" % (kwargs,),
+    ]
+    for field_name, field_type in schema._fields.iteritems():
+        lines.append("    %s[%r], %s = %s" % (
+            kwargs, field_name, pos, ctx.call(field_type.avro_binary_decoder(), buf, pos)))
+    lines.append("    return %s(**%s), %s" % (ctx.ref(schema, "schema"), kwargs, pos))
+    return ctx.compile("decode", lines)
+
+
+def binary_encoder(schema):
+    """Function returning the avro binary encoding of a `schema` record"""
+    return core.schema_cached(schema, "avro_binary_encoder", _build_binary_encoder)
+
+
+def binary_decoder(schema):
+    """ Function (buf, pos) -> (record, new_pos) decoding a `schema` record
+
+    Decodes the record starting at byte offset `pos` of the string `buf`
+    """
+    return core.schema_cached(schema, "avro_binary_decoder", _build_binary_decoder)
+
+
+def binary_dumps(record):
+    """Avro binary encoding of a record, written with the schema from `get_schema_dict`"""
+    return binary_encoder(record.__class__)(record)
+
+
+def binary_loads(s, schema, writer_schema=None):
+    """ Create a `schema` record from its avro binary encoding
+
+    :param writer_schema:
+        PySchema Record class the data was written with, if different
+        from `schema`, e.g. from `avro_schema_parser.parse_schema_string`
+    """
+    if writer_schema is None:
+        decode = binary_decoder(schema)
+    else:
+        decode = resolving_decoder(writer_schema, schema)
+    try:
+        record, pos = decode(s, 0)
+    except (IndexError, struct.error, UnicodeDecodeError), e:
+        raise ParseError("Invalid avro binary data: %s" % (e,))
+    if pos != len(s):
+        raise ParseError("Unexpected data after end of record")
+    return record
+
+
+# Schema resolution
+#
+# Binary data can be decoded into a reader schema that differs from the schema
+# it was written with, following the avro schema resolution rules: fields are
+# matched by name, fields that the reader doesn't have are skipped, fields
+# that the writer didn't have get their defaults and numeric types are
+# promoted from int to long to float to double.
+
+# writer avro type name => reader type names its values can be read as
+_PROMOTIONS = {
+    "int": ("int", "long", "float", "double"),
+    "long": ("long", "float", "double"),
+    "float": ("float", "double"),
+    "double": ("double",),
+    "string": ("string", "bytes"),
+    "bytes": ("bytes", "string"),
+    "boolean": ("boolean",),
+}
+
+
+def _resolve_error(writer_type, reader_type):
+    return ParseError(
+        "Can't read %s data as %s"
+        % (writer_type.__class__.__name__, reader_type.__class__.__name__))
+
+
+def _resolve_field(writer_type, reader_type):
+    """Decoder for data written as `writer_type`, returning values of `reader_type`"""
+    decode = _resolve_value(writer_type, reader_type)
+    if not writer_type.nullable:
+        return decode
+    null_tag, value_tag = _union_tags(writer_type)
+
+    def decode_nullable(buf, pos):
+        tag = buf[pos]
+        if tag == null_tag:
+            return None, pos + 1
+        if tag != value_tag:
+            raise ParseError("Invalid union branch %r" % (tag,))
+        return decode(buf, pos + 1)
+    return decode_nullable
+
+
+def _resolve_value(writer_type, reader_type):
+    if isinstance(writer_type, SubRecord) and isinstance(reader_type, SubRecord):
+        writer_schema, reader_schema = writer_type._schema, reader_type._schema
+        return lambda buf, pos: resolving_decoder(writer_schema, reader_schema)(buf, pos)
+
+    if isinstance(writer_type, List) and isinstance(reader_type, List):
+        decode_item = _resolve_field(writer_type.field_type, reader_type.field_type)
+        return lambda buf, pos: _decode_blocks(buf, pos, decode_item)
+
+    if isinstance(writer_type, Map) and isinstance(reader_type, Map):
+        load_key = reader_type.key_type.load
+        decode_value = _resolve_field(writer_type.value_type, reader_type.value_type)
+
+        def decode_item(buf, pos):
+            key, pos = _decode_string(buf, pos)
+            value, pos = decode_value(buf, pos)
+            return (load_key(key), value), pos
+
+        def decode_map(buf, pos):
+            items, pos = _decode_blocks(buf, pos, decode_item)
+            return dict(items), pos
+        return decode_map
+
+    if isinstance(writer_type, Enum) and isinstance(reader_type, Enum):
+        decode_symbol = writer_type.avro_binary_value_decoder()
+        load = reader_type.load
+
+        def decode_enum(buf, pos):
+            symbol, pos = decode_symbol(buf, pos)
+            return load(symbol), pos
+        return decode_enum
+
+    if any(isinstance(t, (SubRecord, List, Map, Enum)) for t in (writer_type, reader_type)):
+        raise _resolve_error(writer_type, reader_type)
+
+    if type(writer_type) is type(reader_type) and writer_type.avro_type_name == reader_type.avro_type_name:
+        return reader_type.avro_binary_value_decoder()
+
+    writer_name = getattr(writer_type, "avro_type_name", None)
+    reader_name = getattr(reader_type, "avro_type_name", None)
+    if reader_name not in _PROMOTIONS.get(writer_name, ()):
+        raise _resolve_error(writer_type, reader_type)
+    decode_primitive = _PRIMITIVES[writer_name][1]
+    if reader_name in ("float", "double"):
+        convert = float
+    elif reader_name == "string" and writer_name == "bytes":
+        convert = lambda s: s.decode("utf8")
+    else:
+        convert = None
+    if isinstance(reader_type, Bytes):
+        if writer_name == "string":
+            convert = lambda u: u.encode("utf8")
+        load = None
+    else:
+        load = reader_type.load
+
+    def decode_value(buf, pos):
+        value, pos = decode_primitive(buf, pos)
+        if convert is not None:
+            value = convert(value)
+        if load is not None:
+            value = load(value)
+        return value, pos
+    return decode_value
+
+
+def _build_resolving_decoder(writer_schema, reader_schema):
+    ctx = compiler.CompileContext()
+    buf, pos, kwargs = ctx.var("buf"), ctx.var("pos"), ctx.var("kwargs")
+    lines = [
+        "def decode(%s, %s):" % (buf, pos),
+        "    %s = {}" % (kwargs,),
+    ]
+    for field_name, writer_type in writer_schema._fields.iteritems():
+        if field_name in reader_schema._fields:
+            decode = _resolve_field(writer_type, reader_schema._fields[field_name])
+            target = "%s[%r]" % (kwargs, field_name)
+        else:
+            # removed from the reader schema, decode and drop the value
+            decode = writer_type.avro_binary_decoder()
+            target = ctx.var("skipped")
+        lines.append("    %s, %s = %s" % (target, pos, ctx.call(decode, buf, pos)))
+    for field_name, reader_type in reader_schema._fields.iteritems():
+        if field_name not in writer_schema._fields and reader_type.default is core.NO_DEFAULT:
+            raise ParseError(
+                "Field %s of %s is missing from the data and has no default"
+                % (field_name, reader_schema._schema_name))
+    lines.append("    return %s(**%s), %s" % (ctx.ref(reader_schema, "schema"), kwargs, pos))
+    return ctx.compile("decode", lines)
+
+
+def resolving_decoder(writer_schema, reader_schema):
+    """ Like `binary_decoder(reader_schema)` for data written with `writer_schema`
+
+    The decoder is generated once per pair of schemas. Raises ParseError if
+    the schemas can't be resolved.
+    """
+    if writer_schema is reader_schema:
+        return binary_decoder(reader_schema)
+    return core.schema_cached(
+        reader_schema, ("avro_resolving_decoder", writer_schema),
+        lambda reader_schema: _build_resolving_decoder(writer_schema, reader_schema)
+    )
+
+
+# Object container files
+
+MAGIC = "Obj\x01"
+SYNC_SIZE = 16
+DEFAULT_BLOCK_SIZE = 64000
+_SCAN_SIZE = 64 * 1024
+
+
+def _deflate(data):
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _inflate(data):
+    return zlib.decompress(data, -15)
+
+
+# codec name => (compress, decompress)
+CODECS = {
+    "null": (lambda data: data, lambda data: data),
+    "deflate": (_deflate, _inflate),
+}
+
+
+def _read_long(fileobj):
+    """Read a zig-zag varint from a file, raising EOFError at the end of the file"""
+    chars = []
+    while True:
+        c = fileobj.read(1)
+        if not c:
+            if chars:
+                raise ParseError("Truncated avro container file")
+            raise EOFError()
+        chars.append(c)
+        if not ord(c) & 0x80:
+            return _decode_long("".join(chars), 0)[0]
+
+
+def _read_exactly(fileobj, size):
+    data = fileobj.read(size)
+    if len(data) != size:
+        raise ParseError("Truncated avro container file")
+    return data
+
+
+def _read_header(fileobj):
+    """Read the container file header, returning (metadata, sync marker)"""
+    if fileobj.read(len(MAGIC)) != MAGIC:
+        raise ParseError("Not an avro container file")
+    metadata = {}
+    count = _read_long(fileobj)
+    while count:
+        if count < 0:
+            count = -count
+            _read_long(fileobj)
+        for _ in xrange(count):
+            key = _read_exactly(fileobj, _read_long(fileobj)).decode("utf8")
+            metadata[key] = _read_exactly(fileobj, _read_long(fileobj))
+        count = _read_long(fileobj)
+    return metadata, _read_exactly(fileobj, SYNC_SIZE)
+
+
+class ContainerWriter(object):
+    """ Write records of one schema to an avro object container file
+
+    Records are encoded into blocks of roughly `block_size` bytes, which are
+    compressed and written as a whole. Call `close` (or use the writer as a
+    context manager) to write the last block. The underlying file object is
+    not closed.
+
+    :param fileobj:
+        File object to write to, opened in binary mode
+
+    :param schema:
+        PySchema Record class of all records. The file's schema is generated
+        with `get_schema_string`
+
+    :param codec:
+        Compression of the blocks, "null" or "deflate"
+
+    :param metadata:
+        Optional dict of additional byte string values for the file header
+    """
+    def __init__(self, fileobj, schema, codec="null",
+                 block_size=DEFAULT_BLOCK_SIZE, metadata=None):
+        if codec not in CODECS:
+            raise ValueError("Unsupported codec: %r" % (codec,))
+        self.fileobj = fileobj
+        self.schema = schema
+        self.codec = codec
+        self.block_size = block_size
+        self.sync_marker = os.urandom(SYNC_SIZE)
+        self._compress = CODECS[codec][0]
+        self._encode = binary_encoder(schema)
+        self._block = []
+        self._block_bytes = 0
+
+        header = dict(metadata or {})
+        header["avro.schema"] = get_schema_string(schema)
+        header["avro.codec"] = codec
+        self.fileobj.write(MAGIC)
+        self.fileobj.write(_encode_blocks(len(header), [
+            _encode_string(key) + _encode_bytes(value)
+            for key, value in header.iteritems()
+        ]))
+        self.fileobj.write(self.sync_marker)
+
+    def write(self, record):
+        if not isinstance(record, self.schema):
+            raise ValueError("%r is not a %r" % (record, self.schema))
+        data = self._encode(record)
+        self._block.append(data)
+        self._block_bytes += len(data)
+        if self._block_bytes >= self.block_size:
+            self._write_block()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def _write_block(self):
+        if self._block:
+            data = self._compress("".join(self._block))
+            self.fileobj.write(
+                _encode_long(len(self._block)) +
+                _encode_long(len(data)) +
+                data +
+                self.sync_marker
+            )
+            self._block = []
+            self._block_bytes = 0
+
+    def flush(self):
+        self._write_block()
+        self.fileobj.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class ContainerReader(object):
+    """ Iterate over the records of an avro object container file
+
+    :param fileobj:
+        File object to read from, opened in binary mode
+
+    :param schema:
+        PySchema Record class of the records. If not given, the record name
+        from the file's schema is looked up in `record_store`, and if it isn't
+        found there a class is generated from the file's schema. If the file
+        was written with a different schema, the records are converted using
+        avro schema resolution (see `resolving_decoder`)
+
+    :param record_store:
+        Record store to use for schema lookups, defaults to the auto store
+    """
+    def __init__(self, fileobj, schema=None, record_store=None):
+        self.fileobj = fileobj
+        self.metadata, self.sync_marker = _read_header(fileobj)
+        try:
+            self._data_start = fileobj.tell()
+        except (AttributeError, IOError):
+            self._data_start = None
+        self.writer_schema = self.metadata["avro.schema"]
+        self.codec = self.metadata.get("avro.codec", "null")
+        if self.codec not in CODECS:
+            raise ParseError("Unsupported codec: %r" % (self.codec,))
+        self._decompress = CODECS[self.codec][1]
+        if schema is None:
+            schema = _container_schema(self.writer_schema, record_store)
+        self.schema = schema
+        if json_backend.loads(self.writer_schema) == _cached_schema_dict(schema):
+            self._decode = binary_decoder(schema)
+        else:
+            # data written with another version of the schema
+            writer = _parse_container_schema(self.writer_schema)
+            self._decode = resolving_decoder(writer, schema)
+
+    def blocks(self, offset=None, length=None):
+        """ Iterate over (record count, uncompressed data) for each block
+
+        If `offset` and `length` are given, only the blocks of that split of
+        the file are read. Like for hadoop input splits, a block belongs to
+        the split its preceding sync marker starts in, so the blocks of
+        adjacent splits never overlap. Requires a seekable file, raises
+        ValueError otherwise.
+        """
+        if offset is not None and self._data_start is None:
+            raise ValueError("Reading a split of a container requires a seekable file")
+        return self._blocks(offset, length)
+
+    def _blocks(self, offset, length):
+        fileobj = self.fileobj
+        if offset is not None:
+            end = offset + length
+            if offset > self._data_start - SYNC_SIZE:
+                if not self._seek_sync(offset):
+                    return
+            else:
+                fileobj.seek(self._data_start)
+        while True:
+            if offset is not None and fileobj.tell() - SYNC_SIZE >= end:
+                return
+            try:
+                count = _read_long(fileobj)
+            except EOFError:
+                return
+            data = _read_exactly(fileobj, _read_long(fileobj))
+            if fileobj.read(SYNC_SIZE) != self.sync_marker:
+                raise ParseError("Invalid sync marker after block")
+            yield count, self._decompress(data)
+
+    def _seek_sync(self, offset):
+        """Move to the end of the first sync marker starting at or after `offset`"""
+        fileobj = self.fileobj
+        fileobj.seek(offset)
+        data = ""
+        data_start = offset
+        while True:
+            chunk = fileobj.read(_SCAN_SIZE)
+            if not chunk:
+                return False
+            data += chunk
+            i = data.find(self.sync_marker)
+            if i != -1:
+                fileobj.seek(data_start + i + SYNC_SIZE)
+                return True
+            # keep enough to find a marker crossing the chunk boundary
+            keep = len(data) - (SYNC_SIZE - 1)
+            data_start += keep
+            data = data[keep:]
+
+    def read_blocks(self, offset=None, length=None):
+        """Iterate over the list of records in each block, see `blocks`"""
+        decode = self._decode
+        return (_decode_block(decode, count, data) for count, data in self.blocks(offset, length))
+
+    def __iter__(self):
+        for records in self.read_blocks():
+            for record in records:
+                yield record
+
+
+def _decode_block(decode, count, data):
+    """The list of records in the uncompressed data of a block"""
+    records = []
+    pos = 0
+    try:
+        for _ in xrange(count):
+            record, pos = decode(data, pos)
+            records.append(record)
+    except (IndexError, struct.error, UnicodeDecodeError), e:
+        raise ParseError("Invalid avro binary data: %s" % (e,))
+    if pos != len(data):
+        raise ParseError("Unexpected data after the records of a block")
+    return records
+
+
+_parsed_schemas = {}
+
+
+def _container_schema(schema_string, record_store=None):
+    """PySchema Record class for the schema of a container file"""
+    if record_store is None:
+        record_store = core.auto_store
+    schema_dict = json_backend.loads(schema_string)
+    name = schema_dict["name"]
+    if "namespace" in schema_dict and "." not in name:
+        name = schema_dict["namespace"] + "." + name
+    try:
+        return record_store.get(name)
+    except KeyError:
+        return _parse_container_schema(schema_string)
+
+
+def _parse_container_schema(schema_string):
+    # avro_schema_parser depends on this module
+    from pyschema_extensions import avro_schema_parser
+    if schema_string not in _parsed_schemas:
+        _parsed_schemas[schema_string] = avro_schema_parser.parse_schema_string(schema_string)
+    return _parsed_schemas[schema_string]
+
+
+def container_splits(path, split_size=parallel.DEFAULT_CHUNK_SIZE):
+    """(offset, length) splits of `split_size` bytes covering the file at `path`"""
+    size = os.path.getsize(path)
+    return [(offset, min(split_size, size - offset)) for offset in xrange(0, size, split_size)]
+
+
+def _load_container_split(task):
+    path, offset, length, schema, record_store, map_block = task
+    with open(path, "rb") as f:
+        reader = ContainerReader(f, schema, record_store)
+        if map_block is None:
+            return list(reader.read_blocks(offset, length))
+        return [map_block(records) for records in reader.read_blocks(offset, length)]
+
+
+def load_container(
+        path,
+        schema=None,
+        record_store=None,
+        workers=None,
+        ordered=True,
+        map_block=None,
+        splits=None
+):
+    """ Decode the blocks of an avro container file in a pool of worker processes
+
+    Records are pickled to send them back to the parent process, so the schema
+    has to be an importable module level class. With `map_block`, classes
+    generated from the file's schema (see `ContainerReader`) work too.
+
+    :param path:
+        Name of a local avro container file
+
+    :param schema:
+        PySchema Record class of the records, see `ContainerReader`
+
+    :param workers:
+        Number of worker processes, defaults to the number of cpus
+
+    :param ordered:
+        If False, splits are produced in the order they finish
+        instead of the order they appear in the file
+
+    :param map_block:
+        Function run in the workers on the list of records of each block.
+        If given, its return values are yielded instead of the records,
+        e.g. `map_block=list` yields per-block batches
+
+    :param splits:
+        (offset, length) byte ranges of the file to decode,
+        defaults to `container_splits(path)`
+
+    """
+    if splits is None:
+        splits = container_splits(path)
+    tasks = [
+        (path, offset, length, schema, record_store, map_block)
+        for offset, length in splits
+    ]
+    results = parallel.map_ranges(_load_container_split, tasks, workers=workers, ordered=ordered)
+    if map_block is not None:
+        return (result for split in results for result in split)
+    return (record for split in results for records in split for record in records)
+
+
+# Fingerprints and single object encoding
+
+_PRIMITIVE_TYPE_NAMES = frozenset([
+    "null", "boolean", "int", "long", "float", "double", "bytes", "string"
+])
+
+
+def _json_string(s):
+    return stdlib_json.dumps(s, ensure_ascii=False)
+
+
+def _full_name(name, namespace):
+    if "." in name or not namespace:
+        return name
+    return namespace + "." + name
+
+
+def _canonical(schema, namespace):
+    """Parsing canonical form of a schema struct, as a unicode string"""
+    if isinstance(schema, basestring):
+        if schema in _PRIMITIVE_TYPE_NAMES:
+            return _json_string(schema)
+        return _json_string(_full_name(schema, namespace))
+    if isinstance(schema, list):
+        return u"[%s]" % (u",".join(_canonical(s, namespace) for s in schema),)
+
+    type_name = schema["type"]
+    if type_name in ("record", "error", "enum", "fixed"):
+        name = _full_name(schema["name"], schema.get("namespace", namespace))
+        parts = [u'"name":' + _json_string(name), u'"type":' + _json_string(type_name)]
+        if type_name == "enum":
+            parts.append(u'"symbols":[%s]' % (u",".join(_json_string(s) for s in schema["symbols"]),))
+        elif type_name == "fixed":
+            parts.append(u'"size":%d' % (schema["size"],))
+        else:
+            # named types declared inside a record default to its namespace
+            inner_namespace = name.rpartition(".")[0]
+            parts.append(u'"fields":[%s]' % (u",".join(
+                u'{"name":%s,"type":%s}' % (
+                    _json_string(field["name"]),
+                    _canonical(field["type"], inner_namespace)
+                )
+                for field in schema["fields"]
+            ),))
+    elif type_name == "array":
+        parts = [u'"type":"array"', u'"items":' + _canonical(schema["items"], namespace)]
+    elif type_name == "map":
+        parts = [u'"type":"map"', u'"values":' + _canonical(schema["values"], namespace)]
+    else:
+        return _canonical(type_name, namespace)
+    return u"{%s}" % (u",".join(parts),)
+
+
+def canonical_form(schema):
+    """The avro Parsing Canonical Form of the schema of a record class, as utf8"""
+    return core.schema_cached(
+        schema, "avro_canonical_form",
+        lambda schema: _canonical(_cached_schema_dict(schema), None).encode("utf8")
+    )
+
+
+FINGERPRINT_EMPTY = 0xc15d213aa4d7a795
+
+
+def _fingerprint_table():
+    table = []
+    for i in xrange(256):
+        fp = i
+        for _ in xrange(8):
+            fp = (fp >> 1) ^ (FINGERPRINT_EMPTY & -(fp & 1))
+        table.append(fp)
+    return table
+
+
+_FINGERPRINT_TABLE = _fingerprint_table()
+
+
+def crc64_avro(data):
+    """The 64-bit Rabin fingerprint (CRC-64-AVRO) of a byte string"""
+    fp = FINGERPRINT_EMPTY
+    table = _FINGERPRINT_TABLE
+    for c in data:
+        fp = (fp >> 8) ^ table[(fp ^ ord(c)) & 0xff]
+    return fp
+
+
+def fingerprint(schema):
+    """The CRC-64-AVRO fingerprint of a record class' schema, as an unsigned int"""
+    return core.schema_cached(
+        schema, "avro_fingerprint",
+        lambda schema: crc64_avro(canonical_form(schema))
+    )
+
+
+SINGLE_OBJECT_MARKER = "\xc3\x01"
+_FINGERPRINT = struct.Struct("<Q")
+
+
+def _fingerprint_index(record_store):
+    """{fingerprint: record class} for the records of a store that have an avro schema"""
+    index = {}
+    for schema in record_store.records():
+        try:
+            fp = fingerprint(schema)
+        except (AttributeError, TypeError, ValueError):
+            # e.g. a field type without an avro mapping, such a
+            # record can't be written with single_object_dumps anyway
+            continue
+        index.setdefault(fp, schema)
+    return index
+
+
+def get_by_fingerprint(fp, record_store=None):
+    """ Return the record class in `record_store` with fingerprint `fp`
+
+    Raises KeyError if there is no such class.
+    """
+    if record_store is None:
+        record_store = core.auto_store
+    return record_store.cached("avro_fingerprints", _fingerprint_index)[fp]
+
+
+def single_object_dumps(record):
+    """Avro single object encoding of a record: marker, schema fingerprint and binary data"""
+    return (
+        SINGLE_OBJECT_MARKER +
+        _FINGERPRINT.pack(fingerprint(record.__class__)) +
+        binary_dumps(record)
+    )
+
+
+def single_object_loads(s, record_store=None, schema=None):
+    """ Create a record from its avro single object encoding
+
+    :param record_store:
+        Record store to look up the fingerprint in, defaults to the auto store
+
+    :param schema:
+        PySchema Record class to create. If the data was written with a
+        different schema, that schema is looked up in `record_store` and
+        resolved against this one
+    """
+    if s[:2] != SINGLE_OBJECT_MARKER or len(s) < 10:
+        raise ParseError("Not avro single object encoded data")
+    fp, = _FINGERPRINT.unpack_from(s, 2)
+    writer_schema = None
+    if schema is None or fp != fingerprint(schema):
+        try:
+            writer_schema = get_by_fingerprint(fp, record_store)
+        except KeyError:
+            raise ParseError("No schema with fingerprint %016x" % (fp,))
+    if schema is None:
+        schema, writer_schema = writer_schema, None
+    return binary_loads(s[10:], schema, writer_schema)
@@ -32,17 +32,13 @@ Usage:
 ype": "string"}, "bar": {"type": "integer"}}}  '
 '''
 
-from pyschema import core
+from pyschema import core, json_backend
 from pyschema.types import Field, Boolean, Integer, Float
 from pyschema.types import Text, Enum, List, Map, SubRecord
 try:
     from collections import OrderedDict
 except ImportError:
     from ordereddict import OrderedDict
-try:
-    import simplejson as json
-except ImportError:
-    import json
 
 
 # Bytes are not supported
@@ -142,7 +138,20 @@ def get_root_schema_dict(record):
 
     A root schema includes the $schema attribute and all sub-record
     schemas and definitions.
+
+    The schema is only generated once per class, and a copy
+    of the cached dict is returned.
     """
+    return core.copy_json_compatible(_cached_root_schema_dict(record))
+
+
+def _cached_root_schema_dict(record):
+    if not isinstance(record, core.PySchema):
+        record = record.__class__
+    return core.schema_cached(record, "jsonschema_root_schema_dict", _build_root_schema_dict)
+
+
+def _build_root_schema_dict(record):
     state = SchemaGeneratorState()
     schema = get_schema_dict(record, state)
     del state.record_schemas[record._schema_name]
@@ -154,11 +163,16 @@ def get_root_schema_dict(record):
 
 
 def get_root_schema_string(record):
-    return json.dumps(get_root_schema_dict(record))
+    if not isinstance(record, core.PySchema):
+        record = record.__class__
+    return core.schema_cached(
+        record, "jsonschema_root_schema_string",
+        lambda record: json_backend.dumps(_cached_root_schema_dict(record))
+    )
 
 
 def dumps(record):
-    return json.dumps(core.to_json_compatible(record))
+    return json_backend.dumps(core.to_json_compatible(record))
 
 
 def loads(s, record_store=None, schema=None):
@@ -16,6 +16,7 @@
 """
 import sys
 from pyschema import core
+from pyschema.io import RecordReader, RecordWriter
 
 
 def mr_reader(job, input_stream, loads=core.loads):
@@ -24,8 +25,10 @@ def mr_reader(job, input_stream, loads=core.loads):
 
     Can be used as job.reader in luigi.hadoop.JobTask
     """
-    for line in input_stream:
-        yield loads(line),
+    if loads is core.loads:
+        loads = None  # use the batched loader
+    for record in RecordReader(input_stream, loads=loads):
+        yield record,
 
 
 def mr_writer(job, outputs, output_stream,
@@ -34,9 +37,13 @@ def mr_writer(job, outputs, output_stream,
 
     Can be used as job.writer in luigi.hadoop.JobTask
     """
-    for output in outputs:
-        try:
-            print >> output_stream, dumps(output)
-        except core.ParseError, e:
-            print >> stderr, e
-            raise
+    writer = RecordWriter(output_stream, dumps=dumps)
+    try:
+        for output in outputs:
+            try:
+                writer.write(output)
+            except core.ParseError, e:
+                print >> stderr, e
+                raise
+    finally:
+        writer.flush()
@@ -12,8 +12,12 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 import datetime
+import os
+import shutil
+import tempfile
 import warnings
 from unittest import TestCase
+from cStringIO import StringIO
 from common import BaseTest
 import pyschema
 from pyschema import Record, no_auto_store
@@ -405,3 +409,434 @@ class TestExtraFields(TestCase):
         with warnings.catch_warnings(record=True) as ws:
             pyschema_extensions.avro.loads(data, record_store=test_store)
         self.assertEquals(len(ws), 1)
+
+
+class TestProjection(TestCase):
+    def test_fields(self):
+        @no_auto_store()
+        class Projected(Record):
+            a = Text()
+            b = Integer()
+
+        line = '{"a": {"string": "x"}, "b": {"long": 1}, "not_in_schema": 1}'
+        with warnings.catch_warnings(record=True) as ws:
+            warnings.simplefilter("always")
+            record = pyschema_extensions.avro.loads(line, schema=Projected, fields=["b"])
+        self.assertEquals(len(ws), 0)
+        self.assertEquals(record.a, None)
+        self.assertEquals(record.b, 1)
+
+
+class TestBinary(TestCase):
+    def test_spec_encodings(self):
+        @no_auto_store()
+        class Primitives(Record):
+            l = Integer(nullable=False)
+            s = Text(nullable=False)
+            a = List(Integer(nullable=False))
+
+        for n, encoded in [(0, "\x00"), (-1, "\x01"), (1, "\x02"), (-64, "\x7f"), (64, "\x80\x01")]:
+            data = pyschema_extensions.avro.binary_dumps(Primitives(l=n, s=u"foo"))
+            self.assertEquals(data, encoded + "\x06foo\x00")
+        self.assertEquals(
+            pyschema_extensions.avro.binary_dumps(Primitives(l=0, s=u"", a=[3, 27])),
+            "\x00\x00\x04\x06\x36\x00"
+        )
+
+    def test_nullable_union_order(self):
+        @no_auto_store()
+        class Nullables(Record):
+            a = Integer()
+            b = Integer(default=1)
+
+        self.assertEquals(pyschema_extensions.avro.binary_dumps(Nullables()), "\x00\x00\x02")
+        self.assertEquals(pyschema_extensions.avro.binary_dumps(Nullables(a=1, b=None)), "\x02\x02\x02")
+
+    def test_roundtrip(self):
+        @no_auto_store()
+        class Inner(Record):
+            i = Integer()
+
+        @no_auto_store()
+        class Everything(Record):
+            a = Text()
+            b = Integer(size=4)
+            c = Float(size=4)
+            d = Float()
+            e = Boolean()
+            f = Bytes()
+            g = Enum([u"FOO", u"B\xc5R"], name="Things")
+            h = List(Text(nullable=True))
+            i = Map(SubRecord(Inner))
+            j = Date()
+            k = DateTime()
+            m = SubRecord(pyschema.types.SELF)
+
+        record = Everything(
+            a=u"h\xe5j", b=-2 ** 31, c=0.5, d=1e300, e=False, f="\x00\xff",
+            g=u"B\xc5R", h=[u"x", None], i={u"k": Inner(i=2 ** 62)},
+            j=datetime.date(2014, 1, 2), k=datetime.datetime(2014, 1, 2, 3, 4, 5, 6),
+            m=Everything(a=u"nested")
+        )
+        data = pyschema_extensions.avro.binary_dumps(record)
+        self.assertTrue(len(data) < len(pyschema_extensions.avro.dumps(record)))
+        self.assertEquals(pyschema_extensions.avro.binary_loads(data, Everything), record)
+
+    def test_invalid(self):
+        @no_auto_store()
+        class Strict(Record):
+            s = Text(nullable=False)
+            e = Enum(["A"])
+
+        self.assertRaises(ValueError, pyschema_extensions.avro.binary_dumps, Strict())
+        self.assertRaises(ValueError, pyschema_extensions.avro.binary_dumps, Strict(s=u"x", e="B"))
+        self.assertRaises(ParseError, pyschema_extensions.avro.binary_loads, "\x06fo", Strict)
+        self.assertRaises(ParseError, pyschema_extensions.avro.binary_loads, "\x00\x00\x00", Strict)
+        self.assertRaises(ParseError, pyschema_extensions.avro.binary_loads, "\x00\x02\x02", Strict)
+
+    def test_enum_values(self):
+        class Loose(Enum):
+            def dump(self, obj):
+                return super(Loose, self).dump(obj.upper())
+
+            def load(self, obj):
+                return obj.lower()
+
+        @no_auto_store()
+        class Enums(Record):
+            loose = Loose(["A", "B"])
+            encoded = Enum([u"\u00e5", "b"])
+
+        data = pyschema_extensions.avro.binary_dumps(Enums(loose=u"b", encoded="\xc3\xa5"))
+        self.assertEquals(data, "\x02\x02\x02\x00")
+        self.assertEquals(
+            pyschema_extensions.avro.binary_loads(data, Enums),
+            Enums(loose=u"b", encoded=u"\u00e5")
+        )
+
+    def test_unsupported_field(self):
+        class Custom(pyschema.types.Field):
+            def dump(self, obj):
+                return obj
+
+            def load(self, obj):
+                return obj
+
+        @no_auto_store()
+        class Unsupported(Record):
+            c = Custom()
+
+        self.assertRaises(TypeError, pyschema_extensions.avro.binary_dumps, Unsupported())
+
+
+@no_auto_store()
+class ContainerRecord(Record):
+    t = Text()
+    i = Integer()
+    l = List(Float())
+
+
+class TestContainer(TestCase):
+    def setUp(self):
+        self.records = [
+            ContainerRecord(t=u"line %d \u00e5" % (i,), i=i, l=[i / 2.0])
+            for i in xrange(500)
+        ]
+
+    def _write(self, **kwargs):
+        f = StringIO()
+        with pyschema_extensions.avro.ContainerWriter(f, ContainerRecord, **kwargs) as writer:
+            writer.write(self.records[0])
+            writer.write_many(self.records[1:])
+        return f.getvalue()
+
+    def test_roundtrip(self):
+        for codec in ("null", "deflate"):
+            data = self._write(codec=codec, block_size=1000)
+            reader = pyschema_extensions.avro.ContainerReader(StringIO(data), schema=ContainerRecord)
+            self.assertEquals(reader.codec, codec)
+            self.assertTrue(len(list(reader.blocks())) > 1)
+            reader = pyschema_extensions.avro.ContainerReader(StringIO(data), schema=ContainerRecord)
+            self.assertEquals(list(reader), self.records)
+
+    def test_header(self):
+        data = self._write(metadata={"user.key": "value"})
+        self.assertTrue(data.startswith("Obj\x01"))
+        reader = pyschema_extensions.avro.ContainerReader(StringIO(data), schema=ContainerRecord)
+        self.assertEquals(
+            json.loads(reader.metadata["avro.schema"]),
+            pyschema_extensions.avro.get_schema_dict(ContainerRecord)
+        )
+        self.assertEquals(reader.metadata["user.key"], "value")
+        self.assertEquals(data[-16:], reader.sync_marker)
+
+    def test_schema_lookup(self):
+        data = self._write(codec="deflate")
+        store = pyschema.core.SchemaStore()
+        store.add_record(ContainerRecord)
+        reader = pyschema_extensions.avro.ContainerReader(StringIO(data), record_store=store)
+        self.assertTrue(reader.schema is ContainerRecord)
+
+        reader = pyschema_extensions.avro.ContainerReader(StringIO(data), record_store=pyschema.core.SchemaStore())
+        self.assertFalse(reader.schema is ContainerRecord)
+        self.assertEquals(
+            [pyschema.core.to_json_compatible(r) for r in reader],
+            [pyschema.core.to_json_compatible(r) for r in self.records]
+        )
+
+    def test_corrupt(self):
+        data = self._write()
+        self.assertRaises(ParseError, pyschema_extensions.avro.ContainerReader, StringIO("Obj\x02"))
+        reader = pyschema_extensions.avro.ContainerReader(StringIO(data[:-1]), schema=ContainerRecord)
+        self.assertRaises(ParseError, list, reader)
+
+
+def _block_sum(records):
+    return sum(r.i for r in records)
+
+
+class TestContainerSplits(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "records.avro")
+        self.records = [ContainerRecord(t=u"line %d" % (i,), i=i, l=[]) for i in xrange(1000)]
+        with open(self.path, "wb") as f:
+            with pyschema_extensions.avro.ContainerWriter(f, ContainerRecord, codec="deflate", block_size=500) as writer:
+                writer.write_many(self.records)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_splits_partition_blocks(self):
+        for split_size in (1, 100, 1000, 10 ** 6):
+            splits = pyschema_extensions.avro.container_splits(self.path, split_size)
+            records = []
+            with open(self.path, "rb") as f:
+                reader = pyschema_extensions.avro.ContainerReader(f, schema=ContainerRecord)
+                for offset, length in splits:
+                    for block in reader.read_blocks(offset, length):
+                        records.extend(block)
+            self.assertEquals(records, self.records)
+
+    def test_unseekable_file(self):
+        class Stream(object):
+            def __init__(self, data):
+                self.read = StringIO(data).read
+
+        with open(self.path, "rb") as f:
+            data = f.read()
+        reader = pyschema_extensions.avro.ContainerReader(Stream(data), schema=ContainerRecord)
+        self.assertRaises(ValueError, reader.read_blocks, 0, 1000)
+        self.assertEquals(list(reader), self.records)
+
+    def test_load_container(self):
+        loaded = pyschema_extensions.avro.load_container(
+            self.path, schema=ContainerRecord, workers=3,
+            splits=pyschema_extensions.avro.container_splits(self.path, 1000)
+        )
+        self.assertEquals(list(loaded), self.records)
+
+    def test_parsed_schema(self):
+        sums = pyschema_extensions.avro.load_container(
+            self.path, record_store=pyschema.core.SchemaStore(), workers=2,
+            ordered=False, map_block=_block_sum,
+            splits=pyschema_extensions.avro.container_splits(self.path, 1000)
+        )
+        self.assertEquals(sum(sums), sum(xrange(1000)))
+
+
+class TestSchemaResolution(TestCase):
+    def test_resolution(self):
+        @no_auto_store()
+        class Sub(Record):
+            a = Integer()
+
+        @no_auto_store()
+        class Writer(Record):
+            removed = List(SubRecord(Sub))
+            i = Integer(size=4)
+            f = Float(size=4)
+            l = List(Integer(nullable=False))
+            s = SubRecord(Sub)
+            t = Text()
+
+        @no_auto_store()
+        class NewSub(Record):
+            a = Float()
+            b = Text(default=u"b")
+
+        @no_auto_store()
+        class Reader(Record):
+            t = Bytes()
+            i = Float()
+            f = Float()
+            l = List(Integer(nullable=False, size=8))
+            s = SubRecord(NewSub)
+            added = Integer(default=5)
+
+        data = pyschema_extensions.avro.binary_dumps(Writer(
+            removed=[Sub(a=1)], i=3, f=0.5, l=[2 ** 20], s=Sub(a=2), t=u"\xe5"
+        ))
+        record = pyschema_extensions.avro.binary_loads(data, Reader, writer_schema=Writer)
+        self.assertEquals(record, Reader(
+            t="\xc3\xa5", i=3.0, f=0.5, l=[2 ** 20], s=NewSub(a=2.0, b=u"b"), added=5
+        ))
+        self.assertTrue(isinstance(record.i, float))
+
+    def test_incompatible(self):
+        @no_auto_store()
+        class Writer(Record):
+            f = Float()
+
+        @no_auto_store()
+        class Reader(Record):
+            f = Integer()
+
+        @no_auto_store()
+        class Required(Record):
+            r = Integer(nullable=False)
+
+        data = pyschema_extensions.avro.binary_dumps(Writer(f=1.0))
+        self.assertRaises(ParseError, pyschema_extensions.avro.binary_loads, data, Reader, Writer)
+        self.assertRaises(ParseError, pyschema_extensions.avro.binary_loads, data, Required, Writer)
+
+    def test_container(self):
+        @no_auto_store()
+        class NewContainerRecord(Record):
+            t = Text()
+            n = Integer(default=7)
+
+        f = StringIO()
+        with pyschema_extensions.avro.ContainerWriter(f, ContainerRecord) as writer:
+            writer.write(ContainerRecord(t=u"x", i=1, l=[1.0]))
+        reader = pyschema_extensions.avro.ContainerReader(StringIO(f.getvalue()), schema=NewContainerRecord)
+        self.assertEquals(list(reader), [NewContainerRecord(t=u"x", n=7)])
+
+    def test_json_warnings(self):
+        @no_auto_store()
+        class Empty(Record):
+            pass
+
+        with warnings.catch_warnings(record=True) as ws:
+            warnings.simplefilter("always")
+            for _ in xrange(3):
+                pyschema_extensions.avro.loads('{"always": 1}', schema=Empty)
+        self.assertEquals(len(ws), 3)
+
+        with warnings.catch_warnings(record=True) as ws:
+            warnings.simplefilter("default")
+            for _ in xrange(3):
+                pyschema_extensions.avro.loads('{"default": 1}', schema=Empty)
+        self.assertEquals(len(ws), 1)
+
+
+class TestFingerprint(TestCase):
+    def test_crc64_avro(self):
+        # values from the avro specification test suite
+        self.assertEquals(pyschema_extensions.avro.crc64_avro('"null"'), 7195948357588979594)
+        self.assertEquals(pyschema_extensions.avro.crc64_avro('"long"'), 2 ** 64 - 3434872931120570953)
+
+    def test_canonical_form(self):
+        @no_auto_store()
+        class Foo(Record):
+            """documentation"""
+            _namespace = "my.ns"
+            f1 = Boolean(nullable=False, default=True)
+            e = Enum(["A"], nullable=False)
+            m = Map(Integer(nullable=False))
+
+        self.assertEquals(
+            pyschema_extensions.avro.canonical_form(Foo),
+            '{"name":"my.ns.Foo","type":"record","fields":['
+            '{"name":"f1","type":"boolean"},'
+            '{"name":"e","type":{"name":"my.ns.ENUM","type":"enum","symbols":["A"]}},'
+            '{"name":"m","type":{"type":"map","values":"long"}}]}'
+        )
+
+        @no_auto_store()
+        class Bar(Record):
+            f1 = Boolean(nullable=False)
+
+        self.assertEquals(
+            pyschema_extensions.avro.fingerprint(Bar),
+            pyschema_extensions.avro.crc64_avro('{"name":"Bar","type":"record","fields":[{"name":"f1","type":"boolean"}]}')
+        )
+
+    def test_single_object(self):
+        store = pyschema.core.SchemaStore()
+
+        @store.add_record
+        @no_auto_store()
+        class Message(Record):
+            t = Text()
+
+        record = Message(t=u"hello")
+        data = pyschema_extensions.avro.single_object_dumps(record)
+        self.assertEquals(data[:2], "\xc3\x01")
+        self.assertEquals(len(data), 10 + len(pyschema_extensions.avro.binary_dumps(record)))
+        self.assertEquals(pyschema_extensions.avro.single_object_loads(data, record_store=store), record)
+        self.assertEquals(pyschema_extensions.avro.single_object_loads(data, schema=Message), record)
+        self.assertRaises(ParseError, pyschema_extensions.avro.single_object_loads, data)
+        self.assertRaises(ParseError, pyschema_extensions.avro.single_object_loads, data[2:], record_store=store)
+
+    def test_get_by_fingerprint(self):
+        store = pyschema.core.SchemaStore()
+
+        @no_auto_store()
+        class Message(Record):
+            _namespace = "fp"
+            t = Text()
+
+        fp = pyschema_extensions.avro.fingerprint(Message)
+        self.assertRaises(KeyError, pyschema_extensions.avro.get_by_fingerprint, fp, store)
+        store.add_record(Message)
+        self.assertEquals(store.records(), [Message])
+        self.assertTrue(pyschema_extensions.avro.get_by_fingerprint(fp, store) is Message)
+        index = store.cached("avro_fingerprints", None)
+        self.assertRaises(KeyError, pyschema_extensions.avro.get_by_fingerprint, fp + 1, store)
+        self.assertTrue(store.cached("avro_fingerprints", None) is index)
+
+    def test_fingerprint_index_skips_unsupported(self):
+        class Custom(pyschema.types.Field):
+            def dump(self, obj):
+                return obj
+
+            def load(self, obj):
+                return obj
+
+        store = pyschema.core.SchemaStore()
+
+        @store.add_record
+        @no_auto_store()
+        class Unsupported(Record):
+            c = Custom()
+
+        @store.add_record
+        @no_auto_store()
+        class Supported(Record):
+            t = Text()
+
+        data = pyschema_extensions.avro.single_object_dumps(Supported(t=u"x"))
+        self.assertEquals(pyschema_extensions.avro.single_object_loads(data, record_store=store), Supported(t=u"x"))
+
+
+class TestSchemaCache(TestCase):
+    def test_copies(self):
+        @no_auto_store()
+        class Cached(Record):
+            l = List(Integer(), default=[1])
+
+        schema = pyschema_extensions.avro.get_schema_dict(Cached)
+        schema["fields"][0]["default"].append(2)
+        schema["fields"].append({"name": "x", "type": "int"})
+        self.assertEquals(pyschema_extensions.avro.get_schema_dict(Cached)["fields"], [
+            {"name": "l", "type": {"type": "array", "items": ["null", "long"]}, "default": [1]}
+        ])
+        self.assertTrue(
+            pyschema_extensions.avro.get_schema_string(Cached) is
+            pyschema_extensions.avro.get_schema_string(Cached)
+        )
+        self.assertEquals(
+            pyschema_extensions.avro.get_schema_string(Cached(l=[])),
+            pyschema_extensions.avro.get_schema_string(Cached)
+        )
@@ -0,0 +1,110 @@
+import array
+import datetime
+from unittest import TestCase
+import pyschema
+from pyschema import core
+from pyschema.batch import RecordBatch, Bitmap, ArrayColumn, BooleanColumn, ListColumn
+from pyschema.core import ParseError
+from pyschema.types import Text, Integer, Float, Boolean, List, Date
+
+
+@pyschema.no_auto_store()
+class Measurement(pyschema.Record):
+    name = Text()
+    count = Integer()
+    small = Integer(size=1)
+    value = Float()
+    ok = Boolean()
+    flag = Boolean(nullable=False, default=False)
+    day = Date()
+    tags = List(Text())
+
+
+class TestBitmap(TestCase):
+    def test_bits(self):
+        values = [True, False, False, True, True, False, True, False, True]
+        bitmap = Bitmap(values)
+        self.assertEquals(len(bitmap), 9)
+        self.assertEquals(list(bitmap), values)
+        self.assertEquals(bitmap[-1], True)
+        self.assertEquals(bitmap.count(), 5)
+        self.assertEquals(list(bitmap.take([8, 1])), [True, False])
+        self.assertRaises(IndexError, bitmap.__getitem__, 9)
+
+
+class TestRecordBatch(TestCase):
+    def setUp(self):
+        self.records = [
+            Measurement(name=u"a", count=1, small=-1, value=0.5, ok=True, day=datetime.date(2014, 1, 2)),
+            Measurement(name=u"b", count=None, value=None, flag=True, tags=[u"x"]),
+            Measurement(count=2 ** 40, small=127, ok=False),
+        ]
+        self.batch = RecordBatch.from_records(Measurement, self.records)
+
+    def test_columns(self):
+        columns = self.batch.columns
+        self.assertEquals(list(columns), list(Measurement._fields))
+        self.assertTrue(isinstance(columns["count"], ArrayColumn))
+        self.assertTrue(isinstance(columns["count"].values, array.array))
+        self.assertTrue(columns["count"].values.itemsize >= 8)
+        self.assertEquals(columns["small"].values.itemsize, 1)
+        self.assertEquals(list(columns["count"].values), [1, 0, 2 ** 40])
+        self.assertEquals(list(columns["count"].mask), [True, False, True])
+        self.assertTrue(isinstance(columns["ok"], BooleanColumn))
+        self.assertTrue(columns["flag"].mask is None)
+        self.assertTrue(isinstance(columns["name"], ListColumn))
+        self.assertEquals(self.batch.column("ok"), [True, None, False])
+        self.assertEquals(self.batch.column("tags"), [[], [u"x"], []])
+
+    def test_records(self):
+        self.assertEquals(len(self.batch), 3)
+        self.assertEquals(self.batch.to_records(), self.records)
+        self.assertEquals(self.batch[1], self.records[1])
+        self.assertEquals(self.batch[-1], self.records[2])
+        self.assertRaises(IndexError, self.batch.__getitem__, 3)
+
+    def test_invalid_values(self):
+        self.assertRaises(ValueError, self.batch.append, Measurement(small=128))
+        self.assertRaises(ValueError, self.batch.append, Measurement(count=u"1"))
+        self.assertRaises(ValueError, self.batch.append, Measurement(flag=None))
+        # nothing was added by the failed appends
+        self.assertEquals(len(self.batch), 3)
+        self.assertEquals(set(len(column) for column in self.batch.columns.values()), set([3]))
+
+    def test_single_precision_floats(self):
+        @pyschema.no_auto_store()
+        class Single(pyschema.Record):
+            f = Float(size=4)
+
+        record = Single(f=0.1)
+        batch = RecordBatch.from_records(Single, [record])
+        self.assertEquals(batch[0], record)
+        self.assertEquals(list(batch.dumps_many()), [pyschema.dumps(record)])
+
+    def test_slicing_and_filtering(self):
+        self.assertEquals(self.batch[1:].to_records(), self.records[1:])
+        self.assertEquals(self.batch[::-2].to_records(), self.records[::-2])
+        self.assertEquals(self.batch.filter([True, False, True]).to_records(), self.records[::2])
+        self.assertEquals(
+            self.batch.filter(lambda r: r.count is not None).to_records(),
+            [self.records[0], self.records[2]]
+        )
+        self.assertEquals(self.batch.filter(self.batch.columns["count"].mask).column("count"), [1, 2 ** 40])
+
+    def test_json(self):
+        lines = [pyschema.dumps(record) for record in self.records]
+        batch = RecordBatch(Measurement)
+        batch.extend_json_lines(lines)
+        self.assertEquals(batch.to_records(), self.records)
+        self.assertEquals(
+            list(batch.iter_json_compatible()),
+            [core.to_json_compatible(record) for record in self.records]
+        )
+        self.assertEquals(
+            [core.json_backend.loads(line) for line in batch.dumps_many()],
+            [core.json_backend.loads(line) for line in lines]
+        )
+        self.assertRaises(ParseError, batch.extend_json, [{"unknown": 1}])
+        self.assertRaises(ParseError, batch.extend_json, [{"count": u"1"}])
+        self.assertRaises(ParseError, batch.extend_json_lines, ['{"$schema": "Other"}'])
+        self.assertEquals(len(batch), 3)
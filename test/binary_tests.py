@@ -0,0 +1,96 @@
+import datetime
+from unittest import TestCase
+import pyschema
+from pyschema import binary
+from pyschema.core import ParseError
+from pyschema.types import Text, Integer, Float, Boolean, Bytes, Enum, List, Map, SubRecord, Date, DateTime
+import common
+
+
+class TestBinary(TestCase):
+    def test_roundtrip_all_types(self):
+        record = common.everything()
+        record.l = datetime.datetime(2014, 1, 2, 3, 4, 5, 678)
+        data = binary.dumps(record)
+        self.assertTrue(len(data) < len(pyschema.dumps(record)) / 2)
+        self.assertEquals(binary.loads(data, common.Everything), record)
+
+    def test_encoding(self):
+        @pyschema.no_auto_store()
+        class Small(pyschema.Record):
+            i = Integer(size=1)
+            t = Text()
+            b = Bytes(nullable=False)
+            f = Float(size=4)
+            e = Enum(["B", "A"])
+
+        self.assertEquals(binary.dumps(Small(b="")), "\x00\x00")
+        self.assertEquals(
+            binary.dumps(Small(i=-1, t=u"\xe5", b="\xff", f=0.5, e="B")),
+            "\x0f" + "\x01" + "\x04\xc3\xa5" + "\x02\xff" + "\x00\x00\x00\x3f" + "\x00"
+        )
+        self.assertRaises(ValueError, binary.dumps, Small(i=128, b=""))
+        self.assertRaises(ValueError, binary.dumps, Small())
+        self.assertRaises(ValueError, binary.dumps, Small(e="C", b=""))
+
+    def test_nullable_items(self):
+        @pyschema.no_auto_store()
+        class Items(pyschema.Record):
+            l = List(Integer())
+            m = Map(Boolean(nullable=False))
+            d = Date()
+
+        record = Items(l=[1, None, -300], m={u"k": True}, d=datetime.date(1, 1, 1))
+        self.assertEquals(binary.loads(binary.dumps(record), Items), record)
+
+    def test_aware_datetime(self):
+        class Offset(datetime.tzinfo):
+            def utcoffset(self, dt):
+                return datetime.timedelta(hours=2)
+
+        @pyschema.no_auto_store()
+        class Event(pyschema.Record):
+            t = DateTime()
+
+        record = Event(t=datetime.datetime(2014, 1, 2, 3, 4, 5, tzinfo=Offset()))
+        self.assertEquals(
+            binary.loads(binary.dumps(record), Event),
+            Event(t=datetime.datetime(2014, 1, 2, 1, 4, 5))
+        )
+        self.assertEquals(pyschema.core.to_json_compatible(record), {"t": u"2014-01-02 03:04:05+02:00"})
+
+    def test_custom_field(self):
+        class Upper(Text):
+            def dump(self, obj):
+                return obj.upper()
+
+            def load(self, obj):
+                return obj.lower()
+
+        @pyschema.no_auto_store()
+        class Custom(pyschema.Record):
+            u = Upper()
+            dt = DateTime()
+
+        record = Custom(u=u"abc", dt=datetime.datetime(1900, 1, 1))
+        self.assertTrue('"ABC"' in binary.dumps(record))
+        self.assertEquals(binary.loads(binary.dumps(record), Custom), record)
+
+    def test_invalid(self):
+        @pyschema.no_auto_store()
+        class Nested(pyschema.Record):
+            s = SubRecord(pyschema.types.SELF)
+            t = Text(nullable=False)
+
+        data = binary.dumps(Nested(s=Nested(t=u"a"), t=u"b"))
+        self.assertRaises(ParseError, binary.loads, data[:-1], Nested)
+        self.assertRaises(ParseError, binary.loads, data + "\x00", Nested)
+        self.assertRaises(ParseError, binary.loads, "", Nested)
+
+        @pyschema.no_auto_store()
+        class Dates(pyschema.Record):
+            d = Date(nullable=False)
+            t = DateTime(nullable=False)
+
+        self.assertRaises(ParseError, binary.loads, "\x00\x00", Dates)
+        self.assertRaises(ParseError, binary.loads, "\x02" + "\xff" * 12 + "\x01", Dates)
@@ -1,4 +1,42 @@
+import datetime
 from unittest import TestCase
+import pyschema
+from pyschema.types import Text, Integer, Float, Boolean, Bytes, Enum
+from pyschema.types import List, Map, SubRecord, Date, DateTime, SELF
+
+
+@pyschema.no_auto_store()
+class Inner(pyschema.Record):
+    i = Integer()
+
+
+@pyschema.no_auto_store()
+class Everything(pyschema.Record):
+    a = Text()
+    b = Integer()
+    c = Float()
+    d = Boolean()
+    e = Bytes()
+    f = Enum(["FOO", "BAR"])
+    g = List(Integer())
+    h = Map(List(Text()))
+    i = SubRecord(Inner)
+    j = List(SubRecord(Inner))
+    k = Date()
+    l = DateTime()
+    m = SubRecord(SELF)
+
+
+def everything():
+    """An Everything record with a value for every field"""
+    return Everything(
+        a=u"text", b=10, c=1.5, d=False, e="\x00\xff",
+        f=u"FOO", g=[1, 2], h={u"k": [u"v"]},
+        i=Inner(i=1), j=[Inner(i=2), Inner()],
+        k=datetime.date(2014, 1, 2),
+        l=datetime.datetime(2014, 1, 2, 3, 4, 5),
+        m=Everything(a=u"nested")
+    )
 
 
 class BaseTest(TestCase):
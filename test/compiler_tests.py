@@ -0,0 +1,269 @@
+import datetime
+from unittest import TestCase
+import pyschema
+from pyschema import compiler, core
+from pyschema.types import Text, Integer, List, Map, SubRecord
+from pyschema.core import ParseError
+from common import Inner, Everything, everything
+
+
+def generic_to_json_compatible(record):
+    # reference implementation, as it looked before compilation
+    d = {}
+    for fname, f in record._fields.iteritems():
+        val = getattr(record, fname)
+        if val is not None:
+            d[fname] = f.dump(val)
+    return d
+
+
+class TestCompiledSerialization(TestCase):
+    def test_same_as_generic(self):
+        record = everything()
+        self.assertEquals(
+            core.to_json_compatible(record),
+            generic_to_json_compatible(record)
+        )
+
+    def test_roundtrip(self):
+        record = everything()
+        reborn = pyschema.loads(pyschema.dumps(record), schema=Everything)
+        self.assertEquals(record, reborn)
+
+    def test_conversions_outside_fast_path(self):
+        record = Everything(a="utf8 str", c=1, g=(1, 2), h={})
+        self.assertRaises(ValueError, core.to_json_compatible, record)
+        record.c = 1.0
+        dct = core.to_json_compatible(record)
+        self.assertEquals(dct["a"], u"utf8 str")
+        self.assertEquals(dct["g"], [1, 2])
+        reborn = core.from_json_compatible(Everything, {"c": 1, "b": 10L})
+        self.assertEquals(reborn.c, 1.0)
+        self.assertTrue(isinstance(reborn.c, float))
+        self.assertEquals(reborn.b, 10L)
+
+    def test_invalid_values(self):
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"a": 1})
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"b": True})
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"f": u"BAZ"})
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"g": {}})
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"x": 1})
+        self.assertRaises(ValueError, core.to_json_compatible, Everything(j=[None]))
+        self.assertRaises(ValueError, core.to_json_compatible, Everything(i=Everything()))
+
+    def test_overridden_methods(self):
+        class UpperText(Text):
+            def dump(self, obj):
+                return obj.upper()
+
+            def load(self, obj):
+                return obj.lower()
+
+        @pyschema.no_auto_store()
+        class Custom(pyschema.Record):
+            t = UpperText()
+
+        self.assertEquals(core.to_json_compatible(Custom(t=u"hej")), {"t": u"HEJ"})
+        self.assertEquals(core.from_json_compatible(Custom, {"t": u"HEJ"}).t, u"hej")
+
+    def test_mixin_invalidates(self):
+        class Marked(Integer):
+            pass
+
+        @pyschema.no_auto_store()
+        class Custom(pyschema.Record):
+            i = Marked()
+
+        self.assertEquals(core.to_json_compatible(Custom(i=1)), {"i": 1})
+
+        @Marked.mixin
+        class MarkedMixin:
+            def dump(self, obj):
+                return obj + 1
+
+        self.assertEquals(core.to_json_compatible(Custom(i=1)), {"i": 2})
+
+    def test_subclass_fields(self):
+        @pyschema.no_auto_store()
+        class Base(pyschema.Record):
+            a = Text()
+
+        @pyschema.no_auto_store()
+        class Derived(Base):
+            b = Text()
+
+        self.assertEquals(core.to_json_compatible(Base(a=u"a")), {"a": u"a"})
+        self.assertEquals(core.to_json_compatible(Derived(a=u"a", b=u"b")), {"a": u"a", "b": u"b"})
+
+    def test_non_identifier_names(self):
+        Odd = pyschema.core.PySchema.from_class(
+            type("Odd", (object,), {"my-field": Text(), "print": Integer()}),
+            auto_store=False
+        )
+        record = Odd(**{"my-field": u"x", "print": 1})
+        dct = core.to_json_compatible(record)
+        self.assertEquals(dct, {"my-field": u"x", "print": 1})
+        self.assertEquals(core.from_json_compatible(Odd, dct), record)
+
+
+class TestCompileContext(TestCase):
+    def test_abstract_record_methods(self):
+        self.assertRaises(TypeError, compiler.FieldCompileContext)
+        self.assertTrue(isinstance(core.JsonCompileContext(), compiler.FieldCompileContext))
+
+
+class TestTrustedLoading(TestCase):
+    def test_same_result(self):
+        record = everything()
+        line = pyschema.dumps(record)
+        self.assertEquals(pyschema.loads(line, schema=Everything, validate=False), record)
+
+    def test_conversions(self):
+        record = core.from_json_compatible(
+            Everything,
+            {"c": 1, "e": u"\xff", "k": u"2014-01-02", "h": {u"k": [u"v"]}},
+            validate=False
+        )
+        self.assertEquals(record.c, 1.0)
+        self.assertTrue(isinstance(record.c, float))
+        self.assertEquals(record.e, "\xff")
+        self.assertEquals(record.k, datetime.date(2014, 1, 2))
+        self.assertEquals(record.h, {u"k": [u"v"]})
+
+    def test_no_validation(self):
+        dct = {"a": 1, "b": u"x", "f": u"BAZ", "g": [u"y"], "m": {"b": u"z"}}
+        record = core.from_json_compatible(Everything, dict(dct), validate=False)
+        self.assertEquals(record.a, 1)
+        self.assertEquals(record.b, u"x")
+        self.assertEquals(record.f, u"BAZ")
+        self.assertEquals(record.g, [u"y"])
+        self.assertEquals(record.m.b, u"z")
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, dict(dct))
+
+    def test_unexpected_field(self):
+        self.assertRaises(ParseError, core.from_json_compatible, Everything, {"x": 1}, validate=False)
+
+    def test_lazy(self):
+        record = pyschema.loads('{"b": "x"}', schema=Everything, lazy=True, validate=False)
+        self.assertEquals(record.b, u"x")
+
+
+class TestGeneratedInit(TestCase):
+    def test_defaults(self):
+        @pyschema.no_auto_store()
+        class Defaults(pyschema.Record):
+            t = Text(default=u"x")
+            l = List(Integer())
+            m = Map(Integer())
+            n = List(Integer(), default=[1, 2])
+            s = SubRecord(Inner)
+
+        a, b = Defaults(), Defaults()
+        self.assertEquals((a.t, a.l, a.m, a.n, a.s), (u"x", [], {}, [1, 2], None))
+        self.assertFalse(a.l is b.l)
+        self.assertFalse(a.m is b.m)
+        self.assertFalse(a.n is b.n)
+        self.assertFalse(a.n is Defaults._fields["n"].default)
+        self.assertEquals(Defaults(t=None, l=[3]).l, [3])
+        self.assertTrue(Defaults(t=None).t is None)
+
+    def test_arguments(self):
+        self.assertRaises(TypeError, Inner, 1)
+        self.assertRaises(TypeError, Inner, 1, i=1)
+        self.assertEquals(Inner(i=1, unknown=2), Inner(i=1))
+        self.assertTrue(getattr(Inner.__init__, "_schema_generated", False))
+
+    def test_overridden_default_value(self):
+        class Counter(Integer):
+            count = 0
+
+            def default_value(self):
+                Counter.count += 1
+                return Counter.count
+
+        @pyschema.no_auto_store()
+        class Counted(pyschema.Record):
+            c = Counter()
+
+        self.assertEquals([Counted().c, Counted().c, Counted(c=0).c], [1, 2, 0])
+
+    def test_user_init(self):
+        @pyschema.no_auto_store()
+        class Custom(pyschema.Record):
+            a = Integer()
+
+            def __init__(self, a):
+                super(Custom, self).__init__(a=a * 2)
+
+        @pyschema.no_auto_store()
+        class Derived(Custom):
+            b = Integer()
+
+        self.assertEquals(Custom(1).a, 2)
+        self.assertEquals(Derived(2).a, 4)
+
+    def test_slots(self):
+        @pyschema.no_auto_store()
+        class Slotted(pyschema.Record):
+            _use_slots = True
+            a = Integer()
+            l = List(Integer())
+
+        record = Slotted(a=1)
+        self.assertEquals((record.a, record.l), (1, []))
+
+
+class TestGeneratedComparisons(TestCase):
+    def test_sort_key(self):
+        record = Inner(i=3)
+        self.assertEquals(record.sort_key(), (3,))
+        records = [Inner(i=2), Inner(i=None), Inner(i=1)]
+        self.assertEquals(sorted(records), sorted(records, key=Inner.sort_key))
+        self.assertEquals([r.i for r in sorted(records)], [None, 1, 2])
+
+    def test_equality(self):
+        @pyschema.no_auto_store()
+        class Other(pyschema.Record):
+            i = Integer()
+
+        self.assertTrue(Inner(i=1) == Inner(i=1))
+        self.assertFalse(Inner(i=1) != Inner(i=1))
+        self.assertTrue(Inner(i=1) != Inner(i=2))
+        self.assertTrue(Inner(i=1) != Other(i=1))
+        self.assertTrue(Inner(i=1) != 1)
+        self.assertTrue(Inner(i=1) < Inner(i=2))
+        self.assertEquals(cmp(Inner(i=1), Other(i=1)), cmp("Inner", "Other"))
+        nan = float("nan")
+        self.assertEquals(Inner(i=nan), Inner(i=nan))
+
+    def test_lazy_records(self):
+        record = everything()
+        lazy = pyschema.loads(pyschema.dumps(record), schema=Everything, lazy=True)
+        self.assertEquals(lazy, record)
+        self.assertEquals(record, lazy)
+        self.assertEquals(lazy.sort_key(), record.sort_key())
+
+    def test_hashable(self):
+        @pyschema.no_auto_store()
+        class Key(pyschema.Record):
+            _hashable = True
+            a = Text()
+            b = Integer()
+
+        self.assertEquals(hash(Key(a=u"x", b=1)), hash(Key(a=u"x", b=1)))
+        self.assertEquals(len(set([Key(a=u"x", b=1), Key(a=u"x", b=1), Key(a=u"y")])), 2)
+        # other schemas hash by identity
+        record = Inner(i=1)
+        self.assertEquals(hash(record), object.__hash__(record))
+
+    def test_user_defined(self):
+        @pyschema.no_auto_store()
+        class Reversed(pyschema.Record):
+            i = Integer()
+
+            def __cmp__(self, other):
+                return cmp(other.i, self.i)
+
+        self.assertEquals([r.i for r in sorted([Reversed(i=1), Reversed(i=2)])], [2, 1])
+        self.assertFalse(Reversed(i=1) == Reversed(i=2))
+        self.assertEquals(Reversed(i=1).sort_key(), (1,))
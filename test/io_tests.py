@@ -0,0 +1,118 @@
+from unittest import TestCase
+from cStringIO import StringIO
+import bz2
+import pyschema
+from pyschema.types import Text, Integer
+from pyschema.io import RecordReader, RecordWriter
+
+
+@pyschema.no_auto_store()
+class IORecord(pyschema.Record):
+    t = Text()
+    i = Integer()
+
+
+@pyschema.no_auto_store()
+class OtherIORecord(pyschema.Record):
+    i = Integer()
+
+
+class TestRecordIO(TestCase):
+    def setUp(self):
+        self.records = [IORecord(t=u"line %d \u00e5" % (i,), i=i) for i in xrange(100)]
+
+    def _roundtrip(self, compression=None, buffer_size=64):
+        f = StringIO()
+        with RecordWriter(f, compression=compression, buffer_size=buffer_size) as writer:
+            writer.write(self.records[0])
+            writer.write_many(self.records[1:])
+        data = f.getvalue()
+        reader = RecordReader(
+            StringIO(data), schema=IORecord,
+            compression=compression, buffer_size=buffer_size
+        )
+        self.assertEqual(list(reader), self.records)
+        return data
+
+    def test_plain(self):
+        data = self._roundtrip()
+        self.assertEqual(
+            data,
+            "".join(pyschema.dumps(r) + "\n" for r in self.records)
+        )
+
+    def test_large_buffer(self):
+        self._roundtrip(buffer_size=1024 * 1024)
+
+    def test_gzip(self):
+        self._roundtrip("gzip")
+
+    def test_bz2(self):
+        data = self._roundtrip("bz2")
+        self.assertEqual(
+            bz2.decompress(data),
+            "".join(pyschema.dumps(r) + "\n" for r in self.records)
+        )
+
+    def test_bz2_concatenated_streams(self):
+        lines = [pyschema.dumps(r) + "\n" for r in self.records]
+        data = bz2.compress("".join(lines[:50])) + bz2.compress("".join(lines[50:]))
+        reader = RecordReader(StringIO(data), schema=IORecord, compression="bz2", buffer_size=16)
+        self.assertEqual(list(reader), self.records)
+
+    def test_missing_trailing_newline(self):
+        data = "\n".join(pyschema.dumps(r) for r in self.records[:3])
+        reader = RecordReader(StringIO(data), schema=IORecord, buffer_size=7)
+        self.assertEqual(list(reader), self.records[:3])
+
+    def test_lines_longer_than_buffer(self):
+        data = "a" * 1000 + "\n\n" + "b" * 50 + "\nc\n" + "d" * 30
+        reader = RecordReader(StringIO(data), buffer_size=16)
+        self.assertEqual(list(reader.lines()), ["a" * 1000, "", "b" * 50, "c", "d" * 30])
+
+    def test_custom_functions(self):
+        f = StringIO()
+        writer = RecordWriter(f, dumps=lambda r: str(r.i))
+        writer.write_many(self.records[:3])
+        writer.close()
+        self.assertFalse(f.closed)
+        self.assertEqual(f.getvalue(), "0\n1\n2\n")
+        reader = RecordReader(StringIO(f.getvalue()), loads=int)
+        self.assertEqual(list(reader), [0, 1, 2])
+
+    def test_schema_ids(self):
+        records = [IORecord(i=1), IORecord(i=2), OtherIORecord(i=3), IORecord(i=4)]
+        id_store = pyschema.core.SchemaStore()
+        f = StringIO()
+        with RecordWriter(f, id_store=id_store) as writer:
+            writer.write(records[0])
+            writer.write_many(records[1:])
+        lines = f.getvalue().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(pyschema.core.json_backend.loads(lines[0]), {"$ids": ["IORecord"]})
+        self.assertEqual(pyschema.core.json_backend.loads(lines[3]), {"$ids": ["IORecord", "OtherIORecord"]})
+
+        store = pyschema.core.SchemaStore()
+        store.add_record(OtherIORecord)
+        store.add_record(IORecord)
+        reader = RecordReader(StringIO(f.getvalue()), record_store=store)
+        self.assertEqual(list(reader), records)
+        self.assertEqual(store.export_ids(), [])
+
+    def test_independent_id_stores(self):
+        files = []
+        for order in ([IORecord(i=1), OtherIORecord(i=2)], [OtherIORecord(i=3), IORecord(i=4)]):
+            f = StringIO()
+            with RecordWriter(f, id_store=pyschema.core.SchemaStore()) as writer:
+                writer.write_many(order)
+            files.append((f.getvalue(), order))
+
+        store = pyschema.core.SchemaStore()
+        store.add_record(IORecord)
+        store.add_record(OtherIORecord)
+        store.schema_id(OtherIORecord)
+        for data, records in files:
+            self.assertEqual(list(RecordReader(StringIO(data), record_store=store)), records)
+
+    def test_unsupported_compression(self):
+        self.assertRaises(ValueError, lambda: RecordWriter(StringIO(), compression="lzma"))
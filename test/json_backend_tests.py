@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from unittest import TestCase
+import pyschema
+from pyschema import json_backend
+from pyschema.types import Text, Float, Integer, List, Map, Bytes
+
+
+@pyschema.no_auto_store()
+class CompatRecord(pyschema.Record):
+    t = Text()
+    f = Float()
+    i = Integer()
+    b = Bytes()
+    l = List(Float())
+    m = Map(Text())
+
+
+RECORDS = [
+    CompatRecord(t=u"plain ascii", f=0.1 + 0.2, i=2 ** 62),
+    CompatRecord(t=u"å/ä\\ö \"quoted\" \n\t\x00", f=1e300, i=-2 ** 63),
+    CompatRecord(t=u"\U0001f600 non-bmp", f=-0.0, b="\x00\xff\xfe", l=[1e-300, 5e-324, 1.0]),
+    CompatRecord(t=u"", f=123456789.123456789, m={u"ключ": u"значение", u"": u""}),
+]
+
+
+class TestBackendCompatibility(TestCase):
+    def setUp(self):
+        self.original = json_backend.get_backend()
+
+    def tearDown(self):
+        json_backend.set_backend(self.original.name)
+
+    def _lines(self, backend_name):
+        json_backend.set_backend(backend_name)
+        return [pyschema.dumps(r) for r in RECORDS]
+
+    def _loaded(self, lines, backend_name):
+        json_backend.set_backend(backend_name)
+        return [pyschema.loads(l, schema=CompatRecord) for l in lines]
+
+    def test_roundtrip(self):
+        for name in json_backend.available_backends():
+            reborn = self._loaded(self._lines(name), name)
+            self.assertEqual(reborn, RECORDS, name)
+            self.assertEqual(
+                [repr(r.f) for r in reborn],
+                [repr(r.f) for r in RECORDS],
+                name
+            )
+            self.assertTrue(all(isinstance(r.t, unicode) for r in reborn), name)
+
+    def test_cross_backend(self):
+        names = json_backend.available_backends()
+        for writer in names:
+            lines = self._lines(writer)
+            for reader in names:
+                self.assertEqual(self._loaded(lines, reader), RECORDS, (writer, reader))
+
+    def test_output_is_ascii(self):
+        for name in json_backend.available_backends():
+            for line in self._lines(name):
+                line.decode("ascii")
+
+
+class TestBackendSelection(TestCase):
+    def setUp(self):
+        self.original = json_backend.get_backend()
+
+    def tearDown(self):
+        json_backend.set_backend(self.original.name)
+
+    def test_stdlib_always_available(self):
+        self.assertTrue("json" in json_backend.available_backends())
+        self.assertEqual(json_backend.set_backend("json").name, "json")
+        self.assertEqual(json_backend.get_backend().name, "json")
+
+    def test_auto_selection(self):
+        self.assertEqual(
+            json_backend.set_backend().name,
+            json_backend.available_backends()[0]
+        )
+
+    def test_unknown(self):
+        self.assertRaises(KeyError, json_backend.set_backend, "nope")
+
+    def test_register(self):
+        calls = []
+
+        def counting_loads(s):
+            calls.append(s)
+            return original.loads(s)
+
+        original = json_backend.get_backend()
+        json_backend.register_backend(
+            "counting",
+            lambda: json_backend.JsonBackend("counting", original.dumps, counting_loads)
+        )
+        json_backend.set_backend("counting")
+        pyschema.loads(original.dumps({"t": u"x"}), schema=CompatRecord)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue("counting" in json_backend.available_backends())
+        self.assertNotEqual(json_backend.available_backends()[0], "counting")
+        del json_backend._factories["counting"]
@@ -189,3 +189,15 @@ class TestJsonSchema(TestCase):
         record.zeta.alpha = 'foo'
         record.zeta.beta = 14
         self.serialize_validate(record)
+
+    def test_cached_schema_is_copied(self):
+        schema = jsonschema.get_root_schema_dict(SubRecordRecord)
+        schema['definitions']['SimpleRecord']['required'].append('gamma')
+        self.assertEqual(
+            jsonschema.get_root_schema_dict(SubRecordRecord)['definitions']['SimpleRecord']['required'],
+            ['alpha', 'beta']
+        )
+        self.assertEqual(
+            json.loads(jsonschema.get_root_schema_string(SubRecordRecord)),
+            jsonschema.get_root_schema_dict(SubRecordRecord)
+        )
@@ -0,0 +1,160 @@
+import copy
+import datetime
+import pickle
+from unittest import TestCase
+import pyschema
+from pyschema import core
+from pyschema.types import Text, Integer, List, SubRecord, DateTime
+from pyschema.core import ParseError
+try:
+    import simplejson as json
+except ImportError:
+    import json
+
+
+@pyschema.no_auto_store()
+class LazyInner(pyschema.Record):
+    i = Integer()
+
+
+@pyschema.no_auto_store()
+class Wide(pyschema.Record):
+    a = Text()
+    b = Integer()
+    c = List(SubRecord(LazyInner))
+    d = DateTime()
+    e = Integer(default=42)
+
+
+class TestLazyLoading(TestCase):
+    def setUp(self):
+        self.record = Wide(
+            a=u"a", b=1, c=[LazyInner(i=2)],
+            d=datetime.datetime(2014, 1, 1, 12, 0, 0)
+        )
+        self.line = pyschema.dumps(self.record)
+
+    def test_decoded_on_access(self):
+        lazy = pyschema.loads(self.line, schema=Wide, lazy=True)
+        self.assertTrue(isinstance(lazy, Wide))
+        self.assertTrue(isinstance(lazy, core.LazyRecord))
+        self.assertEqual(set(lazy._raw), set(["a", "b", "c", "d", "e"]))
+        self.assertEqual(lazy.c, [LazyInner(i=2)])
+        self.assertEqual(set(lazy._raw), set(["a", "b", "d", "e"]))
+        self.assertEqual(lazy, self.record)
+
+    def test_copy_and_pickle(self):
+        lazy = pyschema.loads(self.line, schema=Wide, lazy=True)
+        copied = copy.deepcopy(lazy)
+        self.assertTrue(type(copied) is Wide)
+        self.assertEqual(copied, self.record)
+        self.assertFalse(copied.c is lazy.c)
+        self.assertTrue(type(copy.copy(lazy)) is Wide)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            reborn = pickle.loads(pickle.dumps(lazy, protocol))
+            self.assertTrue(type(reborn) is Wide)
+            self.assertEqual(reborn, self.record)
+
+    def test_source_dict_unchanged(self):
+        dct = core.to_json_compatible(self.record)
+        lazy = core.from_json_compatible(Wide, dct, lazy=True)
+        self.assertEqual(lazy.c, [LazyInner(i=2)])
+        self.assertEqual(dct, core.to_json_compatible(self.record))
+
+    def test_schema_attributes(self):
+        lazy = pyschema.loads(self.line, schema=Wide, lazy=True)
+        self.assertEqual(lazy._schema_name, "Wide")
+        self.assertEqual(core.get_full_name(lazy.__class__), "Wide")
+        self.assertTrue(type(lazy).a is Wide.a)
+
+    def test_defaults(self):
+        lazy = pyschema.loads('{"a": "x"}', schema=Wide, lazy=True)
+        self.assertEqual(lazy.e, 42)
+        self.assertEqual(lazy.c, [])
+        self.assertTrue(lazy.b is None)
+
+    def test_untouched_fields_verbatim(self):
+        # invalid values in untouched fields pass through unvalidated
+        lazy = pyschema.loads('{"a": "x", "d": "not a date"}', schema=Wide, lazy=True)
+        self.assertEqual(lazy.a, u"x")
+        self.assertEqual(json.loads(pyschema.dumps(lazy, attach_schema_name=False)), {"a": u"x", "c": [], "d": u"not a date", "e": 42})
+        self.assertRaises(ValueError, lambda: lazy.d)
+
+    def test_assignment(self):
+        lazy = pyschema.loads(self.line, schema=Wide, lazy=True)
+        lazy.b = 5
+        self.assertFalse("b" in lazy._raw)
+        lazy.c.append(LazyInner(i=3))
+        reborn = pyschema.loads(pyschema.dumps(lazy), schema=Wide)
+        self.assertEqual(reborn.b, 5)
+        self.assertEqual(reborn.c, [LazyInner(i=2), LazyInner(i=3)])
+        self.assertRaises(AttributeError, lambda: setattr(lazy, "x", 1))
+
+    def test_unexpected_field(self):
+        self.assertRaises(ParseError, lambda: pyschema.loads('{"x": 1}', schema=Wide, lazy=True))
+
+    def test_loads_many(self):
+        records = list(pyschema.loads_many([self.line] * 3, schema=Wide, lazy=True))
+        self.assertEqual(records, [self.record] * 3)
+        self.assertTrue(all(isinstance(r, core.LazyRecord) for r in records))
+
+
+class TestTrackedRecords(TestCase):
+    def setUp(self):
+        self.record = Wide(
+            a=u"a", b=1, c=[LazyInner(i=2)],
+            d=datetime.datetime(2014, 1, 1, 12, 0, 0)
+        )
+        self.line = pyschema.dumps(self.record)
+
+    def test_decoded(self):
+        tracked = pyschema.loads(self.line, schema=Wide, keep_raw=True)
+        self.assertTrue(isinstance(tracked, Wide))
+        self.assertTrue(isinstance(tracked, core.TrackedRecord))
+        self.assertEqual(tracked.__dict__["d"], self.record.d)
+        self.assertEqual(tracked, self.record)
+        self.assertEqual(core.get_full_name(tracked.__class__), "Wide")
+        self.assertRaises(ParseError, pyschema.loads, '{"b": "x"}', schema=Wide, keep_raw=True)
+
+    def test_dirty_fields(self):
+        tracked = pyschema.loads(self.line, schema=Wide, keep_raw=True)
+        self.assertEqual(set(tracked._raw), set(["a", "b", "d", "e"]))
+        tracked.b = 2
+        self.assertEqual(set(tracked._raw), set(["a", "d", "e"]))
+        # untouched fields are copied from the source dict
+        tracked._raw["a"] = u"from raw"
+        dct = core.to_json_compatible(tracked)
+        self.assertEqual(dct["a"], u"from raw")
+        self.assertEqual(dct["b"], 2)
+        self.assertEqual(pyschema.loads(pyschema.dumps(tracked), schema=Wide).b, 2)
+
+    def test_in_place_changes(self):
+        for validate in (True, False):
+            tracked = pyschema.loads(self.line, schema=Wide, keep_raw=True, validate=validate)
+            tracked.c.append(LazyInner(i=3))
+            tracked.c[0].i = 4
+            self.assertEqual(core.to_json_compatible(tracked)["c"], [{"i": 4}, {"i": 3}])
+
+    def test_copy_and_pickle(self):
+        tracked = pyschema.loads(self.line, schema=Wide, keep_raw=True)
+        tracked.b = 2
+        copies = [copy.copy(tracked), copy.deepcopy(tracked)]
+        copies.extend(
+            pickle.loads(pickle.dumps(tracked, protocol))
+            for protocol in range(pickle.HIGHEST_PROTOCOL + 1)
+        )
+        for copied in copies:
+            self.assertTrue(isinstance(copied, core.TrackedRecord))
+            self.assertEqual(copied, tracked)
+            self.assertEqual(set(copied._raw), set(["a", "d", "e"]))
+            copied.a = u"changed"
+            self.assertEqual(tracked._raw["a"], u"a")
+            self.assertEqual(core.to_json_compatible(copied)["a"], u"changed")
+
+    def test_options(self):
+        lines = [self.line, pyschema.dumps(Wide(a=u"b"))]
+        records = list(pyschema.loads_many(lines, schema=Wide, keep_raw=True, validate=False))
+        self.assertEqual(records, [self.record, Wide(a=u"b")])
+        self.assertTrue(all(isinstance(r, core.TrackedRecord) for r in records))
+        self.assertRaises(ValueError, pyschema.loads, self.line, schema=Wide, keep_raw=True, lazy=True)
+        self.assertRaises(ValueError, pyschema.loads, self.line, schema=Wide, keep_raw=True, fields=["a"])
@@ -57,3 +57,12 @@ class TestMRWriter(BaseTest):
             obj,
             {"foo": "Hej", "bar": 10, "$schema": "FooRecord"}
         )
+
+    def test_mr_reader(self):
+        output = StringIO()
+        pyschema_extensions.luigi.mr_writer(None, self.seq(), output)
+        output.seek(0)
+        records = [
+            rec for (rec,) in pyschema_extensions.luigi.mr_reader(None, output)
+        ]
+        self.assertEquals(records, list(self.seq()))
@@ -120,5 +120,45 @@ class NamespaceTest(unittest.TestCase):
         data = pyschema.core.dumps(TestRecord(a='testing'))
         self.assertRaises(ValueError,  pyschema.core.loads, data, store)
 
+
+class ResolutionCacheTest(unittest.TestCase):
+    def test_fallback_cached(self):
+        store = SchemaStore()
+        store.add_record(TestRecord)
+        self.assertEquals(store.get('some.namespace.TestRecord'), TestRecord)
+        self.assertEquals(store._resolved['some.namespace.TestRecord'], TestRecord)
+        self.assertTrue(store.has_schema('some.namespace.TestRecord'))
+
+    def test_invalidated_on_add(self):
+        store = SchemaStore()
+        store.add_record(TestRecord)
+        self.assertEquals(store.get('my.namespace.TestRecord'), TestRecord)
+        store.add_record(namespaced_schemas.TestRecord)
+        self.assertEquals(store.get('my.namespace.TestRecord'), namespaced_schemas.TestRecord)
+
+    def test_invalidated_on_clear(self):
+        store = SchemaStore()
+        store.add_record(TestRecord)
+        self.assertEquals(store.get('TestRecord'), TestRecord)
+        store.clear()
+        self.assertRaises(KeyError, store.get, 'TestRecord')
+        self.assertFalse(store.has_schema('TestRecord'))
+
+    def test_misses_not_cached(self):
+        store = SchemaStore()
+        self.assertRaises(KeyError, store.get, 'a.TestRecord')
+        store.add_record(TestRecord)
+        self.assertEquals(store.get('a.TestRecord'), TestRecord)
+
+    def test_lookup_many(self):
+        store = SchemaStore()
+        store.add_record(namespaced_schemas.TestRecord)
+        names = ['TestRecord', 'my.namespace.TestRecord', 'other.TestRecord']
+        self.assertEquals(store.lookup_many(names), [namespaced_schemas.TestRecord] * 3)
+        self.assertEquals(store.lookup_many(names), [namespaced_schemas.TestRecord] * 3)
+        self.assertEquals(store.lookup_many([]), [])
+        self.assertRaises(KeyError, store.lookup_many, ['TestRecord', 'Missing'])
+
+
 if __name__ == '__main__':
     unittest.main()
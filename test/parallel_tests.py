@@ -0,0 +1,78 @@
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import pyschema
+from pyschema.core import ParseError
+from pyschema.io import RecordWriter
+from pyschema.types import Text, Integer
+from pyschema.parallel import load_file, chunk_ranges
+
+
+@pyschema.no_auto_store()
+class ParallelRecord(pyschema.Record):
+    t = Text()
+    i = Integer()
+
+
+def sum_i(records):
+    return sum(r.i for r in records)
+
+
+class TestLoadFile(TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "records.json")
+        self.records = [ParallelRecord(t=u"line %d \u00e5" % (i,), i=i) for i in xrange(1000)]
+        with open(self.path, "wb") as f:
+            for line in pyschema.dumps_many(self.records):
+                f.write(line.encode("utf8") + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_chunk_ranges(self):
+        ranges = chunk_ranges(self.path, 1000)
+        self.assertEquals(ranges[0][0], 0)
+        self.assertEquals(ranges[-1][1], os.path.getsize(self.path))
+        with open(self.path, "rb") as f:
+            data = f.read()
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEquals(end, next_start)
+            self.assertEquals(data[end - 1], "\n")
+
+    def test_ordered(self):
+        loaded = list(load_file(self.path, schema=ParallelRecord, workers=3, chunk_size=1000))
+        self.assertEquals(loaded, self.records)
+
+    def test_unordered(self):
+        loaded = load_file(self.path, schema=ParallelRecord, workers=3, ordered=False, chunk_size=1000)
+        self.assertEquals(sorted(loaded, key=lambda r: r.i), self.records)
+
+    def test_map_chunk(self):
+        sums = load_file(self.path, schema=ParallelRecord, workers=2, map_chunk=sum_i, chunk_size=1000)
+        self.assertEquals(sum(sums), sum(xrange(1000)))
+
+    def test_lazy_options(self):
+        self.assertRaises(ValueError, load_file, self.path, schema=ParallelRecord, lazy=True)
+        tracked = list(load_file(self.path, schema=ParallelRecord, workers=2, keep_raw=True, chunk_size=1000))
+        self.assertEquals(tracked, self.records)
+        self.assertTrue(all(isinstance(r, pyschema.core.TrackedRecord) for r in tracked))
+        sums = load_file(self.path, schema=ParallelRecord, workers=2, map_chunk=sum_i, lazy=True, chunk_size=1000)
+        self.assertEquals(sum(sums), sum(xrange(1000)))
+
+    def test_schema_ids(self):
+        with open(self.path, "wb") as f:
+            with RecordWriter(f, id_store=pyschema.core.SchemaStore()) as writer:
+                writer.write_many(self.records)
+        self.assertRaises(ParseError, list, load_file(self.path, schema=ParallelRecord, workers=1))
+
+    def test_single_process(self):
+        loaded = list(load_file(self.path, schema=ParallelRecord, workers=1, validate=False))
+        self.assertEquals(loaded, self.records)
+
+    def test_no_trailing_newline(self):
+        with open(self.path, "rb+") as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        loaded = list(load_file(self.path, schema=ParallelRecord, workers=2, chunk_size=1000))
+        self.assertEquals(loaded, self.records)
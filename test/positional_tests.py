@@ -0,0 +1,86 @@
+from unittest import TestCase
+import pyschema
+from pyschema import core, positional
+from pyschema.core import ParseError
+from pyschema.types import Text, Integer, Enum, List, SubRecord
+import common
+
+
+@pyschema.no_auto_store()
+class Point(pyschema.Record):
+    x = Integer()
+    y = Integer()
+
+
+@pyschema.no_auto_store()
+class Shape(pyschema.Record):
+    name = Text()
+    points = List(SubRecord(Point))
+    center = SubRecord(Point)
+
+
+class TestPositional(TestCase):
+    def setUp(self):
+        self.store = pyschema.SchemaStore()
+        self.store.add_record(Point)
+        self.store.add_record(Shape)
+
+    def test_encoding(self):
+        record = Shape(name=u"s", points=[Point(x=1, y=2)])
+        self.assertEquals(positional.to_json_compatible(record), [u"s", [[1, 2]], None])
+        line = positional.dumps(record)
+        self.assertEquals(core.json_backend.loads(line), [u"Shape", u"s", [[1, 2]], None])
+        self.assertEquals(positional.loads(line, record_store=self.store), record)
+
+    def test_enum_ordinals(self):
+        @pyschema.no_auto_store()
+        class Colored(pyschema.Record):
+            color = Enum(["RED", "GREEN", "BLUE"])
+
+        record = Colored(color=u"BLUE")
+        self.assertEquals(positional.to_json_compatible(record), [2])
+        reborn = positional.from_json_compatible(Colored, [2])
+        self.assertTrue(reborn.color is Colored.color.symbols[2])
+        self.assertRaises(ParseError, positional.from_json_compatible, Colored, [3])
+        self.assertRaises(ParseError, positional.from_json_compatible, Colored, [u"BLUE"])
+        self.assertRaises(ValueError, positional.to_json_compatible, Colored(color=u"PINK"))
+
+    def test_enum_ordinal_edge_cases(self):
+        class Loose(Enum):
+            def dump(self, obj):
+                return super(Loose, self).dump(obj.upper())
+
+        @pyschema.no_auto_store()
+        class Flags(pyschema.Record):
+            loose = Loose(["A", "B"])
+            many = List(Enum(["X", "Y"]))
+            encoded = Enum([u"\u00e5", "b"])
+
+        record = Flags(loose=u"b", many=(u"Y", u"X"), encoded="\xc3\xa5")
+        self.assertEquals(positional.to_json_compatible(record), [1, [1, 0], 0])
+        self.assertEquals(core.to_json_compatible(record), {"loose": u"B", "many": [u"Y", u"X"], "encoded": u"\u00e5"})
+
+    def test_tuple_list(self):
+        record = Shape(points=(Point(x=1, y=2), Point(x=3)))
+        self.assertEquals(positional.to_json_compatible(record), [None, [[1, 2], [3, None]], None])
+        reborn = positional.loads(positional.dumps(record), schema=Shape)
+        self.assertEquals(reborn.points, list(record.points))
+
+    def test_roundtrip_all_types(self):
+        record = common.everything()
+        line = positional.dumps(record)
+        self.assertTrue(len(line) < len(pyschema.dumps(record)))
+        self.assertEquals(positional.loads(line, schema=common.Everything), record)
+
+    def test_ids(self):
+        records = [Point(x=1), Shape(center=Point(y=2))]
+        lines = [positional.dumps(r, id_store=self.store) for r in records]
+        self.assertEquals(core.json_backend.loads(lines[1])[0], 1)
+        self.assertEquals(list(positional.loads_many(lines, record_store=self.store)), records)
+
+    def test_invalid(self):
+        self.assertRaises(ParseError, positional.loads, '{"x": 1}', schema=Point)
+        self.assertRaises(ParseError, positional.loads, '["Point", 1]', schema=Point)
+        self.assertRaises(ParseError, positional.loads, '["Point", "a", 1]', schema=Point)
+        self.assertRaises(ParseError, positional.loads, '["Shape", null, [], {"x": 1}]', schema=Shape)
+        self.assertRaises(ParseError, positional.loads, '["Unknown", 1, 2]', record_store=self.store)
@@ -82,3 +82,125 @@ class TestExtraFields(TestCase):
         line = '{"field": 8, "invalid_field": 0}'
 
         self.assertRaises(ParseError, lambda: pyschema.loads(line, schema=ValidRecord))
+
+
+@pyschema.no_auto_store()
+class OtherRecord(pyschema.Record):
+    field = Integer()
+
+
+class TestMany(TestCase):
+    def setUp(self):
+        self.store = pyschema.SchemaStore()
+        self.store.add_record(CustomEncodedBytes)
+        self.store.add_record(OtherRecord)
+        self.records = [
+            CustomEncodedBytes(_="\x00"),
+            OtherRecord(field=1),
+            OtherRecord(field=None),
+            CustomEncodedBytes(_="abc"),
+        ]
+
+    def test_dumps_many(self):
+        self.assertEqual(
+            list(pyschema.dumps_many(self.records)),
+            [pyschema.dumps(r) for r in self.records]
+        )
+
+    def test_roundtrip(self):
+        lines = pyschema.dumps_many(self.records)
+        reborn = list(pyschema.loads_many(lines, record_store=self.store))
+        self.assertEqual(reborn, self.records)
+
+    def test_explicit_schema(self):
+        lines = ['{"field": 1, "$schema": "Whatever"}\n', '{"field": 2}\n']
+        reborn = list(pyschema.loads_many(lines, schema=OtherRecord))
+        self.assertEqual(reborn, [OtherRecord(field=1), OtherRecord(field=2)])
+
+    def test_lazy(self):
+        lines = iter(['{"field": 1}', 'not json'])
+        reborn = pyschema.loads_many(lines, schema=OtherRecord)
+        self.assertEqual(next(reborn), OtherRecord(field=1))
+        self.assertRaises(ParseError, lambda: next(reborn))
+
+    def test_unknown_schema(self):
+        lines = ['{"field": 1, "$schema": "Unknown"}']
+        self.assertRaises(ParseError, lambda: list(pyschema.loads_many(lines, record_store=self.store)))
+        lines = ['{"field": 1}']
+        self.assertRaises(ParseError, lambda: list(pyschema.loads_many(lines, record_store=self.store)))
+
+
+@pyschema.no_auto_store()
+class WideRecord(pyschema.Record):
+    user_id = Integer()
+    ts = Integer()
+    payload = pyschema.List(pyschema.Text())
+    other = Integer(default=7)
+
+
+class TestProjection(TestCase):
+    line = '{"user_id": 1, "ts": 2, "payload": ["x"], "other": 3}'
+
+    def test_projected(self):
+        record = pyschema.loads(self.line, schema=WideRecord, fields=["user_id", "ts"])
+        self.assertEqual(record, WideRecord(user_id=1, ts=2))
+        self.assertEqual(record.payload, [])
+        self.assertEqual(record.other, 7)
+
+    def test_skipped_keys_not_checked(self):
+        line = '{"user_id": 1, "payload": 5, "unknown": 0}'
+        record = pyschema.loads(line, schema=WideRecord, fields=["user_id"])
+        self.assertEqual(record.user_id, 1)
+        self.assertRaises(ParseError, lambda: pyschema.loads(line, schema=WideRecord, fields=["payload"]))
+
+    def test_unknown_field_name(self):
+        self.assertRaises(ValueError, lambda: pyschema.loads(self.line, schema=WideRecord, fields=["nope"]))
+
+    def test_loads_many(self):
+        records = list(pyschema.loads_many([self.line] * 2, schema=WideRecord, fields=("ts",)))
+        self.assertEqual(records, [WideRecord(ts=2)] * 2)
+
+    def test_not_lazy(self):
+        self.assertRaises(ValueError, lambda: pyschema.loads(self.line, schema=WideRecord, fields=["ts"], lazy=True))
+
+
+class TestSchemaIds(TestCase):
+    def setUp(self):
+        self.store = pyschema.core.SchemaStore()
+        self.store.add_record(OtherRecord)
+        self.store.add_record(WideRecord)
+
+    def test_ids(self):
+        self.assertEquals(self.store.schema_id(WideRecord), 0)
+        self.assertEquals(self.store.schema_id(OtherRecord), 1)
+        self.assertEquals(self.store.schema_id(WideRecord), 0)
+        self.assertEquals(self.store.get_by_id(1), OtherRecord)
+        self.assertRaises(KeyError, self.store.get_by_id, 2)
+        self.assertRaises(KeyError, self.store.get_by_id, -1)
+        self.assertEquals(self.store.export_ids(), ["WideRecord", "OtherRecord"])
+
+    def test_compact_roundtrip(self):
+        records = [WideRecord(user_id=1), OtherRecord(field=1), WideRecord(ts=2, payload=[u"x"])]
+        line = pyschema.dumps(records[1], id_store=self.store)
+        self.assertEquals(pyschema.core.json_backend.loads(line)["$schema"], 0)
+        self.assertEquals(pyschema.loads(line, record_store=self.store), records[1])
+
+        lines = list(pyschema.dumps_many(records, id_store=self.store))
+        self.assertTrue(all(len(l) < len(pyschema.dumps(r)) for l, r in zip(lines, records)))
+
+        other = pyschema.core.SchemaStore()
+        other.add_record(OtherRecord)
+        other.add_record(WideRecord)
+        other.import_ids(self.store.export_ids())
+        self.assertEquals(list(pyschema.loads_many(lines, record_store=other)), records)
+        self.assertRaises(ParseError, pyschema.loads, '{"$schema": 5}', record_store=other)
+        self.assertRaises(ParseError, pyschema.loads, '{"$schema": true}', record_store=other)
+        for bad in ('{"$schema": false}', '{"$schema": {}}', '{"$schema": null}'):
+            self.assertRaises(ParseError, pyschema.loads, bad, record_store=other)
+            self.assertRaises(ParseError, list, pyschema.loads_many(lines[:1] + [bad], record_store=other))
+
+    def test_import_conflict(self):
+        self.store.schema_id(OtherRecord)
+        self.assertRaises(ValueError, self.store.import_ids, ["WideRecord"])
+        self.store.import_ids(["OtherRecord", "WideRecord"])
+        self.assertEquals(self.store.get_by_id(1), WideRecord)
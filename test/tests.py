@@ -12,8 +12,10 @@
 # License for the specific language governing permissions and limitations under
 # the License.
 
+import copy
+import pickle
 from unittest import TestCase
-from pyschema import Record, dumps, loads, ispyschema, no_auto_store
+from pyschema import Record, FrozenRecord, dumps, loads, ispyschema, no_auto_store
 from pyschema.types import *
 import pyschema.core
 
@@ -119,3 +121,144 @@ class TestRuntimeRecord(TestBasicUsage):
         Foo.i = Integer()
         setattr(Foo, "b", Boolean())
         self.Foo = pyschema.core.PySchema.from_class(Foo, auto_store=False)
+
+
+@no_auto_store()
+class SlottedPickled(Record):
+    _use_slots = True
+    t = Text()
+    i = Integer()
+
+
+class TestSlottedRecord(TestBasicUsage):
+    def setUp(self):
+        @no_auto_store()
+        class Foo(Record):
+            _use_slots = True
+            t = Text()
+            i = Integer()
+            b = Boolean()
+
+            def calculated(self):
+                return self.t * 2
+
+        self.Foo = Foo
+
+    def test_no_instance_dict(self):
+        record = self.Foo(t=u"foo")
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEquals(self.Foo.__slots__, ("t", "i", "b"))
+        self.assertTrue(isinstance(self.Foo._fields["t"], Text))
+
+    def test_subclass(self):
+        @no_auto_store()
+        class Bar(self.Foo):
+            x = Integer()
+
+        record = Bar(t=u"a", x=1)
+        self.assertFalse(hasattr(record, "__dict__"))
+        self.assertEquals(Bar.__slots__, ("x",))
+        self.assertEquals(loads(dumps(record), schema=Bar), record)
+
+    def test_unslotted_subclass(self):
+        @no_auto_store()
+        class Loose(self.Foo):
+            _use_slots = False
+            x = Integer()
+
+        record = Loose(t=u"a", x=1)
+        self.assertTrue(hasattr(record, "__dict__"))
+        self.assertRaises(AttributeError, setattr, record, "typo", 3)
+        record.x = 2
+        self.assertEquals(loads(dumps(record), schema=Loose), record)
+
+    def test_roundtrip(self):
+        record = self.Foo(t=u"a", i=1, b=True)
+        self.assertEquals(loads(dumps(record), schema=self.Foo), record)
+
+    def test_pickle(self):
+        record = SlottedPickled(t=u"a", i=1)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEquals(pickle.loads(pickle.dumps(record, protocol)), record)
+        self.assertEquals(copy.deepcopy(record), record)
+
+    def test_lazy(self):
+        lazy = loads(dumps(self.Foo(t=u"a", i=1)), schema=self.Foo, lazy=True)
+        self.assertFalse(hasattr(lazy, "__dict__"))
+        self.assertEquals(lazy.i, 1)
+        self.assertEquals(lazy._raw, {"t": u"a"})
+        lazy.t = u"b"
+        self.assertEquals(lazy._raw, {})
+        self.assertEquals(lazy.t, u"b")
+        self.assertTrue(lazy.b is None)
+        self.assertEquals(loads(dumps(lazy), schema=self.Foo), self.Foo(t=u"b", i=1))
+
+
+@no_auto_store()
+class Dimension(FrozenRecord):
+    name = Text()
+    tags = List(Text())
+
+
+@no_auto_store()
+class Fact(Record):
+    value = Integer()
+    dimension = SubRecord(Dimension)
+
+
+class TestFrozenRecord(TestCase):
+    def test_immutable(self):
+        record = Dimension(name=u"a")
+        self.assertEquals(record.name, u"a")
+        self.assertEquals(record.tags, [])
+
+        def assign():
+            record.name = u"b"
+
+        def delete():
+            del record.name
+
+        self.assertRaises(AttributeError, assign)
+        self.assertRaises(AttributeError, delete)
+        self.assertEquals(record.name, u"a")
+
+    def test_cached_serialization(self):
+        record = Dimension(name=u"a", tags=[u"x"])
+        line = dumps(record)
+        self.assertTrue(dumps(record) is line)
+        self.assertEquals(loads(line, schema=Dimension), record)
+        dct = pyschema.core.to_json_compatible(record)
+        self.assertEquals(dct, {"name": u"a", "tags": [u"x"]})
+        # modifying the result doesn't affect the cache
+        dct["tags"].append(u"y")
+        dct["$schema"] = "Other"
+        self.assertEquals(pyschema.core.to_json_compatible(record), {"name": u"a", "tags": [u"x"]})
+        self.assertEquals(list(pyschema.core.dumps_many([record])), [line])
+        self.assertFalse("$schema" in dumps(record, attach_schema_name=False))
+
+    def test_shared_sub_record(self):
+        dimension = Dimension(name=u"a")
+        facts = [Fact(value=i, dimension=dimension) for i in range(3)]
+        for i, line in enumerate(pyschema.core.dumps_many(facts)):
+            self.assertEquals(loads(line, schema=Fact), Fact(value=i, dimension=Dimension(name=u"a")))
+
+    def test_hash(self):
+        a, b = Dimension(name=u"a", tags=[u"x"]), Dimension(name=u"a", tags=[u"x"])
+        self.assertEquals(hash(a), hash(b))
+        self.assertEquals(len(set([a, b, Dimension(name=u"b")])), 2)
+
+    def test_copy(self):
+        record = Dimension(name=u"a", tags=[u"x"])
+        dumps(record)
+        for protocol in range(pickle.HIGHEST_PROTOCOL + 1):
+            self.assertEquals(pickle.loads(pickle.dumps(record, protocol)), record)
+        copied = copy.deepcopy(record)
+        self.assertEquals(copied, record)
+        self.assertFalse(copied.tags is record.tags)
+
+    def test_default_sub_record(self):
+        @no_auto_store()
+        class WithDefault(Record):
+            dimension = SubRecord(Dimension, default=Dimension(name=u"default"))
+
+        self.assertEquals(WithDefault().dimension.name, u"default")
@@ -97,6 +97,26 @@ class TypeTests(TestCase):
         forbidden = ["foo", "bar", "BAZ", True]
         self.assertCompliant(EnumRecord, allowed, forbidden)
 
+    def test_enum_symbols(self):
+        field = Enum(["FOO", u"BAR", "FOO", "BAZ"])
+        self.assertEquals(field.symbols, (u"FOO", u"BAR", u"BAZ"))
+        self.assertEquals(field.symbol_index, {u"FOO": 0, u"BAR": 1, u"BAZ": 2})
+        self.assertEquals(field.dump_ordinal(u"BAZ"), 2)
+        self.assertEquals(field.load_ordinal(1), u"BAR")
+        self.assertRaises(ValueError, field.dump_ordinal, u"QUX")
+        self.assertRaises(pyschema.core.ParseError, field.load_ordinal, 3)
+
+        @pyschema.no_auto_store()
+        class EnumRecord(pyschema.Record):
+            e = Enum(["FOO", "BAR"])
+
+        loaded = [
+            pyschema.loads('{"e": "BAR"}', schema=EnumRecord).e
+            for _ in range(2)
+        ] + [EnumRecord.e.load(u"BAR")]
+        for value in loaded:
+            self.assertTrue(value is EnumRecord.e.symbols[1])
+
     def test_list(self):
         @pyschema.no_auto_store()
         class ListRecord(pyschema.Record):